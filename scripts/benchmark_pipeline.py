@@ -0,0 +1,208 @@
+"""
+Benchmark de cada etapa del procesamiento con datos sintéticos. Uso:
+
+    python scripts/benchmark_pipeline.py                         # 10³ y 10⁴ espectros
+    python scripts/benchmark_pipeline.py --sizes 1000 100000 1000000 --out bench.json
+    python scripts/benchmark_pipeline.py --encoding utf-16 --sep semicolon --decimal ,
+
+Etapas:
+    parse        data_pull sobre archivos escritos en disco (como mucho
+                 --max-files archivos distintos por tamaño)
+    aggregate    ReplicateStack.from_xy + media/desviación/SEM por grupo de
+                 réplicas, con la mitad de los grupos en una rejilla desplazada
+    calibration  extracción del máximo de emisión, CalibrationModel.fit y
+                 bootstrap de LOD/K_sv
+    tauc         band_gaps sobre espectros UV-Vis
+    render       gráfico de líneas con Agg guardado en memoria (como mucho
+                 --max-render espectros)
+
+Las etapas sobre matrices se procesan en bloques de --chunk espectros y el
+bootstrap de calibration simula las réplicas en bloques de tamaño fijo
+(uncertainty.REPLICATE_BLOCK), de modo que la memoria pico de cada etapa no
+crece con el número de espectros (85-93 MB en calibration con los valores por
+defecto, de 10⁴ a 10⁶ espectros). parse y render miden como mucho --max-files
+y --max-render espectros: esas filas se marcan como limitadas ('capped' en el
+JSON, * en la tabla) y muestran el número medido. Cada etapa se mide dos
+veces: primero el tiempo (sin trazado) y después la memoria pico con
+tracemalloc, que también registra las asignaciones de NumPy. El resultado se
+imprime como tabla y se guarda en JSON para comparar entre versiones y
+equipos.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from code_functions import synthetic_spectra as synth
+from code_functions.data_txt_pull import data_pull
+
+STAGES = ('parse', 'aggregate', 'calibration', 'tauc', 'render')
+
+
+def _chunks(n, chunk):
+    for start in range(0, n, chunk):
+        yield min(chunk, n - start)
+
+
+def stage_parse(n, args, rng):
+    n_files = min(n, args.max_files)
+    folder = tempfile.mkdtemp(prefix='bench_parse_', dir=args.workdir)
+    # Los archivos se borran cuando termina la medición (ver measure)
+    args.cleanup.append(folder)
+    x, Y = synth.pl_spectra(rng.uniform(0, 200, n_files), args.points, rng=rng)
+    paths = []
+    for k, y in enumerate(Y):
+        paths.append(os.path.join(folder, f'{k}.txt'))
+        synth.write_spectrum(paths[-1], x, y, encoding=args.encoding, sep=synth.SEPARATORS[args.sep],
+                             decimal=args.decimal)
+
+    def run():
+        for path in paths:
+            data_pull(path)
+    return n_files, run
+
+
+def stage_aggregate(n, args, rng):
+    from code_functions.replicate_stack import ReplicateStack
+    r = args.replicates
+    x, Y = synth.pl_spectra(rng.uniform(0, 200, min(n, args.chunk)), args.points, rng=rng)
+    x_shifted = x + 0.3
+
+    def run():
+        done = 0
+        for size in _chunks(n, args.chunk):
+            for g in range(0, size - r + 1, r):
+                grid = x_shifted if (g // r) % 2 else x
+                stack = ReplicateStack.from_xy((grid, y) for y in Y[g:g + r])
+                stack.mean, stack.std, stack.sem
+            done += size
+        return done
+    return n, run
+
+
+def stage_calibration(n, args, rng):
+    from code_functions.calibration_model import CalibrationModel
+    from code_functions.peak_features import extract_features, WINDOW_EM
+    from code_functions.uncertainty import calibration_uncertainty
+    levels = np.asarray(synth.CONCENTRATIONS, dtype=np.float64)
+    conc = np.resize(levels, min(n, args.chunk))
+    x, Y = synth.pl_spectra(conc, args.points, rng=rng)
+
+    def run():
+        F = []
+        for size in _chunks(n, args.chunk):
+            F.append(extract_features(x, Y[:size], [WINDOW_EM])['max'][:, 0])
+        F = np.concatenate(F)
+        all_conc = np.resize(levels, n)
+        CalibrationModel.fit(all_conc, F)
+        calibration_uncertainty(all_conc, F, args.resamples, seed=0)
+    return n, run
+
+
+def stage_tauc(n, args, rng):
+    from code_functions.tauc_bandgap import band_gaps
+    wl, A = synth.uvvis_spectra(min(n, args.tauc_chunk), rng=rng)
+
+    def run():
+        for size in _chunks(n, args.tauc_chunk):
+            band_gaps(wl, A[:size], energy_range=(2.6, 3.6))
+    return n, run
+
+
+def stage_render(n, args, rng):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    n_lines = min(n, args.max_render)
+    x, Y = synth.pl_spectra(rng.uniform(0, 200, n_lines), args.points, rng=rng)
+
+    def run():
+        fig, ax = plt.subplots(figsize=(8, 5))
+        for y in Y:
+            ax.plot(x, y, linewidth=0.5)
+        fig.savefig(io.BytesIO(), format='png', dpi=150)
+        plt.close(fig)
+    return n_lines, run
+
+
+STAGE_FUNCS = {'parse': stage_parse, 'aggregate': stage_aggregate, 'calibration': stage_calibration,
+               'tauc': stage_tauc, 'render': stage_render}
+
+
+def measure(stage, n, args):
+    """
+    Prepara los datos de la etapa y mide tiempo y memoria pico de run().
+    """
+    rng = np.random.default_rng(args.seed)
+    args.cleanup = []
+    try:
+        n_done, run = STAGE_FUNCS[stage](n, args, rng)
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+
+        peak = None
+        if args.memory:
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        for folder in args.cleanup:
+            shutil.rmtree(folder, ignore_errors=True)
+    return {'stage': stage, 'size': n, 'spectra': n_done, 'capped': n_done < n, 'seconds': elapsed,
+            'spectra_per_s': n_done / elapsed if elapsed > 0 else None,
+            'peak_mb': peak / 2**20 if peak is not None else None}
+
+
+def environment():
+    import scipy
+    return {'python': sys.version.split()[0], 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de las etapas de procesamiento con datos sintéticos.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='Número de espectros por prueba')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--points', type=int, default=401, help='Puntos por espectro de PL')
+    parser.add_argument('--encoding', choices=synth.ENCODINGS, default='utf-8')
+    parser.add_argument('--sep', choices=list(synth.SEPARATORS), default='tab')
+    parser.add_argument('--decimal', choices=['.', ','], default='.')
+    parser.add_argument('--replicates', type=int, default=3, help='Réplicas por grupo en aggregate')
+    parser.add_argument('--resamples', type=int, default=1000, help='Remuestreos bootstrap en calibration')
+    parser.add_argument('--chunk', type=int, default=10000, help='Espectros por bloque')
+    parser.add_argument('--tauc-chunk', type=int, default=2000, help='Espectros por bloque en tauc')
+    parser.add_argument('--max-files', type=int, default=2000, help='Máximo de archivos escritos en parse')
+    parser.add_argument('--max-render', type=int, default=200, help='Máximo de líneas en render')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='No medir memoria pico')
+    parser.add_argument('--workdir', default=None, help='Carpeta para los archivos temporales')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'etapa':<12}{'tamaño':>10}{'espectros':>11}{'s':>10}{'espectros/s':>14}{'pico MB':>10}")
+    for n in args.sizes:
+        for stage in args.stages:
+            row = measure(stage, n, args)
+            results.append(row)
+            peak = f"{row['peak_mb']:.1f}" if row['peak_mb'] is not None else '-'
+            size = f"{row['spectra']}*" if row['capped'] else str(n)
+            print(f"{stage:<12}{size:>10}{row['spectra']:>11}{row['seconds']:>10.3f}{row['spectra_per_s']:>14.0f}{peak:>10}")
+    if any(row['capped'] for row in results):
+        print('* limitado por --max-files / --max-render; no corresponde al tamaño pedido')
+
+    if args.out:
+        config = {k: v for k, v in vars(args).items() if k not in ('out', 'cleanup')}
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'config': config, 'results': results}, f, indent=2)
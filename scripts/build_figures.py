@@ -0,0 +1,265 @@
+"""
+Generación de las figuras del artículo y del SI sin interfaz gráfica.
+
+Cada figura se registra en FIGURES con el módulo que la construye
+(make_figure) y los datos que usan sus paneles. Las figuras se renderizan con
+el backend Agg en un pool de procesos, y una figura se omite si ni sus datos
+(tamaño y fecha de cada archivo) ni su código (el script y los módulos locales
+que importa) cambiaron desde la última generación, al estilo de make. Uso:
+
+    python scripts/build_figures.py                 # todas las figuras desactualizadas
+    python scripts/build_figures.py uv_vis_tauc_plot --force
+    python scripts/build_figures.py --list
+    python scripts/build_figures.py --force --profile perfil.json
+"""
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from code_functions import profiling
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(SCRIPTS_DIR, '..', '.figure_build_state.json')
+
+PL = os.path.join('datos_espectros', 'PL')
+FTIR = os.path.join('datos_espectros', 'FT-IR')
+UVVIS = os.path.join('datos_espectros', 'UV-Vis')
+ARTICLE = os.path.join('..', 'nitrite_sensor_acsomega_article', 'Figures')
+SI = os.path.join('..', 'SI_nitrite_sensor', 'Figures')
+
+# nombre -> módulo con make_figure(), archivo de salida y datos de entrada de cada panel
+FIGURES = {
+    'calibration_curve_series': {
+        'module': 'calibration_curves_insitu',
+        'output': os.path.join(ARTICLE, 'calibration_curve_series.png'),
+        'panels': {
+            'plot_calibration': [os.path.join(PL, 'ngqd_ca_curva_in_situ', 'ensayo1a16'),
+                                 os.path.join(PL, 'pl_photo_1a16essay.jpg')],
+        },
+    },
+    'calibration_curve_perkin_elmer': {
+        'module': 'calibration_curves_perking',
+        'output': os.path.join(SI, 'calibration_curve_perkin_elmer.png'),
+        'panels': {
+            'plot_calibration': [os.path.join(PL, 'ngqd_ca_curva_PerkinElmer')],
+        },
+    },
+    'ir_pl_comparison_ngqds': {
+        'module': 'ir_pl_ngqds_comparison',
+        'output': os.path.join(ARTICLE, 'ir_pl_comparison_ngqds.png'),
+        'panels': {
+            'pl_plot': [os.path.join(PL, 'ngqd_bc'), os.path.join(PL, 'ngqd_ca'), os.path.join(PL, 'ngqd_glu'),
+                        os.path.join(PL, 'pl_ngqd_viales.png'), os.path.join(PL, 'pl_ngqd_cuveta.png')],
+            'plot_ir': [os.path.join(FTIR, fn) for fn in ('N-GQD_CA_BLC.txt', 'N-GQD_BC_BLC.txt', 'N-GQD_Glu_BLC.txt')],
+        },
+    },
+    'plTime_irNitrites_spectra': {
+        'module': 'pl_ir_ngqd_nitrites',
+        'output': os.path.join(ARTICLE, 'plTime_irNitrites_spectra.png'),
+        'panels': {
+            'plot_pl_time': [os.path.join(PL, 'ngqd_ca_tiempo_interaccion'),
+                             os.path.join(PL, 'PL_interaccionNO_cuali.jpg')],
+            'plot_ir_nitrites': [os.path.join(FTIR, fn) for fn in ('N-GQD_CA_BLC.txt', 'N-GQD_CA_pH3_BLC.txt', 'N-GQD_CA_NO2_BLC.txt')],
+        },
+    },
+    'pl_ngqd_ca_effects_combined': {
+        'module': 'pl_ngqd_ca_effects',
+        'output': os.path.join(ARTICLE, 'pl_ngqd_ca_effects_combined.png'),
+        'panels': {
+            'plot_lambda_ex': [os.path.join(PL, 'ngqd_ca_lamda_ex')],
+            'plot_dilutions': [os.path.join(PL, 'ngqd_ca_dilutions')],
+            'plot_ph_effects': [os.path.join(PL, 'ngqd_ca_pH_soln1a4')],
+        },
+    },
+    'ir_ngqd_precursores': {
+        'module': 'ir_precursors',
+        'output': os.path.join(SI, 'ir_ngqd_precursores.png'),
+        'panels': {
+            'plot_ir_precursors': [os.path.join(FTIR, fn) for fn in (
+                'N-GQD_CA_BLC.txt', 'N-GQD_BC_BLC.txt', 'N-GQD_Glu_BLC.txt', 'Citric_Acid.csv', 'EDA.csv',
+                'Black_Carbon.csv', 'D_glucosa.csv', 'Hexadecilamina.csv')],
+        },
+        'savefig': {'bbox_inches': 'tight'},
+    },
+    'uv_vis_tauc_plot': {
+        'module': 'uv_vis_tauc_spectra',
+        'output': os.path.join(SI, 'uv_vis_tauc_plot.png'),
+        'panels': {
+            'plot_tauc': [os.path.join(UVVIS, 'ngqd_ca_uvvis.txt')],
+        },
+    },
+}
+
+
+def _module_path(module_name):
+    return os.path.join(SCRIPTS_DIR, *module_name.split('.')) + '.py'
+
+
+def _local_sources(module_name, seen):
+    """
+    Rutas del script y de todos los módulos locales que importa (recursivo).
+    En 'from paquete import nombre', nombre puede ser un submódulo, así que
+    también se busca paquete/nombre.py.
+    """
+    path = _module_path(module_name)
+    if path in seen or not os.path.isfile(path):
+        return seen
+    seen.add(path)
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                _local_sources(alias.name, seen)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            _local_sources(node.module, seen)
+            for alias in node.names:
+                _local_sources(f'{node.module}.{alias.name}', seen)
+    return seen
+
+
+def code_hash(name):
+    target = FIGURES[name]
+    digest = hashlib.sha256(json.dumps(target, sort_keys=True).encode('utf-8'))
+    for path in sorted(_local_sources(target['module'], set())):
+        digest.update(os.path.relpath(path, SCRIPTS_DIR).encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def inputs_hash(name):
+    """
+    Huella de los datos de entrada: ruta, tamaño y fecha de cada archivo.
+    """
+    digest = hashlib.sha256()
+    for input_path in sorted({p for paths in FIGURES[name]['panels'].values() for p in paths}):
+        if os.path.isdir(input_path):
+            for dir_path, dir_names, file_names in os.walk(input_path):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    stat = os.stat(os.path.join(dir_path, file_name))
+                    digest.update(f'{os.path.join(dir_path, file_name)}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode('utf-8'))
+        elif os.path.isfile(input_path):
+            stat = os.stat(input_path)
+            digest.update(f'{input_path}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode('utf-8'))
+        else:
+            digest.update(f'{input_path}|missing\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def output_path(name):
+    return FIGURES[name]['output']
+
+
+def _render(name):
+    """
+    Construye y guarda una figura. Se ejecuta en un proceso del pool.
+    Devuelve (nombre, segundos, error o None, perfil o None).
+    """
+    # El proceso del pool puede reutilizarse: el perfil de cada figura empieza vacío
+    profiling.reset()
+    start = time.perf_counter()
+    error = None
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        target = FIGURES[name]
+        with profiling.stage(f'import:{name}'):
+            module = importlib.import_module(target['module'])
+        with profiling.stage(f'make_figure:{name}'):
+            fig = module.make_figure()
+        os.makedirs(os.path.dirname(target['output']) or '.', exist_ok=True)
+        with profiling.stage(f'savefig:{name}'):
+            fig.savefig(target['output'], dpi=300, **target.get('savefig', {}))
+        plt.close(fig)
+    except Exception:
+        error = traceback.format_exc()
+    profile = profiling.export() if profiling.enabled() else None
+    return name, time.perf_counter() - start, error, profile
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def build(names=None, force=False, jobs=None):
+    """
+    Renderiza las figuras desactualizadas. Devuelve la lista de figuras que fallaron.
+    """
+    names = list(names or FIGURES)
+    unknown = [n for n in names if n not in FIGURES]
+    if unknown:
+        raise ValueError(f'Figuras desconocidas: {unknown}. Disponibles: {list(FIGURES)}')
+
+    state = load_state()
+    stamps, pending = {}, []
+    for name in names:
+        stamps[name] = {'code': code_hash(name), 'inputs': inputs_hash(name)}
+        up_to_date = (state.get(name) == stamps[name] and os.path.exists(output_path(name)))
+        if force or not up_to_date:
+            pending.append(name)
+        else:
+            print(f'{name}: sin cambios, se omite')
+
+    failed = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_render, name) for name in pending]
+            for future in as_completed(futures):
+                name, elapsed, error, profile = future.result()
+                if profile is not None:
+                    profiling.merge(profile)
+                if error is None:
+                    state[name] = stamps[name]
+                    print(f'{name}: generada en {elapsed:.1f} s -> {output_path(name)}')
+                else:
+                    state.pop(name, None)
+                    failed.append(name)
+                    print(f'{name}: ERROR\n{error}')
+        save_state(state)
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera las figuras del artículo y del SI.')
+    parser.add_argument('names', nargs='*', help='Figuras a generar (por defecto, todas)')
+    parser.add_argument('--force', action='store_true', help='Regenerar aunque no haya cambios')
+    parser.add_argument('--jobs', type=int, default=None, help='Procesos en paralelo')
+    parser.add_argument('--list', action='store_true', help='Listar las figuras registradas')
+    parser.add_argument('--profile', nargs='?', const=profiling.DEFAULT_OUT, default=None, metavar='JSON',
+                        help='Medir etapas y guardar el perfil (y la traza Chrome) en JSON')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, target in FIGURES.items():
+            print(f"{name}: {target['module']} ({', '.join(target['panels'])})")
+        sys.exit(0)
+
+    if args.profile:
+        # Los procesos del pool heredan la activación por la variable de entorno
+        os.environ[profiling.ENV_VAR] = '1'
+        profiling.enable()
+    failed = build(args.names, force=args.force, jobs=args.jobs)
+    if args.profile:
+        profiling.print_report()
+        profiling.write_all(args.profile)
+    sys.exit(1 if failed else 0)
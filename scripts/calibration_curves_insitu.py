@@ -1,128 +1,177 @@
 import spectrum_data_loader as sdl
 import os
-import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
-import matplotlib.image as mpimg
-from scipy.stats import linregress
+from code_functions.replicate_stack import ReplicateStack
+from code_functions.peak_features import extract_features, WINDOW_EM
+from code_functions.uncertainty import calibration_uncertainty
+
+DATA_ROOT = 'datos_espectros'
+HOME = os.path.join(DATA_ROOT, 'PL', 'ngqd_ca_curva_in_situ', 'ensayo1a16')
+IMG_PATH = os.path.join('datos_espectros', 'PL', 'pl_photo_1a16essay.jpg')
+OUTPUT_PATH = os.path.join('..', 'nitrite_sensor_acsomega_article', 'Figures', 'calibration_curve_series.png')
 
 # --- 1. LECTURA Y PROCESAMIENTO DE DATOS ---
-home = os.path.join('datos_espectros', 'PL', 'ngqd_ca_curva_in_situ', 'ensayo1a16')
-folders_names_list = os.listdir(home)
-
-plot_dic = {}
-max_int_em_dic = {}
-std_int_em_dic = {}
-
-for folder_name in folders_names_list:
-    folder_path = os.path.join(home, folder_name)
-    file_name_list = os.listdir(folder_path)
-    dfs_list, max_int_em_list = [], []
-
-    for file_name in file_name_list:
-        file_path = os.path.join(folder_path, file_name)
-        longitud_onda, intensidad = sdl.load_xy_data(file_path)
-        df = pd.DataFrame({'Longitud de onda': longitud_onda, 'Intensidad': intensidad})
-        dfs_list.append(df)
-        df_filtered_em = df[(df['Longitud de onda'] >= 395) & (df['Longitud de onda'] <= 650)]
-        max_int_em_list.append(df_filtered_em['Intensidad'].max())
-    
-    df_concat = pd.concat(dfs_list)
-    grouped = df_concat.groupby('Longitud de onda')['Intensidad']
-    df_proc = grouped.agg(['mean', 'std', 'count']).reset_index()
-    df_proc['mean_suavizada'] = df_proc['mean'].rolling(window=5, center=True, min_periods=1).mean()
-
-    conc_label = folder_name.replace('uM', r' µM')
-    plot_dic[conc_label] = df_proc
-    max_int_em_dic[conc_label] = np.mean(max_int_em_list)
-    std_int_em_dic[conc_label] = np.std(max_int_em_list)
+def load_data(home=HOME, data_root=DATA_ROOT):
+    from code_functions.catalog import Catalog
+    # La concentración de cada carpeta sale del catálogo (reescaneo incremental)
+    with Catalog.open(data_root) as catalog:
+        entries = catalog.query(under=catalog.relative_folder(home))
+    folders = {}
+    for path, meta in entries:
+        if np.isnan(meta['concentration']):
+            continue
+        folder = folders.setdefault(path.rsplit('/', 1)[0], (meta['concentration'], []))
+        folder[1].append(os.path.join(data_root, *path.split('/')))
+
+    # Todas las réplicas de todas las carpetas de concentración se leen en paralelo
+    spectra = iter(sdl.load_many([fp for _, files in folders.values() for fp in files]))
+
+    plot_dic = {}
+    max_int_em_dic = {}
+    std_int_em_dic = {}
+    replicates_dic = {}
+
+    # Los diccionarios se indexan por la concentración numérica (µM), en orden creciente
+    for conc, files in sorted(folders.values(), key=lambda item: item[0]):
+        stack = ReplicateStack.from_xy([next(spectra) for _ in files])
+        # Intensidad máxima de emisión de todas las réplicas a la vez
+        max_int_em_list = extract_features(stack.x, stack.Y, [WINDOW_EM])['max'][:, 0]
+
+        # Promedio de réplicas: media, desviación, conteo y media suavizada
+        df_proc = stack.to_dataframe()
+
+        conc = float(conc)
+        plot_dic[conc] = df_proc
+        max_int_em_dic[conc] = np.mean(max_int_em_list)
+        std_int_em_dic[conc] = np.std(max_int_em_list)
+        replicates_dic[conc] = max_int_em_list
+
+    return plot_dic, max_int_em_dic, std_int_em_dic, replicates_dic
 
 # --- 2. CÁLCULOS PARA CURVAS DE CALIBRACIÓN ---
-concentrations_str_unsorted = list(max_int_em_dic.keys())
-# Extraer número, convertir a int, ordenar y luego reformatear a string
-concentrations_num = sorted([int(s.split(' ')[0]) for s in concentrations_str_unsorted])
-concentrations_str = [str(c) + r' µM' for c in concentrations_num]
-
-F_means = np.array([max_int_em_dic[s] for s in concentrations_str])
-F_stds = np.array([std_int_em_dic[s] for s in concentrations_str])
-F0_mean = F_means[0]
-F0_std = F_stds[0]
-
-# Para el gráfico de Stern-Volmer
-sv_y_ratio = F0_mean / F_means
-relative_error = np.sqrt((F0_std / F0_mean)**2 + (F_stds / F_means)**2)
-sv_y_error = sv_y_ratio * relative_error
-
-# Rango lineal y ajuste de Stern-Volmer (hasta 100 µM)
-linear_range_mask = np.array(concentrations_num) <= 100
-x_fit = np.array(concentrations_num)[linear_range_mask]
-y_fit_sv = sv_y_ratio[linear_range_mask]
-slope_sv, intercept_sv, r_value_sv, _, _ = linregress(x_fit, y_fit_sv)
-K_sv = slope_sv
-
-# Ajuste de la curva de calibración simple para el LOD
-y_fit_simple = F_means[linear_range_mask]
-slope_simple, intercept_simple, r_value_simple, _, _ = linregress(x_fit, y_fit_simple)
-m = abs(slope_simple)
-sigma_blanco = F0_std
-lod = (3 * sigma_blanco) / m
+def compute_calibration(max_int_em_dic, std_int_em_dic, replicates_dic=None, n_resamples=2000):
+    """
+    Ajustes de Stern-Volmer e intensidad vs. concentración y LOD.
+    Con las réplicas de cada concentración (replicates_dic) se agregan
+    intervalos de confianza del 95 % por bootstrap en 'ci'.
+    Devuelve un diccionario con todos los valores que usan los gráficos.
+    """
+    from scipy.stats import linregress
+    concentrations_num = sorted(max_int_em_dic)
+
+    F_means = np.array([max_int_em_dic[c] for c in concentrations_num])
+    F_stds = np.array([std_int_em_dic[c] for c in concentrations_num])
+    F0_mean = F_means[0]
+    F0_std = F_stds[0]
+
+    # Para el gráfico de Stern-Volmer
+    sv_y_ratio = F0_mean / F_means
+    relative_error = np.sqrt((F0_std / F0_mean)**2 + (F_stds / F_means)**2)
+    sv_y_error = sv_y_ratio * relative_error
+
+    # Rango lineal y ajuste de Stern-Volmer (hasta 100 µM)
+    linear_range_mask = np.array(concentrations_num) <= 100
+    x_fit = np.array(concentrations_num)[linear_range_mask]
+    y_fit_sv = sv_y_ratio[linear_range_mask]
+    slope_sv, intercept_sv, r_value_sv, _, _ = linregress(x_fit, y_fit_sv)
+    K_sv = slope_sv
+
+    # Ajuste de la curva de calibración simple para el LOD
+    y_fit_simple = F_means[linear_range_mask]
+    slope_simple, intercept_simple, r_value_simple, _, _ = linregress(x_fit, y_fit_simple)
+    m = abs(slope_simple)
+    sigma_blanco = F0_std
+    lod = (3 * sigma_blanco) / m
+
+    ci = None
+    if replicates_dic:
+        conc = np.concatenate([[c] * len(v) for c, v in replicates_dic.items()])
+        F = np.concatenate([np.asarray(v, dtype=np.float64) for v in replicates_dic.values()])
+        ci = calibration_uncertainty(conc, F, n_resamples, linear_range=(0, 100), seed=0)['summary']
+
+    return {
+        'concentrations_num': concentrations_num, 'F_means': F_means, 'F_stds': F_stds,
+        'sv_y_ratio': sv_y_ratio, 'sv_y_error': sv_y_error, 'x_fit': x_fit,
+        'slope_sv': slope_sv, 'intercept_sv': intercept_sv, 'r_value_sv': r_value_sv, 'K_sv': K_sv,
+        'slope_simple': slope_simple, 'intercept_simple': intercept_simple,
+        'r_value_simple': r_value_simple, 'lod': lod, 'ci': ci,
+    }
 
 # --- 3. CREACIÓN DE GRÁFICOS ---
-fig, axs = plt.subplots(1, 3, figsize=(18, 5.5))
-
-# --- Gráfico a) Espectros de Emisión ---
-for conc_label, plot_data in plot_dic.items():
-    axs[0].plot(plot_data['Longitud de onda'], plot_data['mean_suavizada'], label=conc_label, linewidth=2)
-    axs[0].fill_between(plot_data['Longitud de onda'], plot_data['mean_suavizada'] - plot_data['std'], plot_data['mean_suavizada'] + plot_data['std'], alpha=0.2)
-
-img_path = os.path.join('datos_espectros', 'PL', 'pl_photo_1a16essay.jpg')
-img_calibration_curve = mpimg.imread(img_path)
-
-axs[0].set_xlabel('Wavelength (nm)', fontsize=13)
-axs[0].set_xlim([390, 700])
-axs[0].set_ylim([-10, 2000])
-axs[0].set_ylabel('Intensity (a.u.)', fontsize=13)
-axs[0].legend(title=r'[$\text{NO}_{2}^{-}$]', fontsize=9)
-axs[0].grid(True, linestyle='--', alpha=0.6)
-
-# Posición y tamaño para la imagen [izquierda, abajo, ancho, alto] en coordenadas de la figura (0 a 1)
-ax_inset = axs[0].inset_axes([0.65, 0.2, 0.3, 0.3])
-ax_inset.imshow(img_calibration_curve)
-ax_inset.axis('off')
-
-# --- Gráfico b) Curva de Calibración (Intensidad vs. Conc.) ---
-axs[1].errorbar(concentrations_num, F_means, yerr=F_stds, fmt='o', color='b', ecolor='lightgray', elinewidth=3, capsize=5, label='Experimental data')
-axs[1].plot(x_fit, slope_simple * x_fit + intercept_simple, 'r--', label='Linear fit')
-text_simple = (f'$y = {slope_simple:.2f}x + {intercept_simple:.2f}$\n'
-               f'$R^2 = {r_value_simple**2:.4f}$\n'
-               f'LOD = {lod:.2f} µM')
-axs[1].text(0.05, 0.2, text_simple, transform=axs[1].transAxes, fontsize=11, bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
-axs[1].set_xlabel(r'[$\text{NO}_{2}^{-}$] (µM)', fontsize=13)
-axs[1].set_ylabel('Intensity (a.u.)', fontsize=13)
-axs[1].legend()
-axs[1].grid(True, linestyle='--', alpha=0.6)
-
-# --- Gráfico c) Gráfico de Stern-Volmer ---
-axs[2].errorbar(concentrations_num, sv_y_ratio, yerr=sv_y_error, fmt='o', color='g', ecolor='lightgray', elinewidth=3, capsize=5, label='Experimental data')
-axs[2].plot(x_fit, slope_sv * x_fit + intercept_sv, 'r--', label='Linear fit')
-text_sv = (f'$F_0/F = {K_sv:.3f}' + r' [\text{NO}_{2}^{-}]' + f'+ {intercept_sv:.3f}$\n'
-           f'$R^2 = {r_value_sv**2:.4f}$\n'
-           f"$K_{{sv}} = {K_sv:.4f}$ L/µmol")
-axs[2].text(0.05, 0.65, text_sv, transform=axs[2].transAxes, fontsize=11, bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
-axs[2].set_xlabel(r'[$\text{NO}_{2}^{-}$] (µM)', fontsize=13)
-axs[2].set_ylabel('$F_0 / F$', fontsize=13)
-axs[2].legend()
-axs[2].grid(True, linestyle='--', alpha=0.6)
-
-# --- 4. FINALIZACIÓN Y GUARDADO ---
-etiquetas = ['a)', 'b)', 'c)']
-for ax, etiqueta in zip(axs, etiquetas):
-    ax.tick_params(axis='both', which='major', labelsize=12)
-    ax.text(-0.1, 1.05, etiqueta, transform=ax.transAxes, fontsize=16, fontweight='bold', va='top', ha='right')
-
-fig.tight_layout()
-
-output_path = os.path.join('..', 'nitrite_sensor_acsomega_article', 'Figures', 'calibration_curve_series.png')
-plt.savefig(output_path, dpi=300)
-
-plt.show()
\ No newline at end of file
+def plot_calibration(axs, plot_dic, cal, show_ci=False):
+    import matplotlib.image as mpimg
+    x_fit = cal['x_fit']
+
+    # --- Gráfico a) Espectros de Emisión ---
+    for conc, plot_data in plot_dic.items():
+        axs[0].plot(plot_data['Longitud de onda'], plot_data['mean_suavizada'], label=f'{conc:g} µM', linewidth=2)
+        axs[0].fill_between(plot_data['Longitud de onda'], plot_data['mean_suavizada'] - plot_data['std'], plot_data['mean_suavizada'] + plot_data['std'], alpha=0.2)
+
+    img_calibration_curve = mpimg.imread(IMG_PATH)
+
+    axs[0].set_xlabel('Wavelength (nm)', fontsize=13)
+    axs[0].set_xlim([390, 700])
+    axs[0].set_ylim([-10, 2000])
+    axs[0].set_ylabel('Intensity (a.u.)', fontsize=13)
+    axs[0].legend(title=r'[$\text{NO}_{2}^{-}$]', fontsize=9)
+    axs[0].grid(True, linestyle='--', alpha=0.6)
+
+    # Posición y tamaño para la imagen [izquierda, abajo, ancho, alto] en coordenadas de la figura (0 a 1)
+    ax_inset = axs[0].inset_axes([0.65, 0.2, 0.3, 0.3])
+    ax_inset.imshow(img_calibration_curve)
+    ax_inset.axis('off')
+
+    # --- Gráfico b) Curva de Calibración (Intensidad vs. Conc.) ---
+    axs[1].errorbar(cal['concentrations_num'], cal['F_means'], yerr=cal['F_stds'], fmt='o', color='b', ecolor='lightgray', elinewidth=3, capsize=5, label='Experimental data')
+    axs[1].plot(x_fit, cal['slope_simple'] * x_fit + cal['intercept_simple'], 'r--', label='Linear fit')
+    text_simple = (f"$y = {cal['slope_simple']:.2f}x + {cal['intercept_simple']:.2f}$\n"
+                   f"$R^2 = {cal['r_value_simple']**2:.4f}$\n"
+                   f"LOD = {cal['lod']:.2f} µM")
+    if show_ci and cal['ci']:
+        text_simple += f"\n95% CI: {cal['ci']['lod']['ci_low']:.2f}–{cal['ci']['lod']['ci_high']:.2f} µM"
+    axs[1].text(0.05, 0.2, text_simple, transform=axs[1].transAxes, fontsize=11, bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
+    axs[1].set_xlabel(r'[$\text{NO}_{2}^{-}$] (µM)', fontsize=13)
+    axs[1].set_ylabel('Intensity (a.u.)', fontsize=13)
+    axs[1].legend()
+    axs[1].grid(True, linestyle='--', alpha=0.6)
+
+    # --- Gráfico c) Gráfico de Stern-Volmer ---
+    axs[2].errorbar(cal['concentrations_num'], cal['sv_y_ratio'], yerr=cal['sv_y_error'], fmt='o', color='g', ecolor='lightgray', elinewidth=3, capsize=5, label='Experimental data')
+    axs[2].plot(x_fit, cal['slope_sv'] * x_fit + cal['intercept_sv'], 'r--', label='Linear fit')
+    text_sv = (f"$F_0/F = {cal['K_sv']:.3f}" + r' [\text{NO}_{2}^{-}]' + f"+ {cal['intercept_sv']:.3f}$\n"
+               f"$R^2 = {cal['r_value_sv']**2:.4f}$\n"
+               f"$K_{{sv}} = {cal['K_sv']:.4f}$ L/µmol")
+    if show_ci and cal['ci']:
+        text_sv += f"\n95% CI: {cal['ci']['K_sv']['ci_low']:.4f}–{cal['ci']['K_sv']['ci_high']:.4f}"
+    axs[2].text(0.05, 0.65, text_sv, transform=axs[2].transAxes, fontsize=11, bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
+    axs[2].set_xlabel(r'[$\text{NO}_{2}^{-}$] (µM)', fontsize=13)
+    axs[2].set_ylabel('$F_0 / F$', fontsize=13)
+    axs[2].legend()
+    axs[2].grid(True, linestyle='--', alpha=0.6)
+
+    # --- 4. FINALIZACIÓN ---
+    etiquetas = ['a)', 'b)', 'c)']
+    for ax, etiqueta in zip(axs, etiquetas):
+        ax.tick_params(axis='both', which='major', labelsize=12)
+        ax.text(-0.1, 1.05, etiqueta, transform=ax.transAxes, fontsize=16, fontweight='bold', va='top', ha='right')
+
+def make_figure(show_ci=False):
+    """
+    Figura de la curva de calibración. show_ci agrega a las anotaciones de LOD
+    y K_sv su intervalo de confianza del 95 % por bootstrap (no va en la
+    figura del artículo).
+    """
+    import matplotlib.pyplot as plt
+    plot_dic, max_int_em_dic, std_int_em_dic, replicates_dic = load_data()
+    cal = compute_calibration(max_int_em_dic, std_int_em_dic, replicates_dic if show_ci else None)
+
+    fig, axs = plt.subplots(1, 3, figsize=(18, 5.5))
+    plot_calibration(axs, plot_dic, cal, show_ci=show_ci)
+    fig.tight_layout()
+    return fig
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+    fig = make_figure()
+    fig.savefig(OUTPUT_PATH, dpi=300)
+    plt.show()
@@ -0,0 +1,124 @@
+"""
+Ajuste no lineal por mínimos cuadrados de muchas curvas a la vez.
+
+levenberg_marquardt resuelve N problemas independientes con el mismo modelo
+(p. ej. una curva de cinética por longitud de onda o por experimento) en un
+solo bucle de iteraciones: en cada paso se arman las N matrices JᵀJ (K × K)
+con einsum y se resuelven juntas con np.linalg.solve, en lugar de llamar a
+scipy.optimize.curve_fit curva por curva. Cada curva tiene su propio
+amortiguamiento λ y deja de iterar cuando converge.
+
+El modelo y su jacobiano reciben x ((T,) o (n, T)) y los parámetros (n, K) y
+devuelven (n, T) y (n, T, K). Los NaN de Y tienen peso cero; las curvas con
+menos puntos válidos que parámetros + 1 o con p0 no finito no se ajustan y
+quedan como NaN sin afectar al resto del lote.
+"""
+import numpy as np
+
+# Regularización mínima de JᵀJ para que np.linalg.solve no falle con
+# parámetros que no afectan al modelo (p. ej. una amplitud nula)
+JITTER = 1e-12
+
+
+def _rows(x, idx):
+    return x[idx] if x.ndim == 2 else x
+
+
+def levenberg_marquardt(model, jacobian, x, Y, p0, lower=None, upper=None, max_iter=100, tol=1e-10, lam0=1e-3):
+    """
+    Ajusta model(x, P) a cada fila de Y (N, T) a partir de p0 (N, K).
+
+    lower, upper: límites (K,) o (N, K) que se aplican recortando cada paso
+    tol: tolerancia relativa sobre la suma de cuadrados y sobre los parámetros
+
+    Devuelve un diccionario con:
+        'params'        (N, K) parámetros ajustados
+        'cov'           (N, K, K) covarianza s²·(JᵀJ)⁻¹
+        'std'           (N, K) desviación estándar de cada parámetro
+        'residual_std'  (N,) desviación residual s
+        'ssr'           (N,) suma de cuadrados de los residuos
+        'r2'            (N,) coeficiente de determinación
+        'n_points'      (N,) puntos válidos de cada curva
+        'converged'     (N,) booleano
+        'n_iter'        iteraciones del bucle
+    """
+    x = np.asarray(x, dtype=np.float64)
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    P = np.array(np.broadcast_to(np.asarray(p0, dtype=np.float64), (Y.shape[0], np.shape(p0)[-1])))
+    N, K = P.shape
+    lower = np.broadcast_to(-np.inf if lower is None else np.asarray(lower, dtype=np.float64), P.shape)
+    upper = np.broadcast_to(np.inf if upper is None else np.asarray(upper, dtype=np.float64), P.shape)
+    P = np.clip(P, lower, upper)
+
+    w = (~np.isnan(Y)).astype(np.float64)
+    Y0 = np.where(w > 0, Y, 0.0)
+    n_points = w.sum(axis=1)
+    # Curvas sin datos suficientes o sin valores iniciales: fuera del ajuste
+    fittable = (n_points > K) & np.isfinite(P).all(axis=1)
+    P[~fittable] = 0.0
+    residual = w * (Y0 - model(x, P))
+    cost = np.sum(residual**2, axis=1)
+    fittable &= np.isfinite(cost)
+    lam = np.full(N, lam0)
+    active = fittable.copy()
+    converged = np.zeros(N, dtype=bool)
+    eye = np.eye(K)
+
+    n_iter = 0
+    for n_iter in range(1, max_iter + 1):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        xs = _rows(x, idx)
+        J = jacobian(xs, P[idx]) * w[idx, :, None]
+        A = np.einsum('ntk,ntl->nkl', J, J)
+        g = np.einsum('ntk,nt->nk', J, residual[idx])
+        # Escalado de Marquardt: λ·diag(JᵀJ)
+        diag = np.einsum('nkk->nk', A)
+        damped = A + (lam[idx, None] * diag + JITTER * (1 + diag))[:, :, None] * eye
+        delta = np.linalg.solve(damped, g[..., None])[..., 0]
+        P_new = np.clip(P[idx] + delta, lower[idx], upper[idx])
+
+        r_new = w[idx] * (Y0[idx] - model(xs, P_new))
+        cost_new = np.sum(r_new**2, axis=1)
+        better = np.isfinite(cost_new) & (cost_new < cost[idx])
+        step = np.abs(P_new - P[idx]) <= tol * (np.abs(P[idx]) + tol)
+
+        ok = idx[better]
+        small_gain = (cost[ok] - cost_new[better]) <= tol * cost[ok]
+        P[ok], residual[ok], cost[ok] = P_new[better], r_new[better], cost_new[better]
+        lam[idx] = np.where(better, lam[idx] / 10, lam[idx] * 10)
+
+        done = np.zeros(idx.size, dtype=bool)
+        done[better] = small_gain
+        done |= step.all(axis=1)
+        converged[idx[done]] = True
+        # Sin mejora con un amortiguamiento enorme: mínimo local alcanzado
+        stalled = lam[idx] > 1e12
+        converged[idx[stalled]] = True
+        active[idx[done | stalled]] = False
+
+    # Covarianza en el óptimo, solo de las curvas ajustadas
+    dof = np.maximum(n_points - K, 1)
+    s2 = np.where(fittable, cost / dof, np.nan)
+    cov = np.full((N, K, K), np.nan)
+    idx = np.flatnonzero(fittable)
+    if idx.size:
+        J = jacobian(_rows(x, idx), P[idx]) * w[idx, :, None]
+        cov[idx] = np.linalg.pinv(np.einsum('ntk,ntl->nkl', J, J)) * s2[idx, None, None]
+    P[~fittable] = np.nan
+    cost = np.where(fittable, cost, np.nan)
+    ss_tot = np.sum(w * (Y0 - (Y0.sum(axis=1) / np.maximum(n_points, 1))[:, None])**2, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r2 = 1 - cost / ss_tot
+    return {'params': P, 'cov': cov, 'std': np.sqrt(np.clip(np.einsum('nkk->nk', cov), 0, None)),
+            'residual_std': np.sqrt(s2), 'ssr': cost, 'r2': r2, 'n_points': n_points.astype(int),
+            'converged': converged, 'n_iter': n_iter}
+
+
+def aic(ssr, n_points, n_params):
+    """
+    Criterio de Akaike para residuos gaussianos, para comparar modelos.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return n_points * np.log(ssr / n_points) + 2 * n_params
@@ -0,0 +1,187 @@
+"""
+Modelo de calibración serializable para cuantificar nitrito en espectros de PL.
+
+El modelo guarda la recta ajustada (Stern-Volmer: F0/F = m·c + b, o lineal:
+F = m·c + b) junto con la covarianza de sus parámetros, y la invierte de forma
+vectorizada sobre una matriz de espectros desconocidos (N × M), propagando la
+incertidumbre del ajuste a cada concentración estimada.
+"""
+import json
+import math
+import os
+import numpy as np
+from code_functions import profiling
+from code_functions.linear_fit import batched_linear_fit
+from code_functions.path_metadata import parse_path_metadata
+
+KINDS = ('stern_volmer', 'linear')
+FEATURES = ('max', 'integral')
+
+
+# Característica de peak_features que corresponde a cada feature del modelo
+_PEAK_FEATURE = {'max': 'max', 'integral': 'area'}
+
+
+def window_features(x, Y, window=(395, 650), feature='max'):
+    """
+    Máximo o integral de cada espectro de Y (N × M) dentro de la ventana de
+    emisión, con peak_features.extract_features (los NaN se ignoran). Si la
+    ventana no contiene puntos de la rejilla el resultado es NaN, con un aviso.
+    """
+    from code_functions.peak_features import extract_features
+    if feature not in FEATURES:
+        raise ValueError(f'feature debe ser uno de {FEATURES}, no {feature!r}')
+    x = np.asarray(x, dtype=np.float64)
+    values = extract_features(x, Y, [window])[_PEAK_FEATURE[feature]][:, 0]
+    if x.size == 0 or not ((x >= window[0]) & (x <= window[1])).any():
+        extent = f'{np.min(x):g}–{np.max(x):g}' if x.size else 'vacía'
+        print(f'La ventana {window[0]:g}–{window[1]:g} no contiene puntos de la rejilla ({extent}); '
+              f'{feature} queda como NaN')
+    return values
+
+
+def linear_fit(x, y):
+    """
+    Mínimos cuadrados en forma cerrada (linear_fit.batched_linear_fit).
+    Devuelve (pendiente, intercepto, matriz de covarianza 2×2 de (m, b),
+    desviación residual, R²).
+    """
+    fit = batched_linear_fit(x, y, full=True)
+    cov = np.array([[fit['var_slope'], fit['cov']], [fit['cov'], fit['var_intercept']]], dtype=np.float64)
+    return float(fit['slope']), float(fit['intercept']), cov, math.sqrt(fit['s2']), float(fit['r2'])
+
+
+class CalibrationModel:
+    """
+    kind: 'stern_volmer' (F0/F vs. c) o 'linear' (F vs. c)
+    feature: 'max' o 'integral' de la ventana de emisión
+    F0: intensidad del blanco (solo se usa en Stern-Volmer)
+    cov: covarianza de (pendiente, intercepto)
+    residual_std: desviación de los residuos del ajuste, en unidades de y
+    """
+
+    def __init__(self, kind, slope, intercept, cov, residual_std, r2, F0=math.nan,
+                 window=(395, 650), feature='max', lod=math.nan, linear_range=(0, 100)):
+        if kind not in KINDS:
+            raise ValueError(f'kind debe ser uno de {KINDS}, no {kind!r}')
+        self.kind = kind
+        self.slope = float(slope)
+        self.intercept = float(intercept)
+        self.cov = np.asarray(cov, dtype=np.float64)
+        self.residual_std = float(residual_std)
+        self.r2 = float(r2)
+        self.F0 = float(F0)
+        self.window = tuple(window)
+        self.feature = feature
+        self.lod = float(lod)
+        self.linear_range = tuple(linear_range)
+
+    @classmethod
+    @profiling.timed('calibration_fit')
+    def fit(cls, conc, F, kind='stern_volmer', window=(395, 650), feature='max', linear_range=(0, 100)):
+        """
+        Ajusta el modelo a concentraciones (µM) y valores de la característica F
+        (uno por espectro; las réplicas se promedian por concentración, como en
+        calibration_curves_insitu.py). El blanco es la concentración más baja.
+        """
+        conc = np.asarray(conc, dtype=np.float64)
+        F = np.asarray(F, dtype=np.float64)
+        levels, inverse = np.unique(conc, return_inverse=True)
+        counts = np.bincount(inverse)
+        F_means = np.bincount(inverse, weights=F) / counts
+        F_stds = np.sqrt(np.bincount(inverse, weights=(F - F_means[inverse])**2) / counts)
+        F0, sigma_blank = F_means[0], F_stds[0]
+
+        mask = (levels >= linear_range[0]) & (levels <= linear_range[1])
+        slope_simple = linear_fit(levels[mask], F_means[mask])[0]
+        lod = 3 * sigma_blank / abs(slope_simple)
+
+        y = F0 / F_means if kind == 'stern_volmer' else F_means
+        slope, intercept, cov, residual_std, r2 = linear_fit(levels[mask], y[mask])
+        return cls(kind, slope, intercept, cov, residual_std, r2, F0=F0, window=window,
+                   feature=feature, lod=lod, linear_range=linear_range)
+
+    @classmethod
+    def fit_spectra(cls, conc, x, Y, **kwargs):
+        model_kwargs = {k: kwargs[k] for k in ('window', 'feature') if k in kwargs}
+        F = window_features(x, Y, **model_kwargs)
+        return cls.fit(conc, F, **kwargs)
+
+    # --- Serialización ---
+    def to_dict(self):
+        return {
+            'kind': self.kind, 'slope': self.slope, 'intercept': self.intercept,
+            'cov': self.cov.tolist(), 'residual_std': self.residual_std, 'r2': self.r2,
+            'F0': self.F0, 'window': list(self.window), 'feature': self.feature,
+            'lod': self.lod, 'linear_range': list(self.linear_range),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    # --- Predicción ---
+    def predict_features(self, F):
+        """
+        Invierte el modelo sobre valores de la característica. Devuelve
+        (concentración, desviación estándar) en µM, propagando la varianza
+        residual y la covarianza de (m, b):
+            var(c) = [s² + var(b) + c²·var(m) + 2c·cov(m, b)] / m²
+        """
+        F = np.asarray(F, dtype=np.float64)
+        y = self.F0 / F if self.kind == 'stern_volmer' else F
+        conc = (y - self.intercept) / self.slope
+        var_m, cov_mb, var_b = self.cov[0, 0], self.cov[0, 1], self.cov[1, 1]
+        var_c = (self.residual_std**2 + var_b + conc**2 * var_m + 2 * conc * cov_mb) / self.slope**2
+        return conc, np.sqrt(np.maximum(var_c, 0.0))
+
+    def predict(self, x, Y):
+        """
+        Concentración y su incertidumbre para cada espectro de Y (N × M).
+        """
+        return self.predict_features(window_features(x, Y, self.window, self.feature))
+
+
+def load_calibration_tree(root, window=(395, 650), feature='max', catalog=None, memory_mb=None):
+    """
+    Lee una serie de calibración con una carpeta por concentración (p. ej.
+    ensayo1a16/10uM/...) y devuelve (concentraciones, característica) con un
+    valor por espectro. Con un catalog.Catalog las concentraciones salen del
+    índice y no se vuelven a listar ni interpretar las carpetas. Con memory_mb
+    los espectros se leen por bloques con ese techo de memoria (chunked).
+    """
+    import spectrum_data_loader as sdl
+    if catalog is not None:
+        entries = catalog.query(under=catalog.relative_folder(root))
+        entries = [(path, meta) for path, meta in entries if not math.isnan(meta['concentration'])]
+        file_paths = [os.path.join(catalog.root, *path.split('/')) for path, _ in entries]
+        conc = [meta['concentration'] for _, meta in entries]
+    elif memory_mb is not None:
+        from code_functions.chunked import calibration_files
+        file_paths, conc = calibration_files(root)
+    else:
+        conc, F = [], []
+        for folder, spectra in sdl.load_folder_tree(root).items():
+            c = parse_path_metadata(folder)['concentration']
+            if math.isnan(c):
+                print(f'Omitiendo carpeta sin concentración: {os.path.join(root, folder)}')
+                continue
+            for x, y in spectra.values():
+                conc.append(c)
+                F.append(window_features(x, y, window, feature)[0])
+        return np.array(conc), np.array(F)
+    if memory_mb is not None:
+        from code_functions.chunked import chunked_window_features
+        F = chunked_window_features(file_paths, window, feature, memory_mb=memory_mb)
+    else:
+        F = [window_features(x, y, window, feature)[0] for x, y in sdl.load_many(file_paths)]
+    return np.array(conc), np.array(F)
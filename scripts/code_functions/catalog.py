@@ -0,0 +1,305 @@
+"""
+Catálogo de los espectros de un árbol de datos en un índice SQLite.
+
+El árbol se recorre una vez y cada archivo de espectro queda como una fila con
+sus condiciones experimentales (técnica, muestra, ruta de síntesis,
+concentración, pH, λex, dilución y réplica) y su huella (tamaño, mtime y hash
+del contenido). Las condiciones salen de las reglas de path_metadata: las
+expresiones regulares sobre el nombre ('10uM', '1 a 4', 'pH7', 'ex350nm'), la
+cabecera del archivo (HEADER_PATTERNS) y las reglas posicionales
+(POSITIONAL_RULES); ambas pueden reemplazarse al crear el catálogo.
+
+Los reescaneos son incrementales: solo se leen los archivos cuyo tamaño o
+mtime cambió, y solo se vuelven a derivar los metadatos de las carpetas con
+archivos nuevos, modificados o borrados (las reglas posicionales dependen del
+orden dentro de la carpeta). Un archivo con la misma huella de contenido y
+otra fecha solo actualiza su fila. Si cambian las reglas se rehace el índice.
+
+    with Catalog.open('datos_espectros') as catalog:
+        catalog.query(technique='PL', route='CA', sample='ngqd_ca_curva_in_situ',
+                      concentration=(None, 100))
+        catalog.query(under=catalog.relative_folder(serie))
+"""
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import spectrum_data_loader as sdl
+from code_functions import profiling
+from code_functions.path_metadata import (FIELDS, HEADER_PATTERNS, POSITIONAL_RULES, empty_metadata,
+                                          folder_metadata, header_value, parse_path_metadata)
+
+CATALOG_FILE = '.catalog.sqlite'
+
+SCHEMA_VERSION = 1
+
+NUMERIC_FIELDS = ('concentration', 'ph', 'lambda_ex', 'dilution')
+
+# Campos por los que se puede filtrar además de FIELDS; 'under' es el
+# subárbol de una carpeta (comparación literal, sin GLOB)
+PATH_FIELDS = ('path', 'folder', 'under')
+
+_COLUMNS = ('path', 'folder') + FIELDS + ('size', 'mtime_ns', 'hash')
+_TYPES = {'concentration': 'REAL', 'ph': 'REAL', 'lambda_ex': 'REAL', 'dilution': 'REAL',
+          'replicate': 'INTEGER', 'size': 'INTEGER', 'mtime_ns': 'INTEGER'}
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def _to_sql(value):
+    # SQLite no distingue NaN de NULL; se guarda NULL explícitamente
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def escape_glob(text):
+    """
+    Escapa '*', '?' y '[' para que text se compare literalmente en un patrón
+    GLOB (p. ej. escape_glob(carpeta) + '/*').
+    """
+    return ''.join(f'[{c}]' if c in '*?[' else c for c in text)
+
+
+def _from_sql(field, value):
+    if value is None:
+        return math.nan if field in NUMERIC_FIELDS else ''
+    return value
+
+
+class Catalog:
+    """
+    Índice SQLite de un árbol de espectros. Las rutas se guardan relativas a
+    root, con '/' como separador.
+    """
+
+    def __init__(self, db_path, root, rules=None, header_patterns=None):
+        self.db_path = db_path
+        self.root = root
+        self.rules = POSITIONAL_RULES if rules is None else rules
+        self.header_patterns = HEADER_PATTERNS if header_patterns is None else header_patterns
+        self.connection = sqlite3.connect(db_path)
+        self._create_schema()
+
+    @classmethod
+    def open(cls, root, db_path=None, rules=None, header_patterns=None, scan=True):
+        """
+        Abre (o crea) el catálogo de root, por defecto en root/CATALOG_FILE, y
+        lo actualiza con un reescaneo incremental.
+        """
+        catalog = cls(db_path or os.path.join(root, CATALOG_FILE), root, rules, header_patterns)
+        if scan:
+            catalog.scan()
+        return catalog
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM spectra').fetchone()[0]
+
+    def __repr__(self):
+        return f'Catalog({self.root!r}, {len(self)} espectros)'
+
+    def close(self):
+        self.connection.close()
+
+    def relative_folder(self, path):
+        """
+        Carpeta relativa a root, con '/', de una ruta del sistema de archivos
+        ('' para root mismo); el valor que espera el filtro under.
+        """
+        rel = os.path.relpath(path, self.root)
+        if rel == os.curdir:
+            return ''
+        if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            raise ValueError(f'{path} no está dentro del catálogo de {self.root}')
+        return rel.replace(os.sep, '/')
+
+    def _create_schema(self):
+        columns = ', '.join(f"{c} {_TYPES.get(c, 'TEXT')}" for c in _COLUMNS)
+        headers = ', '.join(f'header_{field} REAL' for field in NUMERIC_FIELDS)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)')
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS spectra ({columns}, {headers}, '
+                                    'PRIMARY KEY (path))')
+            for name, cols in (('technique_sample', 'technique, sample'), ('folder', 'folder'),
+                               ('concentration', 'concentration'), ('ph', 'ph'),
+                               ('lambda_ex', 'lambda_ex'), ('route', 'route')):
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS idx_{name} ON spectra ({cols})')
+
+    def _settings_key(self):
+        """
+        Firma de las reglas: si cambia, los metadatos guardados ya no valen.
+        """
+        return json.dumps({'version': SCHEMA_VERSION,
+                           'rules': {k: [f, list(v)] for k, (f, v) in sorted(self.rules.items())},
+                           'headers': {k: p.pattern for k, p in sorted(self.header_patterns.items())}},
+                          sort_keys=True)
+
+    def _stored(self):
+        header_cols = ', '.join(f'header_{field}' for field in NUMERIC_FIELDS)
+        rows = self.connection.execute(f'SELECT path, folder, size, mtime_ns, hash, {header_cols} FROM spectra')
+        return {row[0]: {'folder': row[1], 'size': row[2], 'mtime_ns': row[3], 'hash': row[4],
+                         'headers': dict(zip(NUMERIC_FIELDS, row[5:]))} for row in rows}
+
+    def _headers(self, path):
+        return {field: _to_sql(header_value(path, self.header_patterns[field])) if field in self.header_patterns
+                else None for field in NUMERIC_FIELDS}
+
+    @profiling.timed('catalog_scan')
+    def scan(self):
+        """
+        Reescaneo incremental del árbol. Devuelve un diccionario con el número
+        de archivos 'added', 'modified', 'removed' y 'unchanged'.
+        """
+        key = self._settings_key()
+        stored_key = self.connection.execute("SELECT value FROM settings WHERE key = 'rules'").fetchone()
+        stored = self._stored() if stored_key and stored_key[0] == key else {}
+        by_folder = {}
+        for path, entry in stored.items():
+            by_folder.setdefault(entry['folder'], []).append(path)
+        counts = {'added': 0, 'modified': 0, 'removed': 0, 'unchanged': 0}
+        seen, rows, touched = set(), [], []
+
+        for dir_path, dir_names, file_names in os.walk(self.root):
+            dir_names.sort()
+            rel_dir = os.path.relpath(dir_path, self.root)
+            folder = '' if rel_dir == '.' else rel_dir.replace(os.sep, '/')
+            spectra = sorted(fn for fn in file_names if fn.lower().endswith(sdl.EXTENSIONES))
+            files, folder_changed = {}, False
+            for file_name in spectra:
+                path = f'{folder}/{file_name}' if folder else file_name
+                full_path = os.path.join(dir_path, file_name)
+                stat = os.stat(full_path)
+                seen.add(path)
+                entry = stored.get(path)
+                if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                    files[file_name] = entry
+                    counts['unchanged'] += 1
+                    continue
+                content_hash = _file_hash(full_path)
+                if entry is not None and entry['hash'] == content_hash:
+                    # Solo cambió la fecha: se actualiza la huella de esa fila
+                    files[file_name] = {**entry, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                    touched.append((stat.st_size, stat.st_mtime_ns, path))
+                    counts['unchanged'] += 1
+                    continue
+                counts['modified' if entry is not None else 'added'] += 1
+                files[file_name] = {'folder': folder, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                    'hash': content_hash, 'headers': self._headers(full_path)}
+                folder_changed = True
+            # Un archivo borrado cambia las posiciones del resto de la carpeta
+            folder_changed |= any(path not in seen for path in by_folder.get(folder, ()))
+            if folder_changed:
+                rows.extend(self._folder_rows(folder, files))
+
+        removed = [path for path in stored if path not in seen]
+        counts['removed'] = len(removed)
+        with self.connection:
+            if not stored:
+                self.connection.execute('DELETE FROM spectra')
+            self.connection.executemany('DELETE FROM spectra WHERE path = ?', [(p,) for p in removed])
+            self.connection.executemany('UPDATE spectra SET size = ?, mtime_ns = ? WHERE path = ?', touched)
+            header_cols = [f'header_{field}' for field in NUMERIC_FIELDS]
+            columns = list(_COLUMNS) + header_cols
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO spectra ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows)
+            self.connection.execute("INSERT OR REPLACE INTO settings VALUES ('rules', ?)", (key,))
+            self.connection.execute("INSERT OR REPLACE INTO settings VALUES ('root', ?)",
+                                    (os.path.abspath(self.root),))
+        return counts
+
+    def _folder_rows(self, folder, files):
+        """
+        Filas de todos los archivos de una carpeta: nombre, cabecera y regla
+        posicional, en ese orden de preferencia (como path_metadata.folder_values).
+        """
+        rows = []
+        for file_name, meta in folder_metadata(folder, list(files), rules=self.rules):
+            entry = files[file_name]
+            from_name = parse_path_metadata(file_name)
+            for field, value in entry['headers'].items():
+                if math.isnan(from_name[field]) and value is not None:
+                    meta[field] = value
+            path = f'{folder}/{file_name}' if folder else file_name
+            rows.append((path, folder, *(_to_sql(meta[field]) for field in FIELDS),
+                         entry['size'], entry['mtime_ns'], entry['hash'],
+                         *(entry['headers'][field] for field in NUMERIC_FIELDS)))
+        return rows
+
+    def _where(self, filters):
+        """
+        Cláusula WHERE de los filtros: un valor exacto, una tupla (mínimo,
+        máximo) inclusiva donde None deja el extremo abierto, o un patrón con
+        '*', '?' o '[' para los campos de texto (GLOB; escape_glob para
+        comparar esos caracteres literalmente). under es una carpeta relativa
+        (relative_folder) y selecciona todo su subárbol.
+        """
+        clauses, params = [], []
+        for field, value in filters.items():
+            if field not in FIELDS + PATH_FIELDS:
+                raise ValueError(f'Campo desconocido: {field} (use {", ".join(FIELDS + PATH_FIELDS)})')
+            if field == 'under':
+                folder = value.strip('/')
+                if folder:
+                    clauses.append('(folder = ? OR substr(folder, 1, ?) = ?)')
+                    params.extend([folder, len(folder) + 1, folder + '/'])
+                continue
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    clauses.append(f'{field} >= ?')
+                    params.append(low)
+                if high is not None:
+                    clauses.append(f'{field} <= ?')
+                    params.append(high)
+            elif isinstance(value, str) and any(c in value for c in '*?['):
+                clauses.append(f'{field} GLOB ?')
+                params.append(value)
+            else:
+                clauses.append(f'{field} = ?')
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, **filters):
+        """
+        Espectros que cumplen los filtros (véase _where), ordenados por ruta.
+        Devuelve una lista de (ruta_relativa, metadatos), la entrada de
+        spectrum_types.metadata_array.
+        """
+        where, params = self._where(filters)
+        rows = self.connection.execute(f"SELECT path, {', '.join(FIELDS)} FROM spectra{where} ORDER BY path",
+                                       params)
+        entries = []
+        for path, *values in rows:
+            meta = empty_metadata()
+            meta.update({field: _from_sql(field, value) for field, value in zip(FIELDS, values)})
+            entries.append((path, meta))
+        return entries
+
+    def paths(self, **filters):
+        """
+        Rutas completas (root incluido) de los espectros que cumplen los filtros.
+        """
+        return [os.path.join(self.root, *path.split('/')) for path, _ in self.query(**filters)]
+
+    def count(self, by=('technique', 'sample'), **filters):
+        """
+        Número de espectros por combinación de los campos by.
+        """
+        for field in by:
+            if field not in FIELDS + PATH_FIELDS or field == 'under':
+                raise ValueError(f'Campo desconocido: {field}')
+        where, params = self._where(filters)
+        cols = ', '.join(by)
+        rows = self.connection.execute(f'SELECT {cols}, COUNT(*) FROM spectra{where} GROUP BY {cols} ORDER BY {cols}',
+                                       params)
+        return [(tuple(_from_sql(f, v) for f, v in zip(by, row[:-1])), row[-1]) for row in rows]
@@ -0,0 +1,250 @@
+"""
+Procesamiento por bloques con memoria acotada para campañas más grandes que la RAM.
+
+En lugar de acumular todos los espectros (listas, DataFrames y la copia de
+pd.concat), los archivos se leen en bloques de tamaño fijo, se llevan a la
+rejilla de referencia y se reducen a acumuladores combinables:
+
+    RunningStats   conteo, media y M2 por punto de la rejilla (Welford,
+                   combinación de Chan entre bloques) y máximo corrido
+    features       las características de pico de cada espectro (pocas
+                   columnas por espectro, no la matriz completa)
+    calibración    IncrementalCalibration (Welford por concentración y sumas
+                   corridas de los ajustes)
+
+El número de filas por bloque se calcula a partir de un techo de memoria
+(memory_mb). Como en el camino en memoria (un ReplicateStack por carpeta), la
+rejilla de cada carpeta es la de su primer archivo y un bloque nunca mezcla
+carpetas; cada rejilla tiene un solo GridResampler para todos sus bloques. Los
+resultados coinciden con los de ReplicateStack, peak_features y
+calibration_model.load_calibration_tree sobre la misma lista de archivos.
+
+ngqd_cli.py calibrate/ingest --memory-mb usan este camino.
+"""
+import math
+import os
+import numpy as np
+import spectrum_data_loader as sdl
+from code_functions import profiling
+from code_functions.replicate_stack import align_to_grid
+from code_functions.resampling import GridResampler
+
+# Techo de memoria por defecto (MB) para los bloques de espectros
+MEMORY_MB = 256
+# Copias temporales de un bloque que se estiman durante su reducción
+BLOCK_COPIES = 4
+
+
+def block_rows(n_points, memory_mb=MEMORY_MB, itemsize=8):
+    """
+    Espectros por bloque para que un bloque y sus temporales quepan en memory_mb.
+    """
+    return max(1, int(memory_mb * 2**20 // (BLOCK_COPIES * n_points * itemsize)))
+
+
+class RunningStats:
+    """
+    Estadísticas por punto de la rejilla x combinables entre bloques. Los NaN
+    se ignoran, igual que en ReplicateStack.
+    """
+
+    def __init__(self, x):
+        self.x = np.asarray(x, dtype=np.float64)
+        n_points = self.x.size
+        self.n = np.zeros(n_points)
+        self._mean = np.zeros(n_points)
+        self.m2 = np.zeros(n_points)
+        self.max = np.full(n_points, -np.inf)
+
+    def update(self, Y):
+        """
+        Agrega un bloque Y (filas × puntos).
+        """
+        Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+        valid = ~np.isnan(Y)
+        n_b = valid.sum(axis=0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_b = np.where(n_b > 0, np.where(valid, Y, 0.0).sum(axis=0) / n_b, 0.0)
+        m2_b = np.sum(np.where(valid, Y - mean_b, 0.0)**2, axis=0)
+        self._combine(n_b, mean_b, m2_b)
+        self.max = np.fmax(self.max, np.max(np.where(valid, Y, -np.inf), axis=0))
+
+    def merge(self, other):
+        """
+        Combina con otro acumulador (por ejemplo, de otro proceso).
+        """
+        self._combine(other.n, other._mean, other.m2)
+        self.max = np.fmax(self.max, other.max)
+
+    def _combine(self, n_b, mean_b, m2_b):
+        n = self.n + n_b
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean_b - self._mean
+            self._mean = np.where(n > 0, self._mean + delta * n_b / n, 0.0)
+            self.m2 = np.where(n > 0, self.m2 + m2_b + delta**2 * self.n * n_b / n, 0.0)
+        self.n = n
+
+    @property
+    def count(self):
+        return self.n.astype(np.int64)
+
+    @property
+    def mean(self):
+        return np.where(self.n > 0, self._mean, np.nan)
+
+    @property
+    def std(self):
+        """
+        Desviación estándar muestral (ddof=1); NaN con una sola réplica.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.n > 1, np.sqrt(self.m2 / (self.n - 1)), np.nan)
+
+    @property
+    def sem(self):
+        return self.std / np.sqrt(self.n)
+
+    def to_dataframe(self, x_name='Longitud de onda', window=5):
+        """
+        Mismas columnas que ReplicateStack.to_dataframe.
+        """
+        import pandas as pd
+        from code_functions.preprocessing import moving_average
+        return pd.DataFrame({x_name: self.x, 'mean': self.mean, 'std': self.std, 'count': self.count,
+                             'sem': self.sem, 'mean_suavizada': moving_average(self.mean, window)})
+
+
+def reference_grid(file_path):
+    """
+    Rejilla de referencia (ascendente) tomada del primer archivo, como en
+    ReplicateStack.from_xy.
+    """
+    x, _ = sdl.load_xy_data(file_path)
+    return np.sort(np.asarray(x, dtype=np.float64), kind='stable')
+
+
+def iter_spectra(file_paths, memory_mb=MEMORY_MB, workers=None):
+    """
+    Recorre file_paths por bloques y produce (índice, x, y) de cada archivo,
+    sin alinearlos; el tamaño del bloque sale de los puntos del primero.
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return
+    rows = block_rows(max(reference_grid(file_paths[0]).size, 1), memory_mb)
+    for start in range(0, len(file_paths), rows):
+        for n, (x, y) in enumerate(sdl.load_many(file_paths[start:start + rows], workers=workers), start):
+            yield n, x, y
+
+
+def iter_blocks(file_paths, groups=None, grid=None, memory_mb=MEMORY_MB, workers=None):
+    """
+    Recorre file_paths en bloques y produce (índice_inicial, clave, rejilla, Y)
+    con Y de forma (filas × puntos) sobre la rejilla.
+
+    groups: clave de cada archivo; por defecto su carpeta. Un bloque solo
+        contiene archivos consecutivos con la misma clave.
+    grid: rejilla común para todos; si se omite, cada clave usa la de su
+        primer archivo (la política de ReplicateStack.from_xy por carpeta).
+    """
+    file_paths = list(file_paths)
+    keys = list(groups) if groups is not None else [os.path.dirname(fp) for fp in file_paths]
+    grids = {}
+    start = 0
+    while start < len(file_paths):
+        key = keys[start]
+        stop = start
+        while stop < len(file_paths) and keys[stop] == key:
+            stop += 1
+        if key not in grids:
+            x_ref = grid if grid is not None else reference_grid(file_paths[start])
+            grids[key] = (x_ref, GridResampler(x_ref))
+        x_ref, resampler = grids[key]
+        rows = block_rows(x_ref.size, memory_mb)
+        for block in range(start, stop, rows):
+            end = min(block + rows, stop)
+            with profiling.stage('chunk'):
+                Y = align_to_grid(sdl.load_many(file_paths[block:end], workers=workers), x_ref, resampler)
+            yield block, key, x_ref, Y
+        start = stop
+
+
+def chunked_replicate_stats(file_paths, groups=None, grid=None, memory_mb=MEMORY_MB, workers=None):
+    """
+    Estadísticas de réplicas por grupo sin cargar todos los espectros.
+
+    groups: clave de grupo de cada archivo; por defecto su carpeta (p. ej. la
+    carpeta de concentración). Devuelve {clave: RunningStats}, cada uno con
+    la rejilla de su grupo en .x.
+    """
+    stats = {}
+    for _, key, x_ref, Y in iter_blocks(file_paths, groups, grid, memory_mb, workers):
+        if key not in stats:
+            stats[key] = RunningStats(x_ref)
+        stats[key].update(Y)
+    return stats
+
+
+def chunked_features(file_paths, windows, groups=None, grid=None, memory_mb=MEMORY_MB, workers=None):
+    """
+    peak_features.extract_features sobre todos los archivos, por bloques.
+    Devuelve el mismo diccionario de arreglos (N, W).
+    """
+    from code_functions.peak_features import FEATURES, extract_features
+    file_paths = list(file_paths)
+    out = {name: np.empty((len(file_paths), len(windows))) for name in FEATURES}
+    for start, _, x_ref, Y in iter_blocks(file_paths, groups, grid, memory_mb, workers):
+        features = extract_features(x_ref, Y, windows)
+        for name in FEATURES:
+            out[name][start:start + Y.shape[0]] = features[name]
+    out['windows'] = [tuple(w) for w in windows]
+    return out
+
+
+def chunked_window_features(file_paths, window=(395, 650), feature='max', groups=None, memory_mb=MEMORY_MB,
+                            workers=None):
+    """
+    calibration_model.window_features de cada archivo, por bloques (N,).
+    """
+    from code_functions.calibration_model import window_features
+    file_paths = list(file_paths)
+    F = np.empty(len(file_paths))
+    for start, _, x_ref, Y in iter_blocks(file_paths, groups, memory_mb=memory_mb, workers=workers):
+        F[start:start + Y.shape[0]] = window_features(x_ref, Y, window, feature)
+    return F
+
+
+def calibration_files(root):
+    """
+    Archivos y concentración de una serie con una carpeta por concentración,
+    en el orden de sdl.load_folder_tree. Las carpetas sin concentración se
+    omiten con un aviso.
+    """
+    from code_functions.path_metadata import parse_path_metadata
+    file_paths, conc = [], []
+    for dir_path, dir_names, _ in os.walk(root):
+        dir_names.sort()
+        file_names = sdl.list_spectra(dir_path)
+        if not file_names:
+            continue
+        c = parse_path_metadata(os.path.relpath(dir_path, root))['concentration']
+        if math.isnan(c):
+            print(f'Omitiendo carpeta sin concentración: {dir_path}')
+            continue
+        file_paths.extend(os.path.join(dir_path, fn) for fn in file_names)
+        conc.extend([c] * len(file_names))
+    return file_paths, conc
+
+
+def chunked_calibration(root, window=(395, 650), linear_max=100, memory_mb=MEMORY_MB, workers=None):
+    """
+    Calibración de una serie con una carpeta por concentración (como
+    ensayo1a16) sin cargarla completa. Devuelve IncrementalCalibration.results().
+    """
+    from code_functions.incremental_calibration import IncrementalCalibration
+    file_paths, conc = calibration_files(root)
+    calibration = IncrementalCalibration(window, linear_max)
+    F = chunked_window_features(file_paths, window, memory_mb=memory_mb, workers=workers)
+    for c, value in zip(conc, F):
+        calibration.add_value(c, value)
+    return calibration.results()
@@ -1,62 +1,166 @@
-def data_pull(txt_file):
-    #print('Archivo:', txt_file)
-    # Lista de protocolos de codificación a probar
-    protocols = ['utf-8', 'latin-1', 'ANSI']  # 'latin-1' es más robusto que 'ANSI'
-    separadores = [' ', '\t', '  ']  # Separadores comunes
-    
-    # Intentar abrir el archivo con diferentes protocolos de codificación
-    lines = None
-    for protocol in protocols:
-        try:
-            with open(txt_file, 'r', encoding=protocol) as f:
-                lines = f.readlines()
-            #print(f'Archivo leído con el protocolo: {protocol}')
+import codecs
+import io
+import numpy as np
+from code_functions import profiling
+
+# Número de bytes y de líneas que se inspeccionan para detectar el formato
+SNIFF_BYTES = 4096
+SNIFF_LINEAS = 50
+
+# Separadores candidatos: None equivale a cualquier espacio en blanco (' ', '\t', '  ')
+SEPARADORES = [None, ';', ',']
+
+
+def _detectar_codificacion(raw):
+    """
+    Detecta la codificación a partir de los primeros bytes del archivo.
+    Se decodifica el archivo completo una sola vez con el protocolo elegido.
+    """
+    sniff = raw[:SNIFF_BYTES]
+    if sniff.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sniff.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        raw.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        # 'latin-1' es más robusto que 'ANSI' y nunca falla al decodificar
+        profiling.count('encoding_fallbacks')
+        return 'latin-1'
+
+
+def _es_fila_numerica(line, sep):
+    parts = line.split(sep)
+    if len(parts) < 2:
+        return False
+    try:
+        float(parts[0].replace(',', '.'))
+        float(parts[1].replace(',', '.'))
+    except ValueError:
+        return False
+    return True
+
+
+def sniff_format(text):
+    """
+    Detecta, usando solo las primeras líneas del texto, el número de caracteres
+    de cabecera (por ejemplo '"Wavelength nm."\t"Abs."'), el separador de
+    columnas y si se usa coma decimal.
+
+    Devuelve (offset, separador, coma_decimal) o None si no hay filas numéricas
+    en la zona inspeccionada.
+    """
+    offset = 0
+    for _ in range(SNIFF_LINEAS):
+        fin = text.find('\n', offset)
+        line = text[offset:] if fin == -1 else text[offset:fin]
+        stripped = line.strip()
+        if stripped:
+            for sep in SEPARADORES:
+                if _es_fila_numerica(stripped, sep):
+                    coma_decimal = sep != ',' and ',' in stripped
+                    return offset, sep, coma_decimal
+        if fin == -1:
             break
-        except UnicodeDecodeError:
-            continue
-    # Si no se pudo leer el archivo, salir con un mensaje de error
-    if lines is None:
-        print('Error: No se pudo leer el archivo. Verifica el protocolo de codificación.')
-    
-    # Inicializar listas para almacenar los datos
-    x_data = []
-    y_data = []
-    
-    # Determinar el separador de columnas
-    separador = None
-    for line in lines:
-        if not line.strip():  # Saltar líneas vacías
-            continue
-        
-        # Buscar el separador si aún no se ha determinado
-        if separador is None:
-            for sep in separadores:
-                parts = line.split(sep)
-                if len(parts) >= 2:
-                    try:
-                        float(parts[0].replace(',', '.'))
-                        float(parts[1].replace(',', '.'))
-                        separador = sep
-                        #print(f'Separador detectado: "{separador}"')
-                        break
-                    except ValueError:
-                        continue
-        # Si no se encontró un separador válido, continuar con la siguiente línea
-        if separador is None:
-            continue
+        offset = fin + 1
+    return None
 
-        # Procesar la línea
-        try:
-            parts = line.split(separador)
-            x_val = float(parts[0].replace(',', '.'))
-            y_val = float(parts[1].replace(',', '.'))
+
+def _parse_lineas(text, separador=None):
+    # Ruta lenta y tolerante: procesa línea a línea y salta las inválidas
+    profiling.count('line_parser_fallbacks')
+    x_data, y_data = [], []
+    skipped = 0
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        seps = [separador] if separador is not None else SEPARADORES
+        for sep in seps:
+            try:
+                parts = stripped.split(sep)
+                x_val = float(parts[0].replace(',', '.'))
+                y_val = float(parts[1].replace(',', '.'))
+            except (ValueError, IndexError):
+                continue
             x_data.append(x_val)
             y_data.append(y_val)
-        except (ValueError, IndexError):
-            continue  # Saltar líneas con formato inválido
+            break
+        else:
+            skipped += 1
+    profiling.count('lines_skipped', skipped)
+    return np.array(x_data, dtype=np.float64), np.array(y_data, dtype=np.float64)
+
+
+def data_pull_array(txt_file):
+    """
+    Lee un espectro de dos columnas y devuelve (x, y) como arreglos float64
+    contiguos de NumPy.
+
+    El archivo se lee una sola vez en binario. La codificación, las líneas de
+    cabecera, el separador y la coma decimal se detectan una vez sobre un
+    pequeño buffer inicial, y el bloque numérico se convierte con una única
+    llamada vectorizada. Si el bloque contiene líneas inválidas se recurre al
+    procesamiento línea a línea, que las omite.
+    """
+    with open(txt_file, 'rb') as f:
+        raw = f.read()
+    return data_parse_bytes(raw)
+
+
+def data_parse_bytes(raw):
+    """
+    Igual que data_pull_array, pero sobre el contenido ya leído del archivo.
+    """
+    with profiling.stage('parse'):
+        return _parse_bytes(raw)
+
+
+def _parse_bytes(raw):
+    profiling.count('files_parsed')
+    text = raw.decode(_detectar_codificacion(raw))
+
+    formato = sniff_format(text)
+    if formato is None:
+        x_data, y_data = _parse_lineas(text)
+    else:
+        offset, separador, coma_decimal = formato
+        body = text[offset:]
+        if coma_decimal:
+            body = body.replace(',', '.')
+        try:
+            data = np.loadtxt(io.StringIO(body), delimiter=separador, usecols=(0, 1),
+                              dtype=np.float64, ndmin=2)
+            x_data = np.ascontiguousarray(data[:, 0])
+            y_data = np.ascontiguousarray(data[:, 1])
+        except ValueError:
+            x_data, y_data = _parse_lineas(body, separador)
 
     # Verificar si se extrajeron datos
-    if not x_data or not y_data:
+    if x_data.size == 0:
         print('Error: No se pudieron extraer datos. Verifica el formato del archivo.')
-        
-    return x_data, y_data
\ No newline at end of file
+
+    return x_data, y_data
+
+
+def data_header(txt_file):
+    """
+    Líneas de cabecera (anteriores al bloque numérico) de un espectro, p. ej.
+    para leer la longitud de onda de excitación que anotan algunos equipos.
+    Solo se lee el buffer inicial que inspecciona sniff_format.
+    """
+    with open(txt_file, 'rb') as f:
+        raw = f.read(SNIFF_BYTES)
+    text = raw.decode(_detectar_codificacion(raw), errors='replace')
+    formato = sniff_format(text)
+    end = formato[0] if formato is not None else len(text)
+    return [line.strip() for line in text[:end].splitlines() if line.strip()]
+
+
+def data_pull(txt_file):
+    """
+    Versión compatible con los scripts existentes: devuelve (x, y) como listas.
+    """
+    x_data, y_data = data_pull_array(txt_file)
+    return x_data.tolist(), y_data.tolist()
@@ -0,0 +1,366 @@
+"""
+Matrices de excitación-emisión (EEM) de PL.
+
+Una EEM es la matriz I (E × M) de intensidades de emisión sobre la rejilla em
+(M,) para cada longitud de onda de excitación ex (E,). La λex de cada espectro
+sale, por orden de preferencia, del nombre del archivo (path_metadata), de la
+cabecera del archivo (p. ej. 'EX WL: 350.00 nm') o de POSITIONAL_RULES.
+
+La dispersión del disolvente se elimina con máscaras (E × M) calculadas por
+broadcasting para todas las excitaciones a la vez:
+
+    Rayleigh   em = n·ex                              (órdenes n = 1, 2)
+    Raman      em = n / (1/ex - Δν·10⁻⁷)               (Δν = 3400 cm⁻¹ del agua)
+
+Varias EEM (una por pH, ruta de síntesis o dilución) se apilan en un tensor
+X (S × E × M) que se descompone con PARAFAC (X ≈ Σ aᵣ ∘ bᵣ ∘ cᵣ) o con NMF
+sobre X desplegado (S × E·M). Los NaN (dispersión eliminada, excitaciones
+no medidas) no intervienen en el ajuste.
+
+Los tensores se guardan comprimidos en float32 junto con las rejillas y el
+arreglo estructurado de metadatos de spectrum_types (save_eems / load_eems).
+"""
+import math
+import os
+import numpy as np
+import spectrum_data_loader as sdl
+from code_functions import profiling
+from code_functions.linear_fit import batched_linear_fit
+from code_functions.path_metadata import RE_HEADER_EX, TECHNIQUES, empty_metadata, folder_values, parse_path_metadata
+from code_functions.peak_features import WINDOW_EM, extract_features
+
+# Desplazamiento Raman del estiramiento O-H del agua (cm⁻¹)
+RAMAN_SHIFT_WATER = 3400.0
+
+# Semiancho (nm) de las bandas de dispersión enmascaradas
+SCATTER_WIDTH = 12.0
+
+# Campos que identifican una EEM dentro de un lote
+GROUP_FIELDS = ('sample', 'route', 'ph', 'dilution', 'concentration')
+
+# Resolución (nm) con la que se agrupan las λex de distintos archivos
+EX_DECIMALS = 1
+
+
+def excitation_wavelengths(folder, file_names=None):
+    """
+    λex de cada archivo de la carpeta (en orden alfabético): nombre del
+    archivo, cabecera y, si ninguno la trae, la regla posicional de la carpeta.
+    """
+    file_names = file_names if file_names is not None else sdl.list_spectra(folder)
+    return np.asarray(folder_values(folder, 'lambda_ex', RE_HEADER_EX, file_names), dtype=np.float64)
+
+
+def folder_entry(folder):
+    """
+    (carpeta, metadatos) de una serie de λex, con la ruta leída desde la
+    carpeta de la técnica (p. ej. 'datos_espectros/PL/ngqd_ca_lamda_ex').
+    """
+    parts = os.path.normpath(folder).split(os.sep)
+    start = next((n for n, part in enumerate(parts) if part in TECHNIQUES), 0)
+    meta = parse_path_metadata(os.path.join(*parts[start:]))
+    meta['lambda_ex'] = math.nan
+    return folder, meta
+
+
+def _average_rows(keys, Y):
+    """
+    Promedia (ignorando NaN) las filas de Y con la misma clave. Devuelve las
+    claves únicas ordenadas y la matriz promediada.
+    """
+    unique, inverse = np.unique(keys, return_inverse=True)
+    valid = ~np.isnan(Y)
+    sums = np.zeros((unique.size, Y.shape[1]))
+    counts = np.zeros((unique.size, Y.shape[1]))
+    np.add.at(sums, inverse, np.where(valid, Y, 0.0))
+    np.add.at(counts, inverse, valid)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return unique, sums / counts
+
+
+@profiling.timed('eem')
+def load_excitation_series(folder, workers=None):
+    """
+    EEM de una carpeta con un espectro de emisión por λex. Los archivos sin
+    λex se omiten con un aviso y las λex repetidas se promedian.
+
+    Devuelve (ex (E,), em (M,), I (E × M)) ordenados por λex.
+    """
+    from code_functions.replicate_stack import ReplicateStack
+    file_names = sdl.list_spectra(folder)
+    ex = excitation_wavelengths(folder, file_names)
+    missing = np.isnan(ex)
+    if missing.any():
+        print(f"Sin λex en {folder}: {', '.join(np.asarray(file_names)[missing])}; se omiten")
+    file_names = [fn for fn, m in zip(file_names, missing) if not m]
+    if not file_names:
+        raise ValueError(f'No se pudo determinar la λex de ningún espectro de {folder}')
+    stack = ReplicateStack.from_xy(sdl.load_many([os.path.join(folder, fn) for fn in file_names],
+                                                 workers=workers))
+    ex, I = _average_rows(np.round(ex[~missing], EX_DECIMALS), stack.Y)
+    return ex, stack.x, I
+
+
+def scatter_mask(ex, em, width=SCATTER_WIDTH, orders=(1, 2), raman=True, raman_shift=RAMAN_SHIFT_WATER,
+                 below_excitation=True):
+    """
+    Máscara booleana (E × M) de los puntos afectados por dispersión.
+
+    width: semiancho (nm) de cada banda alrededor de su posición teórica
+    orders: órdenes de difracción de las bandas Rayleigh (y Raman)
+    raman: incluir las bandas Raman del disolvente (raman_shift en cm⁻¹)
+    below_excitation: enmascarar también em < ex, donde no hay emisión
+    """
+    ex = np.asarray(ex, dtype=np.float64)[:, None]
+    em = np.asarray(em, dtype=np.float64)[None, :]
+    mask = np.zeros((ex.shape[0], em.shape[1]), dtype=bool)
+    for order in orders:
+        mask |= np.abs(em - order * ex) <= width
+        if raman:
+            with np.errstate(divide='ignore'):
+                raman_em = order / (1 / ex - raman_shift * 1e-7)
+            mask |= np.abs(em - raman_em) <= width
+    if below_excitation:
+        mask |= em < ex
+    return mask
+
+
+def remove_scatter(em, I, mask, fill='nan'):
+    """
+    Elimina los puntos de mask de I (..., E, M).
+
+    fill: 'nan' los deja como NaN (se ignoran en las características y en la
+        factorización), 'zero' los pone a cero e 'interp' interpola
+        linealmente en em entre los puntos válidos vecinos; los tramos sin
+        vecino a ambos lados quedan a cero.
+    """
+    I = np.array(I, dtype=np.float64)
+    mask = np.broadcast_to(mask, I.shape)
+    if fill == 'nan':
+        I[mask] = np.nan
+        return I
+    if fill == 'zero':
+        I[mask] = 0.0
+        return I
+    if fill != 'interp':
+        raise ValueError(f"fill desconocido: {fill} (use 'nan', 'zero' o 'interp')")
+
+    em = np.asarray(em, dtype=np.float64)
+    M = em.size
+    valid = ~mask & ~np.isnan(I)
+    k = np.arange(M)
+    prev = np.maximum.accumulate(np.where(valid, k, -1), axis=-1)
+    nxt = np.minimum.accumulate(np.where(valid, k, M)[..., ::-1], axis=-1)[..., ::-1]
+    inside = (prev >= 0) & (nxt < M)
+    p, q = np.clip(prev, 0, M - 1), np.clip(nxt, 0, M - 1)
+    y_p, y_q = np.take_along_axis(I, p, axis=-1), np.take_along_axis(I, q, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(q > p, (em - em[p]) / (em[q] - em[p]), 0.0)
+    filled = np.where(inside, y_p + t * (y_q - y_p), 0.0)
+    return np.where(valid, I, filled)
+
+
+def peak_dependence(ex, em, I, window=WINDOW_EM):
+    """
+    Dependencia del pico de emisión con la excitación para I (..., E, M).
+
+    Devuelve un diccionario con las características de peak_features
+    ('position', 'height', 'fwhm', 'area', ...) de forma (..., E) y el ajuste
+    lineal de la posición frente a λex: 'shift_slope' (nm de emisión por nm
+    de excitación), 'shift_r2' y 'shift_range' (máximo - mínimo, nm). Una
+    pendiente cercana a cero indica emisión independiente de la excitación.
+    """
+    ex = np.asarray(ex, dtype=np.float64)
+    I = np.asarray(I, dtype=np.float64)
+    lead, (E, M) = I.shape[:-2], I.shape[-2:]
+    features = extract_features(em, I.reshape(-1, M), [window])
+    out = {name: values[:, 0].reshape(*lead, E) for name, values in features.items() if name != 'windows'}
+    out['ex'] = ex
+    slope, _, r2 = batched_linear_fit(ex, out['position'])
+    out['shift_slope'], out['shift_r2'] = slope, r2
+    with np.errstate(invalid='ignore'):
+        out['shift_range'] = np.nanmax(out['position'], axis=-1) - np.nanmin(out['position'], axis=-1)
+    return out
+
+
+@profiling.timed('eem')
+def eem_batch(batch, by=GROUP_FIELDS):
+    """
+    Tensor de EEM a partir de un SpectrumBatch de PL: los espectros con λex
+    finita se agrupan por los campos by (una EEM por combinación) y se
+    colocan sobre la rejilla común de λex. Las réplicas se promedian y las
+    excitaciones que un grupo no midió quedan como NaN.
+
+    Devuelve (ex (E,), em (M,), X (S × E × M), meta (S,)), con meta la fila de
+    metadatos del primer espectro de cada grupo (lambda_ex en NaN, réplica -1).
+    """
+    rows = np.flatnonzero(np.isfinite(batch.meta['lambda_ex']))
+    if rows.size == 0:
+        raise ValueError('El lote no tiene espectros con λex')
+    batch = batch[rows]
+    meta = batch.meta
+    groups, first = batch.group_index(by)
+    ex, ex_index = np.unique(np.round(meta['lambda_ex'], EX_DECIMALS), return_inverse=True)
+    S, E, M = first.size, ex.size, batch.x.size
+
+    Y = np.asarray(batch.Y, dtype=np.float64)
+    valid = ~np.isnan(Y)
+    sums = np.zeros((S * E, M))
+    counts = np.zeros((S * E, M))
+    cell = groups * E + ex_index.ravel()
+    np.add.at(sums, cell, np.where(valid, Y, 0.0))
+    np.add.at(counts, cell, valid)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        X = (sums / counts).reshape(S, E, M)
+
+    group_meta = meta[first].copy()
+    group_meta['lambda_ex'] = np.nan
+    group_meta['replicate'] = -1
+    return ex, np.asarray(batch.x, dtype=np.float64), X, group_meta
+
+
+def stack_eems(eems):
+    """
+    Apila EEM sueltas [(ex, em, I), ...] en un tensor (S × E × M) sobre la
+    unión de las λex y la rejilla de emisión de la primera. Devuelve (ex, em, X).
+    """
+    from code_functions.replicate_stack import align_to_grid
+    eems = list(eems)
+    em = np.asarray(eems[0][1], dtype=np.float64)
+    ex = np.unique(np.concatenate([np.round(np.asarray(e, dtype=np.float64), EX_DECIMALS) for e, _, _ in eems]))
+    X = np.full((len(eems), ex.size, em.size), np.nan)
+    for s, (ex_s, em_s, I_s) in enumerate(eems):
+        index = np.searchsorted(ex, np.round(np.asarray(ex_s, dtype=np.float64), EX_DECIMALS))
+        X[s, index] = align_to_grid([(em_s, row) for row in np.asarray(I_s)], em)
+    return ex, em, X
+
+
+def save_eems(path, ex, em, X, meta=None):
+    """
+    Guarda un tensor de EEM (S × E × M) comprimido, con las intensidades en
+    float32. meta es el arreglo estructurado de eem_batch o una lista de
+    (ruta, metadatos) como la que recibe spectrum_types.metadata_array.
+    """
+    from code_functions.spectrum_types import metadata_array
+    X = np.asarray(X)
+    if meta is None:
+        meta = [('', empty_metadata()) for _ in range(X.shape[0])]
+    if not isinstance(meta, np.ndarray):
+        meta = metadata_array(meta)
+    np.savez_compressed(path, ex=np.asarray(ex, dtype=np.float64), em=np.asarray(em, dtype=np.float64),
+                        X=X.astype(np.float32), meta=meta)
+
+
+def load_eems(path):
+    """
+    Lee un archivo de save_eems. Devuelve (ex, em, X, meta).
+    """
+    with np.load(path) as data:
+        return data['ex'], data['em'], data['X'], data['meta']
+
+
+def _valid_data(X):
+    X = np.asarray(X, dtype=np.float64)
+    valid = ~np.isnan(X)
+    return np.where(valid, X, 0.0), valid
+
+
+@profiling.timed('eem_factorization')
+def nmf(X, rank, n_iter=500, tol=1e-6, seed=0):
+    """
+    Factorización no negativa de X (S × E × M) desplegado en (S × E·M) con
+    actualizaciones multiplicativas ponderadas (los NaN tienen peso cero y los
+    valores negativos del ruido se recortan a cero).
+
+    Devuelve un diccionario con 'scores' (S × R), 'components' (R × E × M),
+    'explained' (fracción de la suma de cuadrados explicada), 'n_iter' y
+    'converged'.
+    """
+    X0, valid = _valid_data(X)
+    S, E, M = X0.shape
+    V = np.clip(X0.reshape(S, E * M), 0, None)
+    Wt = valid.reshape(S, E * M).astype(np.float64)
+    rng = np.random.default_rng(seed)
+    scale = math.sqrt(max(V.sum() / max(Wt.sum(), 1), 1e-12) / rank)
+    W = rng.uniform(0.5, 1.5, (S, rank)) * scale
+    H = rng.uniform(0.5, 1.5, (rank, E * M)) * scale
+    eps = 1e-12
+
+    previous, converged, n = np.inf, False, 0
+    for n in range(1, n_iter + 1):
+        H *= (W.T @ (Wt * V)) / (W.T @ (Wt * (W @ H)) + eps)
+        W *= ((Wt * V) @ H.T) / ((Wt * (W @ H)) @ H.T + eps)
+        error = np.sum(Wt * (V - W @ H)**2)
+        if abs(previous - error) <= tol * error:
+            converged = True
+            break
+        previous = error
+
+    # Componentes de norma unidad, ordenadas por su contribución
+    norm = np.linalg.norm(H, axis=1) + eps
+    H, W = H / norm[:, None], W * norm
+    order = np.argsort(-np.linalg.norm(W, axis=0))
+    total = np.sum(Wt * V**2)
+    return {'scores': W[:, order], 'components': H[order].reshape(rank, E, M),
+            'explained': 1 - error / total if total > 0 else math.nan, 'n_iter': n, 'converged': converged}
+
+
+def _khatri_rao(A, B):
+    return (A[:, None, :] * B[None, :, :]).reshape(-1, A.shape[1])
+
+
+@profiling.timed('eem_factorization')
+def parafac(X, rank, n_iter=500, tol=1e-7, nonneg=True, seed=0):
+    """
+    Descomposición PARAFAC (CP) de X (S × E × M) por mínimos cuadrados
+    alternados: X[s, e, m] ≈ Σᵣ A[s, r]·B[e, r]·C[m, r]. Los NaN se imputan
+    en cada iteración con la reconstrucción actual. Con nonneg cada factor se
+    actualiza columna a columna por HALS (mínimos cuadrados alternados
+    jerárquicos), que respeta la no negatividad sin anular componentes como el
+    recorte de la solución sin restricciones; sin nonneg, por mínimos
+    cuadrados. Converge cuando la fracción explicada cambia menos que tol.
+
+    Devuelve un diccionario con 'scores' A (S × R), 'excitation' B (E × R) y
+    'emission' C (M × R) (B y C de norma unidad, ordenadas por contribución),
+    'explained', 'n_iter' y 'converged'.
+    """
+    X0, valid = _valid_data(X)
+    S, E, M = X0.shape
+    rng = np.random.default_rng(seed)
+    A = rng.uniform(0.1, 1.0, (S, rank))
+    B = rng.uniform(0.1, 1.0, (E, rank))
+    C = rng.uniform(0.1, 1.0, (M, rank))
+    # Piso de HALS: una columna en cero anularía G[r, r] en los otros factores
+    eps = 1e-12
+
+    def solve(unfolded, F, P, Q):
+        G = (P.T @ P) * (Q.T @ Q)
+        U = unfolded @ _khatri_rao(P, Q)
+        if not nonneg:
+            return U @ np.linalg.pinv(G)
+        F = F.copy()
+        for r in range(rank):
+            F[:, r] = np.maximum(F[:, r] + (U[:, r] - F @ G[:, r]) / max(G[r, r], eps), eps)
+        return F
+
+    Xf = X0.copy()
+    total = np.sum(X0[valid]**2)
+    previous, converged, n, error = np.inf, False, 0, math.nan
+    for n in range(1, n_iter + 1):
+        A = solve(Xf.reshape(S, E * M), A, B, C)
+        B = solve(Xf.transpose(1, 0, 2).reshape(E, S * M), B, A, C)
+        C = solve(Xf.transpose(2, 0, 1).reshape(M, S * E), C, A, B)
+        model = np.einsum('sr,er,mr->sem', A, B, C)
+        error = np.sum((X0 - model)[valid]**2)
+        Xf = np.where(valid, X0, model)
+        if abs(previous - error) <= tol * total:
+            converged = True
+            break
+        previous = error
+
+    norm_b = np.linalg.norm(B, axis=0) + 1e-12
+    norm_c = np.linalg.norm(C, axis=0) + 1e-12
+    A, B, C = A * norm_b * norm_c, B / norm_b, C / norm_c
+    order = np.argsort(-np.linalg.norm(A, axis=0))
+    return {'scores': A[:, order], 'excitation': B[:, order], 'emission': C[:, order],
+            'explained': 1 - error / total if total > 0 else math.nan, 'n_iter': n, 'converged': converged}
@@ -0,0 +1,191 @@
+"""
+Calibración incremental para mediciones in situ en continuo.
+
+Reproduce los cálculos de calibration_curves_insitu.py (máximo de emisión en
+395-650 nm, promedio por concentración, ajuste Stern-Volmer, ajuste
+intensidad vs. concentración y LOD = 3*sigma_blanco/|m|) pero acepta los
+espectros de uno en uno. Cada concentración guarda acumuladores de Welford y
+los dos ajustes lineales se mantienen con sumas corridas, de modo que cada
+espectro nuevo actualiza F0/F, K_sv, R² y LOD en O(1) sin releer el historial.
+"""
+import math
+import os
+import numpy as np
+from code_functions.path_metadata import parse_path_metadata
+from code_functions.linear_fit import line_from_moments
+
+
+class _LineSums:
+    """
+    Sumas de mínimos cuadrados (n, Σx, Σy, Σx², Σxy, Σy²) a las que se pueden
+    agregar y quitar puntos.
+    """
+
+    def __init__(self):
+        self.n = self.sx = self.sy = self.sxx = self.sxy = self.syy = 0.0
+
+    def add(self, x, y, sign=1.0):
+        self.n += sign
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxx += sign * x * x
+        self.sxy += sign * x * y
+        self.syy += sign * y * y
+
+    def fit(self, y_scale=1.0):
+        """
+        Devuelve (pendiente, intercepto, r²) de la recta para y*y_scale.
+        """
+        if self.n < 2:
+            return math.nan, math.nan, math.nan
+        sxx = self.sxx - self.sx**2 / self.n
+        if sxx <= 0:
+            return math.nan, math.nan, math.nan
+        fit = line_from_moments(self.n, self.sx / self.n, self.sy * y_scale / self.n, sxx,
+                                (self.sxy - self.sx * self.sy / self.n) * y_scale,
+                                (self.syy - self.sy**2 / self.n) * y_scale**2)
+        return float(fit['slope']), float(fit['intercept']), float(fit['r2'])
+
+
+class IncrementalCalibration:
+    """
+    Calibración que se actualiza con cada espectro nuevo.
+
+    window: ventana de emisión (nm) donde se busca el máximo
+    linear_max: concentración máxima (µM) incluida en los ajustes lineales
+    El blanco (F0) es siempre la concentración más baja recibida.
+    """
+
+    def __init__(self, window=(395, 650), linear_max=100):
+        self.window = window
+        self.linear_max = linear_max
+        # concentración -> [n, media, M2] del máximo de emisión
+        self.stats = {}
+        self.blank = None
+        # Ajuste F vs. c sobre las medias por concentración
+        self._simple = _LineSums()
+        # Ajuste Stern-Volmer: F0/F = F0 * (1/F), se acumula u = 1/F y se escala por F0
+        self._sv = _LineSums()
+
+    def _in_fit(self, conc):
+        return conc <= self.linear_max
+
+    def _update_fits(self, conc, mean, sign=1.0):
+        """
+        Agrega (sign=1) o retira (sign=-1) la media de una concentración de los
+        dos ajustes. Una media nula no tiene F0/F y queda fuera de Stern-Volmer
+        (en las dos direcciones, para que las sumas sigan cuadrando).
+        """
+        if not self._in_fit(conc):
+            return
+        self._simple.add(conc, mean, sign=sign)
+        if mean != 0:
+            self._sv.add(conc, 1.0 / mean, sign=sign)
+
+    def peak_intensity(self, x, y):
+        x = np.asarray(x)
+        y = np.asarray(y)
+        mask = (x >= self.window[0]) & (x <= self.window[1])
+        return float(y[mask].max()) if mask.any() else math.nan
+
+    def add_value(self, conc, intensity):
+        """
+        Agrega el máximo de emisión de un espectro de concentración conc (µM).
+        """
+        conc = float(conc)
+        if math.isnan(intensity):
+            return
+        entry = self.stats.get(conc)
+        if entry is None:
+            entry = self.stats[conc] = [0, 0.0, 0.0]
+            if self.blank is None or conc < self.blank:
+                self.blank = conc
+        else:
+            # Retirar la contribución anterior de esta concentración
+            self._update_fits(conc, entry[1], sign=-1.0)
+
+        # Welford
+        entry[0] += 1
+        delta = intensity - entry[1]
+        entry[1] += delta / entry[0]
+        entry[2] += delta * (intensity - entry[1])
+        self._update_fits(conc, entry[1])
+
+    def remove_value(self, conc, intensity):
+        """
+        Retira un valor agregado antes (p. ej. si el archivo se sobrescribió).
+        """
+        conc = float(conc)
+        entry = self.stats.get(conc)
+        if entry is None or math.isnan(intensity):
+            return
+        self._update_fits(conc, entry[1], sign=-1.0)
+        if entry[0] == 1:
+            del self.stats[conc]
+            if conc == self.blank:
+                self.blank = min(self.stats) if self.stats else None
+            return
+
+        # Welford inverso
+        mean_old = (entry[0] * entry[1] - intensity) / (entry[0] - 1)
+        entry[2] = max(entry[2] - (intensity - mean_old) * (intensity - entry[1]), 0.0)
+        entry[0] -= 1
+        entry[1] = mean_old
+        self._update_fits(conc, entry[1])
+
+    def add_spectrum(self, conc, x, y):
+        self.add_value(conc, self.peak_intensity(x, y))
+
+    def add_file(self, file_path, conc=None):
+        """
+        Lee un espectro y lo agrega. Si no se indica conc, se toma del nombre
+        de la carpeta o del archivo (p. ej. '10uM').
+        """
+        import spectrum_data_loader as sdl
+        if conc is None:
+            conc = parse_path_metadata(os.path.normpath(file_path))['concentration']
+            if math.isnan(conc):
+                print(f'Omitiendo archivo sin concentración en la ruta: {file_path}')
+                return
+        x, y = sdl.load_xy_data(file_path)
+        self.add_spectrum(conc, x, y)
+
+    def mean_std(self, conc):
+        # Desviación poblacional (np.std), como en calibration_curves_insitu.py
+        n, mean, m2 = self.stats[conc]
+        return mean, math.sqrt(m2 / n)
+
+    def results(self):
+        """
+        Estado actual de la calibración como diccionario.
+        """
+        if self.blank is None:
+            return {}
+        F0_mean, F0_std = self.mean_std(self.blank)
+        slope_sv, intercept_sv, r2_sv = self._sv.fit(y_scale=F0_mean)
+        slope_simple, intercept_simple, r2_simple = self._simple.fit()
+        m = abs(slope_simple)
+        return {
+            'n_spectra': sum(entry[0] for entry in self.stats.values()),
+            'F0_mean': F0_mean,
+            'F0_std': F0_std,
+            'K_sv': slope_sv,
+            'intercept_sv': intercept_sv,
+            'r2_sv': r2_sv,
+            'slope': slope_simple,
+            'intercept': intercept_simple,
+            'r2': r2_simple,
+            'lod': 3 * F0_std / m if m > 0 else math.nan,
+        }
+
+    def stern_volmer_points(self):
+        """
+        Concentraciones ordenadas y sus F0/F con el error propagado de F0 y F.
+        """
+        concs = np.array(sorted(self.stats))
+        means_stds = np.array([self.mean_std(c) for c in concs])
+        F_means, F_stds = means_stds[:, 0], means_stds[:, 1]
+        F0_mean, F0_std = self.mean_std(self.blank)
+        ratio = F0_mean / F_means
+        error = ratio * np.sqrt((F0_std / F0_mean)**2 + (F_stds / F_means)**2)
+        return concs, ratio, error
@@ -0,0 +1,107 @@
+"""
+Integración de regiones de bandas FT-IR a partir de una tabla declarativa.
+
+Una tabla de bandas es una lista de (centro, ancho, etiqueta) en cm⁻¹; las
+mismas tablas dibujan los rectángulos de ir_pl_ngqds_comparison.py y
+pl_ir_ngqd_nitrites.py. Para una matriz de espectros (N × M) sobre una rejilla
+común se calculan, para cada par banda × espectro y en una sola pasada
+vectorizada, la absorbancia integrada, la transmitancia mínima y la posición
+de la banda (número de onda del mínimo de transmitancia). Los índices de cada
+banda en la rejilla se calculan una sola vez.
+"""
+import csv
+import numpy as np
+
+# Regiones de los N-GQDs (ir_pl_ngqds_comparison.plot_ir)
+BANDS_NGQD = [
+    (2900, 100, 'Alkanes/aromatics'), (750, 100, 'Alkanes/aromatics'),
+    (1650, 100, '-NH'), (1350, 100, '-NH'),
+    (1510, 100, 'CONH2'), (1090, 100, 'CONH2'), (900, 90, 'CONH2'),
+    (1010, 50, '-COH'),
+]
+
+# Regiones de la interacción con nitritos (pl_ir_ngqd_nitrites.plot_ir_nitrites)
+BANDS_NITRITE = [
+    (1600, 200, 'Imine / amine II'),
+    (1300, 250, 'Aromatic amines'),
+    (1040, 250, 'Aliphatic amines'),
+]
+
+
+def load_band_table(csv_path):
+    """
+    Lee una tabla de bandas desde un CSV con columnas center, width, label.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return [(float(row['center']), float(row['width']), row['label']) for row in csv.DictReader(f)]
+
+
+def band_indices(wavenumber, bands):
+    """
+    Índices [inicio, fin) de cada banda sobre una rejilla ascendente.
+    """
+    centers = np.array([b[0] for b in bands], dtype=np.float64)
+    widths = np.array([b[1] for b in bands], dtype=np.float64)
+    start = np.searchsorted(wavenumber, centers - widths / 2, side='left')
+    stop = np.searchsorted(wavenumber, centers + widths / 2, side='right')
+    return start, stop
+
+
+def band_metrics(wavenumber, T, bands, percent=True):
+    """
+    Métricas de cada banda para cada espectro.
+
+    wavenumber: (M,) rejilla común (ascendente o descendente)
+    T: (N, M) transmitancias (en % si percent=True, si no en fracción)
+    bands: lista de (centro, ancho, etiqueta)
+
+    Devuelve un diccionario con arreglos (N, B):
+        'area'      absorbancia integrada, ∫ -log10(T) dν (cm⁻¹)
+        'min_T'     transmitancia mínima dentro de la banda
+        'position'  número de onda del mínimo de transmitancia
+    y 'labels' con las etiquetas de las B bandas. Las bandas fuera de la
+    rejilla quedan como NaN.
+    """
+    wavenumber = np.asarray(wavenumber, dtype=np.float64)
+    T = np.atleast_2d(np.asarray(T, dtype=np.float64))
+    if wavenumber.size > 1 and wavenumber[0] > wavenumber[-1]:
+        wavenumber, T = wavenumber[::-1], T[:, ::-1]
+    start, stop = band_indices(wavenumber, bands)
+    empty = stop - start < 1
+
+    # Absorbancia e integral acumulada (trapecios), una vez para todas las bandas
+    fraction = T / 100 if percent else T
+    A = -np.log10(np.clip(fraction, 1e-6, None))
+    steps = np.diff(wavenumber)
+    cumulative = np.concatenate([np.zeros((T.shape[0], 1)),
+                                 np.cumsum(0.5 * (A[:, 1:] + A[:, :-1]) * steps, axis=1)], axis=1)
+    # Las bandas por encima de la rejilla tienen start = M: se recortan y quedan en NaN
+    first = np.minimum(start, T.shape[1] - 1)
+    last = np.minimum(np.maximum(stop - 1, first), T.shape[1] - 1)
+    area = cumulative[:, last] - cumulative[:, first]
+
+    # Mínimo y su posición: ventana de índices de cada banda rellenada hasta el ancho máximo
+    max_width = int(max(1, (stop - start).max()))
+    offsets = np.arange(max_width)
+    idx = start[:, None] + offsets[None, :]
+    inside = offsets[None, :] < (stop - start)[:, None]
+    idx = np.where(inside, idx, start[:, None]).clip(0, wavenumber.size - 1)
+    windows = np.where(inside[None, :, :], T[:, idx], np.inf)
+    arg = np.argmin(windows, axis=2)
+    min_T = np.take_along_axis(windows, arg[..., None], axis=2)[..., 0]
+    position = wavenumber[np.take_along_axis(np.broadcast_to(idx, windows.shape), arg[..., None], axis=2)[..., 0]]
+
+    for values in (area, min_T, position):
+        values[:, empty] = np.nan
+    return {'area': area, 'min_T': min_T, 'position': position, 'labels': [b[2] for b in bands]}
+
+
+def band_metrics_files(file_paths, bands, percent=True):
+    """
+    Carga varios espectros FT-IR (en paralelo), los lleva a una rejilla común
+    y devuelve band_metrics sobre el lote.
+    """
+    import spectrum_data_loader as sdl
+    from code_functions.replicate_stack import ReplicateStack
+    stack = ReplicateStack.from_xy(sdl.load_many(file_paths))
+    return band_metrics(stack.x, stack.Y, bands, percent)
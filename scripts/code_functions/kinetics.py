@@ -0,0 +1,266 @@
+"""
+Cinética de apagamiento de la PL a partir de series temporales de espectros.
+
+Una serie es una pila de espectros ordenada en el tiempo (T × M). De ella se
+extraen trazas F(t), una por ventana espectral (peak_features) o por banda de
+longitud de onda, y se ajustan a la vez con batched_fit.levenberg_marquardt:
+
+    mono   F(t) = F_inf + A·exp(-k·t)
+    bi     F(t) = F_inf + A1·exp(-k1·t) + A2·exp(-k2·t)     (k1 ≥ k2)
+
+Los valores iniciales salen de una linealización, log|F - F_inf| = log|A| - k·t,
+resuelta en forma cerrada para todas las trazas (linear_fit.batched_linear_fit).
+
+El tiempo de equilibrio t_eq es el primer instante en que |F - F_inf| cae por
+debajo de fraction·|F(0) - F_inf|, y read_time el primer tiempo medido que lo
+alcanza: la lectura más corta que ya da la respuesta de equilibrio.
+
+Se ajustan trazas de cualquier forma (..., T): varias ventanas, todas las
+bandas de un espectro o muchos experimentos a la vez.
+"""
+import math
+import os
+import re
+import numpy as np
+import spectrum_data_loader as sdl
+from code_functions import profiling
+from code_functions.batched_fit import aic, levenberg_marquardt
+from code_functions.linear_fit import batched_linear_fit
+from code_functions.path_metadata import folder_metadata
+
+MODELS = ('mono', 'bi', 'auto')
+
+RE_TIME = re.compile(r'(\d+(?:[.,]\d+)?)\s*(s|seg|min)(?=$|[_\-\s).])', re.IGNORECASE)
+
+# Fracción del cambio total que queda pendiente en el equilibrio
+EQUILIBRIUM_FRACTION = 0.05
+
+
+def parse_time(file_name):
+    """
+    Tiempo en segundos codificado en el nombre (p. ej. '30s', 't_2min'); NaN si no hay.
+    """
+    match = RE_TIME.search(os.path.splitext(file_name)[0])
+    if not match:
+        return math.nan
+    value = float(match.group(1).replace(',', '.'))
+    return value * 60 if match.group(2).lower() == 'min' else value
+
+
+def load_time_series(folder, times=None, workers=None):
+    """
+    Lee una carpeta con un espectro por tiempo de lectura. El tiempo sale del
+    nombre del archivo, de la regla posicional 'time' de
+    path_metadata.POSITIONAL_RULES (posición en orden alfabético) o de times,
+    que debe tener un tiempo por archivo. Devuelve (t, x, Y) ordenados por tiempo, con Y (T × M) sobre la
+    rejilla del primer espectro.
+    """
+    from code_functions.replicate_stack import ReplicateStack
+    file_names = sdl.list_spectra(folder)
+    if times is None:
+        # La regla posicional solo se aplica si hay un archivo por valor (si no, avisa)
+        positional = [meta.get('time', math.nan) for _, meta in folder_metadata(folder, file_names)]
+        times = [parse_time(fn) for fn in file_names]
+        if any(math.isnan(t) for t in times):
+            times = positional
+    if len(times) != len(file_names):
+        raise ValueError(f'Hay {len(file_names)} espectros y {len(times)} tiempos en {folder}')
+    times = np.asarray(times, dtype=np.float64)
+    if np.isnan(times).any():
+        raise ValueError(f'No se pudo determinar el tiempo de todos los espectros de {folder}')
+
+    order = np.argsort(times, kind='stable')
+    spectra = sdl.load_many([os.path.join(folder, file_names[n]) for n in order], workers=workers)
+    stack = ReplicateStack.from_xy(spectra)
+    return times[order], stack.x, stack.Y
+
+
+def traces(x, Y, windows=None, bin_width=None, feature='max'):
+    """
+    Trazas F(t) a partir de espectros Y (..., T, M) sobre la rejilla x (M,).
+
+    windows: lista de (mínimo, máximo); cada traza es la característica
+        feature de peak_features ('max', 'area', ...) en esa ventana
+    bin_width: alternativa a windows; cada traza es la intensidad media en
+        bandas contiguas de ese ancho (en unidades de x)
+
+    Devuelve (centros, F) con F de forma (..., W, T).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    lead, (T, M) = Y.shape[:-2], Y.shape[-2:]
+    flat = Y.reshape(-1, M)
+    if windows is not None:
+        from code_functions.peak_features import extract_features
+        F = extract_features(x, flat, windows)[feature]
+        centers = np.array([(lo + hi) / 2 for lo, hi in windows], dtype=np.float64)
+    elif bin_width is not None:
+        order = np.argsort(x, kind='stable')
+        xs, flat = x[order], flat[:, order]
+        edges = np.arange(xs[0], xs[-1] + bin_width, bin_width)
+        starts = np.searchsorted(xs, edges[:-1], side='left')
+        keep = np.diff(np.append(starts, M)) > 0
+        starts = starts[keep]
+        counts = np.diff(np.append(starts, M))
+        valid = ~np.isnan(flat)
+        sums = np.add.reduceat(np.where(valid, flat, 0.0), starts, axis=1)
+        n_valid = np.add.reduceat(valid.astype(np.float64), starts, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            F = sums / n_valid
+        centers = np.add.reduceat(xs, starts) / counts
+    else:
+        raise ValueError('Indique windows o bin_width')
+    F = F.reshape(*lead, T, -1)
+    return centers, np.moveaxis(F, -1, -2)
+
+
+def _mono(t, P):
+    return P[:, 0:1] + P[:, 1:2] * np.exp(-P[:, 2:3] * t)
+
+
+def _mono_jac(t, P):
+    e = np.exp(-P[:, 2:3] * np.broadcast_to(t, (P.shape[0], np.shape(t)[-1])))
+    t = np.broadcast_to(t, e.shape)
+    return np.stack([np.ones_like(e), e, -P[:, 1:2] * t * e], axis=-1)
+
+
+def _bi(t, P):
+    return P[:, 0:1] + P[:, 1:2] * np.exp(-P[:, 2:3] * t) + P[:, 3:4] * np.exp(-P[:, 4:5] * t)
+
+
+def _bi_jac(t, P):
+    t = np.broadcast_to(t, (P.shape[0], np.shape(t)[-1]))
+    e1, e2 = np.exp(-P[:, 2:3] * t), np.exp(-P[:, 4:5] * t)
+    return np.stack([np.ones_like(e1), e1, -P[:, 1:2] * t * e1, e2, -P[:, 3:4] * t * e2], axis=-1)
+
+
+def _initial_mono(t, F):
+    """
+    Valores iniciales por linealización: F_inf se toma un 10 % más allá del
+    último valor (para que F - F_inf no cambie de signo) y k y A salen de la
+    recta log|F - F_inf| vs t. Las trazas sin datos quedan en 0 (como
+    ph_response._initial_guess); levenberg_marquardt las descarta igual.
+    """
+    valid = ~np.isnan(F)
+    first = np.take_along_axis(F, np.argmax(valid, axis=1)[:, None], axis=1)[:, 0]
+    last = np.take_along_axis(F, (F.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1))[:, None], axis=1)[:, 0]
+    F_inf = last - 0.1 * (first - last)
+    diff = np.abs(F - F_inf[:, None])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_diff = np.where(diff > 0, np.log(diff), np.nan)
+    slope, intercept, _ = batched_linear_fit(t, log_diff)
+    span = np.nanmax(t) - np.nanmin(t)
+    k = np.where(np.isfinite(slope) & (slope < 0), -slope, 3 / span if span > 0 else 1.0)
+    A = np.sign(first - F_inf) * np.where(np.isfinite(intercept), np.exp(intercept), np.abs(first - F_inf))
+    return np.nan_to_num(np.column_stack([F_inf, A, k]))
+
+
+def _equilibrium_time(amplitudes, rates, fraction, t_max):
+    """
+    Primer t con |Σ A·exp(-k·t)| ≤ fraction·|Σ A|, por bisección vectorizada
+    (para el modelo mono la solución es log(1/fraction)/k).
+    """
+    A, k = np.asarray(amplitudes), np.asarray(rates)
+    target = fraction * np.abs(A.sum(axis=1))
+    lo, hi = np.zeros(A.shape[0]), np.full(A.shape[0], t_max)
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        above = np.abs(np.sum(A * np.exp(-k * mid[:, None]), axis=1)) > target
+        lo, hi = np.where(above, mid, lo), np.where(above, hi, mid)
+    reached = np.abs(np.sum(A * np.exp(-k * t_max), axis=1)) <= target
+    return np.where(reached, hi, np.nan)
+
+
+def read_time(t, t_eq):
+    """
+    Primer tiempo medido t ≥ t_eq (NaN si ninguno lo alcanza).
+    """
+    t = np.sort(np.asarray(t, dtype=np.float64))
+    t_eq = np.asarray(t_eq, dtype=np.float64)
+    idx = np.searchsorted(t, np.where(np.isnan(t_eq), np.inf, t_eq), side='left')
+    return np.where(idx < t.size, t[np.minimum(idx, t.size - 1)], np.nan)
+
+
+@profiling.timed('kinetics')
+def fit_kinetics(t, F, model='mono', fraction=EQUILIBRIUM_FRACTION, **lm_kwargs):
+    """
+    Ajusta todas las trazas F (..., T) a los tiempos t (T,).
+
+    model: 'mono', 'bi' o 'auto' (bi donde mejora el AIC en más de 2 y hay al
+    menos 6 tiempos; si no, mono).
+
+    Devuelve un diccionario de arreglos con la forma (...) de las trazas:
+        'F0', 'F_inf'      intensidad ajustada a t = 0 y de equilibrio
+        'quenching'        1 - F_inf/F0
+        'k', 'k_std'       constante principal (s⁻¹; la rápida en bi) y su error
+        'k2', 'k2_std'     constante lenta (NaN en mono)
+        'tau'              1/k
+        't_eq', 'read_time'
+        'r2', 'converged', 'model' ('mono' o 'bi')
+    """
+    if model not in MODELS:
+        raise ValueError(f'model debe ser uno de {MODELS}, no {model!r}')
+    t = np.asarray(t, dtype=np.float64)
+    F = np.asarray(F, dtype=np.float64)
+    lead = F.shape[:-1]
+    F = F.reshape(-1, t.size)
+    span = np.ptp(t)
+    t_max = 100 * span
+
+    p0 = _initial_mono(t, F)
+    mono = levenberg_marquardt(_mono, _mono_jac, t, F, p0, lower=[-np.inf, -np.inf, 0.0], **lm_kwargs)
+    P = mono['params']
+    out = {
+        'F0': P[:, 0] + P[:, 1], 'F_inf': P[:, 0], 'k': P[:, 2], 'k_std': mono['std'][:, 2],
+        'k2': np.full(F.shape[0], np.nan), 'k2_std': np.full(F.shape[0], np.nan),
+        'r2': mono['r2'], 'converged': mono['converged'], 'model': np.full(F.shape[0], 'mono', dtype='U4'),
+    }
+
+    if model != 'mono':
+        if t.size < 6:
+            print(f'El modelo bi necesita al menos 6 tiempos (hay {t.size}); se usa mono')
+        else:
+            k = np.maximum(P[:, 2], 1e-12)
+            p0_bi = np.column_stack([P[:, 0], P[:, 1] / 2, 3 * k, P[:, 1] / 2, k / 3])
+            bi = levenberg_marquardt(_bi, _bi_jac, t, F, p0_bi, lower=[-np.inf, -np.inf, 0.0, -np.inf, 0.0],
+                                     **lm_kwargs)
+            Q = bi['params']
+            # k1 es siempre la constante rápida
+            swap = Q[:, 4] > Q[:, 2]
+            Q[swap] = Q[swap][:, [0, 3, 4, 1, 2]]
+            std = bi['std'].copy()
+            std[swap] = std[swap][:, [0, 3, 4, 1, 2]]
+            use_bi = bi['converged'].copy()
+            if model == 'auto':
+                use_bi &= aic(bi['ssr'], bi['n_points'], 5) < aic(mono['ssr'], mono['n_points'], 3) - 2
+            out['F0'] = np.where(use_bi, Q[:, 0] + Q[:, 1] + Q[:, 3], out['F0'])
+            out['F_inf'] = np.where(use_bi, Q[:, 0], out['F_inf'])
+            out['k'] = np.where(use_bi, Q[:, 2], out['k'])
+            out['k_std'] = np.where(use_bi, std[:, 2], out['k_std'])
+            out['k2'] = np.where(use_bi, Q[:, 4], np.nan)
+            out['k2_std'] = np.where(use_bi, std[:, 4], np.nan)
+            out['r2'] = np.where(use_bi, bi['r2'], out['r2'])
+            out['converged'] = np.where(use_bi, bi['converged'], out['converged'])
+            out['model'] = np.where(use_bi, 'bi', 'mono')
+            amplitudes = np.where(use_bi[:, None], Q[:, [1, 3]], np.column_stack([P[:, 1], np.zeros(F.shape[0])]))
+            rates = np.where(use_bi[:, None], Q[:, [2, 4]], np.column_stack([P[:, 2], np.zeros(F.shape[0])]))
+            out['t_eq'] = _equilibrium_time(amplitudes, rates, fraction, t_max)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if 't_eq' not in out:
+            out['t_eq'] = np.where(out['k'] > 0, math.log(1 / fraction) / out['k'], np.nan)
+        out['tau'] = 1 / out['k']
+        out['quenching'] = 1 - out['F_inf'] / out['F0']
+    out['read_time'] = read_time(t, out['t_eq'])
+    return {key: value.reshape(lead) for key, value in out.items()}
+
+
+def series_kinetics(folder, windows=((395, 650),), bin_width=None, feature='max', model='mono', **kwargs):
+    """
+    Cinética de una carpeta de series temporales: carga, trazas por ventana (o
+    por banda de bin_width, que tiene prioridad) y ajuste. Devuelve (centros
+    (W,), t, trazas (W, T), resultado de fit_kinetics con forma (W,)).
+    """
+    t, x, Y = load_time_series(folder)
+    centers, F = traces(x, Y, windows=None if bin_width else windows, bin_width=bin_width, feature=feature)
+    return centers, t, F, fit_kinetics(t, F, model=model, **kwargs)
@@ -0,0 +1,54 @@
+"""
+Ajuste lineal por mínimos cuadrados en forma cerrada.
+
+line_from_moments es la única implementación de la recta a partir de los
+momentos centrados; la usan las sumas corridas de incremental_calibration,
+las ventanas con sumas acumuladas de tauc_bandgap y los ajustes por lotes.
+"""
+import numpy as np
+
+
+def line_from_moments(n, x_mean, y_mean, sxx, sxy, syy):
+    """
+    Recta de mínimos cuadrados a partir de los momentos centrados: n puntos,
+    medias de x e y y sumas centradas Σ(x-x̄)², Σ(x-x̄)(y-ȳ), Σ(y-ȳ)².
+
+    Devuelve un diccionario de arreglos: 'slope', 'intercept', 'r2', 's2'
+    (varianza residual; 0 con dos puntos), 'var_slope', 'var_intercept' y
+    'cov' (covarianza pendiente-intercepto).
+    """
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = sxy / sxx
+        intercept = y_mean - slope * x_mean
+        r2 = sxy**2 / (sxx * syy)
+        ssr = np.maximum(syy - slope * sxy, 0.0)
+        s2 = np.where(n > 2, ssr / np.maximum(n - 2, 1), 0.0)
+        var_slope = s2 / sxx
+        var_intercept = s2 * (1 / n + x_mean**2 / sxx)
+        cov = -x_mean * s2 / sxx
+    return {'slope': slope, 'intercept': intercept, 'r2': r2, 's2': s2, 'var_slope': var_slope,
+            'var_intercept': var_intercept, 'cov': cov}
+
+
+def batched_linear_fit(x, Y, full=False):
+    """
+    Ajuste lineal de cada fila de Y (..., n) contra x ((..., n) o (n,)).
+    Los NaN de Y se ignoran. Devuelve (pendiente, intercepto, r²) con la forma
+    de los ejes iniciales, o con full=True el diccionario de line_from_moments.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    x = np.broadcast_to(np.asarray(x, dtype=np.float64), Y.shape)
+    valid = ~np.isnan(Y)
+    n = valid.sum(axis=-1)
+    x0, y0 = np.where(valid, x, 0.0), np.where(valid, Y, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = x0.sum(axis=-1) / n
+        y_mean = y0.sum(axis=-1) / n
+        dx = np.where(valid, x - x_mean[..., None], 0.0)
+        dy = np.where(valid, Y - y_mean[..., None], 0.0)
+    fit = line_from_moments(n, x_mean, y_mean, np.sum(dx * dx, axis=-1), np.sum(dx * dy, axis=-1),
+                            np.sum(dy * dy, axis=-1))
+    if full:
+        return fit
+    return fit['slope'], fit['intercept'], fit['r2']
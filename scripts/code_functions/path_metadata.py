@@ -0,0 +1,149 @@
+"""
+Extracción de las condiciones experimentales codificadas en las rutas de los
+espectros (carpeta de técnica, ruta de síntesis, concentración, pH, λex,
+dilución y réplica).
+
+Las convenciones son las que usan los scripts:
+    datos_espectros/PL/ngqd_ca_curva_in_situ/ensayo1a16/10uM/<réplica>.txt
+    datos_espectros/PL/ngqd_ca_curva_PerkinElmer/<n>uM.txt
+    datos_espectros/PL/ngqd_ca_dilutions/1 a 4/<réplica>.txt
+    datos_espectros/FT-IR/N-GQD_CA_pH3_BLC.txt
+"""
+import math
+import os
+import re
+
+FIELDS = ('technique', 'sample', 'route', 'concentration', 'replicate', 'ph', 'lambda_ex', 'dilution')
+
+TECHNIQUES = ('PL', 'FT-IR', 'UV-Vis')
+
+RE_ROUTE = re.compile(r'(?:^|[_\-\s(])(ca|bc|glu)(?=$|[_\-\s).])', re.IGNORECASE)
+RE_CONCENTRATION = re.compile(r'(\d+(?:[.,]\d+)?)\s*[uµ]M', re.IGNORECASE)
+RE_PH = re.compile(r'pH[_\s-]?(\d+(?:[.,]\d+)?)')
+RE_LAMBDA_EX = re.compile(r'(?:ex[_\s-]?)?(\d{3}(?:[.,]\d+)?)\s*nm', re.IGNORECASE)
+RE_DILUTION = re.compile(r'^1\s*a\s*(\d+)$')
+
+# Valores que algunos equipos anotan en la cabecera del archivo
+RE_HEADER_EX = re.compile(r'(?:\bex\b|excita\w*)[^0-9\n]{0,30}(\d{3}(?:[.,]\d+)?)', re.IGNORECASE)
+RE_HEADER_PH = re.compile(r'\bpH\b\s*[:=]?\s*(\d+(?:[.,]\d+)?)')
+HEADER_PATTERNS = {'lambda_ex': RE_HEADER_EX, 'ph': RE_HEADER_PH}
+
+ROUTES = {'ca': 'CA', 'bc': 'BC', 'glu': 'Glu'}
+
+# Carpetas donde el valor no está en el nombre del archivo sino en su posición
+# (orden alfabético), tal como lo asumen pl_ngqd_ca_effects.py y
+# pl_ir_ngqd_nitrites.py. 'time' (s) no es un campo de FIELDS: folder_metadata
+# lo agrega a los metadatos para kinetics, pero no se guarda.
+POSITIONAL_RULES = {
+    'ngqd_ca_pH_soln1a4': ('ph', [2, 3, 4, 6, 7, 8, 10]),
+    'ngqd_ca_lamda_ex': ('lambda_ex', [350, 365, 380, 395, 410, 425]),
+    'ngqd_ca_tiempo_interaccion': ('time', [0, 30, 60, 90, 120]),
+}
+
+
+def _to_float(text):
+    return float(text.replace(',', '.'))
+
+
+def empty_metadata():
+    return {'technique': '', 'sample': '', 'route': '', 'concentration': math.nan,
+            'replicate': -1, 'ph': math.nan, 'lambda_ex': math.nan, 'dilution': math.nan}
+
+
+def parse_path_metadata(rel_path, replicate=-1):
+    """
+    Devuelve un diccionario con los campos de FIELDS a partir de una ruta
+    relativa a la raíz de datos (p. ej. 'PL/ngqd_ca_dilutions/1 a 4/r1.txt').
+    Los campos numéricos ausentes quedan como NaN.
+
+    La dilución se guarda como el denominador N de '1 a N'; la muestra
+    concentrada ('conc') se guarda como 0.
+    """
+    meta = empty_metadata()
+    parts = [p for p in re.split(r'[\\/]', os.path.normpath(rel_path)) if p not in ('', '.')]
+    if not parts:
+        return meta
+    if parts[0] in TECHNIQUES:
+        meta['technique'] = parts.pop(0)
+    stem = os.path.splitext(parts[-1])[0]
+    meta['sample'] = parts[0] if len(parts) > 1 else stem
+    meta['replicate'] = replicate
+
+    for part in parts[:-1] + [stem]:
+        route = RE_ROUTE.search(part)
+        if route and not meta['route']:
+            meta['route'] = ROUTES[route.group(1).lower()]
+        conc = RE_CONCENTRATION.search(part)
+        if conc:
+            meta['concentration'] = _to_float(conc.group(1))
+        ph = RE_PH.search(part)
+        if ph:
+            meta['ph'] = _to_float(ph.group(1))
+        lambda_ex = RE_LAMBDA_EX.search(part)
+        if lambda_ex:
+            meta['lambda_ex'] = _to_float(lambda_ex.group(1))
+        if part == 'conc':
+            meta['dilution'] = 0.0
+        dilution = RE_DILUTION.match(part)
+        if dilution:
+            meta['dilution'] = float(dilution.group(1))
+    return meta
+
+
+def folder_metadata(rel_dir, file_names, rules=None):
+    """
+    Metadatos de todos los archivos de una carpeta. Los archivos se ordenan
+    alfabéticamente; la réplica es el índice en ese orden y se aplican las
+    reglas posicionales (POSITIONAL_RULES o las de rules) cuando el nombre no
+    trae el valor. Una regla posicional solo se aplica si la carpeta tiene
+    exactamente tantos archivos como valores la regla: con uno de más o de
+    menos las posiciones ya no corresponden y se omite con un aviso.
+
+    Devuelve una lista de (nombre_archivo, metadatos).
+    """
+    file_names = sorted(file_names)
+    rules = POSITIONAL_RULES if rules is None else rules
+    rule = rules.get(os.path.basename(os.path.normpath(rel_dir)))
+    if rule is not None and len(file_names) != len(rule[1]):
+        print(f'La regla posicional de {rel_dir} tiene {len(rule[1])} valores de {rule[0]} y la carpeta '
+              f'{len(file_names)} archivos; no se aplica')
+        rule = None
+    result = []
+    for n, file_name in enumerate(file_names):
+        meta = parse_path_metadata(os.path.join(rel_dir, file_name), replicate=n)
+        if rule is not None:
+            field, values = rule
+            if math.isnan(meta.get(field, math.nan)):
+                meta[field] = float(values[n])
+        result.append((file_name, meta))
+    return result
+
+
+def header_value(file_path, pattern):
+    """
+    Primer valor numérico que captura pattern (regex con un grupo) en la
+    cabecera del archivo; NaN si no hay.
+    """
+    from code_functions.data_txt_pull import data_header
+    for line in data_header(file_path):
+        match = pattern.search(line)
+        if match:
+            return _to_float(match.group(1))
+    return math.nan
+
+
+def folder_values(folder, field, header_pattern=None, file_names=None):
+    """
+    Valor de field para cada archivo de una carpeta de serie (en orden
+    alfabético), por orden de preferencia: nombre del archivo, cabecera (si se
+    indica header_pattern) y regla posicional de POSITIONAL_RULES. Devuelve
+    una lista con NaN donde no se pudo determinar.
+    """
+    file_names = sorted(file_names if file_names is not None else os.listdir(folder))
+    values = []
+    for file_name, meta in folder_metadata(folder, file_names):
+        value = parse_path_metadata(file_name)[field]
+        if math.isnan(value) and header_pattern is not None:
+            value = header_value(os.path.join(folder, file_name), header_pattern)
+        values.append(meta[field] if math.isnan(value) else value)
+    return values
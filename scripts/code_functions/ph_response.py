@@ -0,0 +1,222 @@
+"""
+Respuesta de la PL frente al pH y ajuste de pKa.
+
+Una serie de pH es una pila de espectros (N × M) con el pH de cada archivo
+leído de sus metadatos: nombre ('pH7'), cabecera ('pH: 7.0') o la regla
+posicional de la carpeta (path_metadata.POSITIONAL_RULES). De ella se arma la
+matriz de respuesta R (P × W): la característica de pico (peak_features) o la
+intensidad media por banda de longitud de onda para cada nivel de pH, con las
+réplicas promediadas.
+
+Cada columna de R se ajusta a una sigmoide de Henderson-Hasselbalch,
+
+    F(pH) = F_acid + (F_base - F_acid) / (1 + 10^(n·(pKa - pH)))
+
+con n = 1 o libre (hill=True), para todas las bandas a la vez con
+batched_fit.levenberg_marquardt. El intervalo de respuesta útil es el que va
+del 10 % al 90 % del cambio: pKa ± log10(9)/n.
+
+campaign_sweep repite el análisis para muchas campañas (lotes de N-GQDs,
+rutas de síntesis, diluciones) de un SpectrumBatch en un solo ajuste.
+"""
+import math
+import os
+import numpy as np
+import spectrum_data_loader as sdl
+from code_functions import profiling
+from code_functions.batched_fit import levenberg_marquardt
+from code_functions.kinetics import traces
+from code_functions.path_metadata import RE_HEADER_PH, folder_values
+
+# Resolución con la que se agrupan los niveles de pH de distintos archivos
+PH_DECIMALS = 2
+
+# Campos que identifican una campaña de pH dentro de un lote
+CAMPAIGN_FIELDS = ('sample', 'route', 'dilution', 'concentration', 'lambda_ex')
+
+# Límites del exponente de 10^(n·(pKa - pH)) para evitar desbordamientos
+MAX_EXPONENT = 150.0
+
+
+def ph_values(folder, file_names=None):
+    """
+    pH de cada archivo de la carpeta (en orden alfabético); NaN donde falta.
+    """
+    file_names = file_names if file_names is not None else sdl.list_spectra(folder)
+    return np.asarray(folder_values(folder, 'ph', RE_HEADER_PH, file_names), dtype=np.float64)
+
+
+def load_ph_series(folder, workers=None):
+    """
+    Lee una carpeta con un espectro por pH. Los archivos sin pH se omiten con
+    un aviso. Devuelve (pH (N,), x (M,), Y (N × M)) ordenados por pH, con las
+    réplicas de un mismo pH como filas separadas.
+    """
+    from code_functions.replicate_stack import ReplicateStack
+    file_names = sdl.list_spectra(folder)
+    ph = ph_values(folder, file_names)
+    missing = np.isnan(ph)
+    if missing.any():
+        print(f"Sin pH en {folder}: {', '.join(np.asarray(file_names)[missing])}; se omiten")
+    ph = ph[~missing]
+    file_names = [fn for fn, m in zip(file_names, missing) if not m]
+    if not file_names:
+        raise ValueError(f'No se pudo determinar el pH de ningún espectro de {folder}')
+    order = np.argsort(ph, kind='stable')
+    spectra = sdl.load_many([os.path.join(folder, file_names[n]) for n in order], workers=workers)
+    stack = ReplicateStack.from_xy(spectra)
+    return ph[order], stack.x, stack.Y
+
+
+def response_matrix(ph, x, Y, windows=None, bin_width=None, feature='max', groups=None):
+    """
+    Matriz de respuesta a partir de espectros Y (N × M) con pH ph (N,).
+
+    windows / bin_width / feature: como en kinetics.traces (característica
+        por ventana o intensidad media por banda)
+    groups: índice de campaña de cada espectro (N,); por defecto una sola
+
+    Devuelve (niveles de pH (P,), centros (W,), R (G × P × W), n (G × P)),
+    con R el promedio de las réplicas (NaN si una campaña no midió ese pH) y
+    n el número de espectros de cada celda. Sin groups, R es (P × W) y n (P,).
+    """
+    ph = np.round(np.asarray(ph, dtype=np.float64), PH_DECIMALS)
+    centers, F = traces(x, Y, windows=windows, bin_width=bin_width, feature=feature)
+    F = F.T
+    levels, level_index = np.unique(ph, return_inverse=True)
+    single = groups is None
+    groups = np.zeros(ph.size, dtype=int) if single else np.asarray(groups, dtype=int)
+    G, P = groups.max() + 1, levels.size
+
+    valid = ~np.isnan(F)
+    sums = np.zeros((G * P, F.shape[1]))
+    counts = np.zeros((G * P, F.shape[1]))
+    cell = groups * P + level_index.ravel()
+    np.add.at(sums, cell, np.where(valid, F, 0.0))
+    np.add.at(counts, cell, valid)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        R = (sums / counts).reshape(G, P, -1)
+    n = np.bincount(cell, minlength=G * P).reshape(G, P)
+    if single:
+        return levels, centers, R[0], n[0]
+    return levels, centers, R, n
+
+
+def _sigmoid(ph, P):
+    n = P[:, 3:4] if P.shape[1] > 3 else 1.0
+    z = np.clip(n * (P[:, 2:3] - ph), -MAX_EXPONENT, MAX_EXPONENT)
+    u = 10.0**z
+    return u, 1 / (1 + u), n
+
+
+def _model(ph, P):
+    _, s, _ = _sigmoid(ph, P)
+    return P[:, 0:1] + (P[:, 1:2] - P[:, 0:1]) * s
+
+
+def _jacobian(ph, P):
+    u, s, n = _sigmoid(ph, P)
+    ds = -s * s * u * math.log(10)
+    span = P[:, 1:2] - P[:, 0:1]
+    columns = [1 - s, s, span * ds * n]
+    if P.shape[1] > 3:
+        columns.append(span * ds * (P[:, 2:3] - ph))
+    J = np.stack(np.broadcast_arrays(*columns), axis=-1)
+    return J
+
+
+def _initial_guess(ph, F, hill):
+    """
+    Valores iniciales de todas las curvas: las mesetas son los extremos de pH
+    y el pKa el punto medio de pH ponderado por el cambio |ΔF| entre niveles.
+    """
+    valid = ~np.isnan(F)
+    first = np.argmax(valid, axis=1)
+    last = F.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    rows = np.arange(F.shape[0])
+    F_acid, F_base = F[rows, first], F[rows, last]
+    step = np.abs(np.diff(F, axis=1))
+    step = np.where(np.isnan(step), 0.0, step)
+    mid = (ph[1:] + ph[:-1]) / 2
+    total = step.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pka = np.where(total > 0, (step * mid).sum(axis=1) / total, np.nanmean(ph))
+    p0 = [F_acid, F_base, pka] + ([np.ones_like(pka)] if hill else [])
+    return np.nan_to_num(np.stack(p0, axis=1))
+
+
+@profiling.timed('ph_response')
+def fit_pka(ph, R, hill=False, max_iter=200):
+    """
+    Ajusta la sigmoide de Henderson-Hasselbalch a todas las curvas de R
+    (..., P) frente a los niveles ph (P,) en un solo ajuste por lotes.
+
+    hill: ajustar también la pendiente n (si no, n = 1)
+
+    Devuelve un diccionario con arreglos de forma (...): 'F_acid', 'F_base',
+    'pKa', 'pKa_std', 'n', 'n_std', 'amplitude' (F_base - F_acid),
+    'ph_low' y 'ph_high' (intervalo 10-90 %), 'r2' y 'converged'. Las curvas
+    con menos puntos que parámetros quedan como NaN.
+    """
+    ph = np.asarray(ph, dtype=np.float64)
+    R = np.asarray(R, dtype=np.float64)
+    lead = R.shape[:-1]
+    F = R.reshape(-1, ph.size)
+    K = 4 if hill else 3
+    margin = 2.0
+    lower = [-np.inf, -np.inf, ph.min() - margin] + ([0.1] if hill else [])
+    upper = [np.inf, np.inf, ph.max() + margin] + ([5.0] if hill else [])
+    fit = levenberg_marquardt(_model, _jacobian, ph, F, _initial_guess(ph, F, hill), lower, upper,
+                              max_iter=max_iter)
+    P, std = fit['params'], fit['std']
+    n = P[:, 3] if hill else np.ones(F.shape[0])
+    half_width = math.log10(9) / n
+    out = {'F_acid': P[:, 0], 'F_base': P[:, 1], 'pKa': P[:, 2], 'pKa_std': std[:, 2],
+           'n': n, 'n_std': std[:, 3] if hill else np.zeros(F.shape[0]), 'amplitude': P[:, 1] - P[:, 0],
+           'ph_low': P[:, 2] - half_width, 'ph_high': P[:, 2] + half_width,
+           'r2': fit['r2'], 'converged': fit['converged']}
+    too_few = fit['n_points'] <= K
+    for key, values in out.items():
+        if key != 'converged':
+            values[too_few] = np.nan
+    return {key: values.reshape(lead) for key, values in out.items()}
+
+
+def ph_response(folder, windows=None, bin_width=None, feature='max', hill=False, workers=None):
+    """
+    Matriz de respuesta y ajuste de pKa de una carpeta de serie de pH. Sin
+    windows ni bin_width usa bandas de 10 nm. Devuelve (niveles, centros, R
+    (P × W), ajuste con arreglos (W,)).
+    """
+    if windows is None and bin_width is None:
+        bin_width = 10.0
+    ph, x, Y = load_ph_series(folder, workers=workers)
+    levels, centers, R, _ = response_matrix(ph, x, Y, windows=windows, bin_width=bin_width, feature=feature)
+    return levels, centers, R, fit_pka(levels, R.T, hill=hill)
+
+
+def campaign_sweep(batch, by=CAMPAIGN_FIELDS, windows=None, bin_width=None, feature='max', hill=False):
+    """
+    Respuesta frente al pH de muchas campañas a la vez a partir de un
+    SpectrumBatch: los espectros con pH finito se agrupan por los campos by,
+    las réplicas de cada pH se promedian y todas las curvas (campaña × banda)
+    se ajustan en una sola llamada a levenberg_marquardt.
+
+    Devuelve un diccionario con 'ph' (P,), 'centers' (W,), 'R' (G × P × W),
+    'n' (G × P), 'meta' (G,) (fila del primer espectro de cada campaña, con
+    ph en NaN) y 'fit' con arreglos (G × W).
+    """
+    if windows is None and bin_width is None:
+        bin_width = 10.0
+    rows = np.flatnonzero(np.isfinite(batch.meta['ph']))
+    if rows.size == 0:
+        raise ValueError('El lote no tiene espectros con pH')
+    batch = batch[rows]
+    groups, first = batch.group_index(by)
+    levels, centers, R, n = response_matrix(batch.meta['ph'], batch.x, batch.Y, windows=windows,
+                                            bin_width=bin_width, feature=feature, groups=groups)
+    meta = batch.meta[first].copy()
+    meta['ph'] = np.nan
+    meta['replicate'] = -1
+    return {'ph': levels, 'centers': centers, 'R': R, 'n': n, 'meta': meta,
+            'fit': fit_pka(levels, np.moveaxis(R, 1, 2), hill=hill)}
@@ -0,0 +1,150 @@
+"""
+Preprocesamiento en lote de matrices de espectros (N × M): corrección de línea
+base y suavizado.
+
+Línea base:
+    als            mínimos cuadrados asimétricos (Eilers y Boelens): el sistema
+                   (W + λ·DᵀD) z = W y es pentadiagonal y se resuelve con un
+                   solver de bandas; las bandas de λ·DᵀD se calculan una vez
+                   por tamaño de rejilla.
+    rolling_ball   apertura morfológica (erosión + dilatación) con un elemento
+                   plano de ancho 2·radio+1 seguida de un promedio del mismo
+                   ancho, aplicadas a toda la matriz en una sola llamada.
+
+Suavizado (vectorizado sobre el último eje de toda la matriz):
+    savgol          filtro de Savitzky-Golay
+    moving_average  promedio móvil centrado, equivalente a
+                    rolling(window, center=True, min_periods=1).mean()
+
+Para espectros con los picos hacia abajo (transmitancia FT-IR) se usa
+peaks='down': la línea base se ajusta por encima de la señal.
+"""
+from functools import lru_cache
+import numpy as np
+from scipy import ndimage, signal, sparse
+from scipy.linalg import solveh_banded
+from code_functions import profiling
+
+BASELINES = ('als', 'rolling_ball')
+SMOOTHERS = ('savgol', 'moving_average')
+
+
+def moving_average(values, window=5):
+    """
+    Promedio móvil centrado equivalente a
+    pd.Series(values).rolling(window, center=True, min_periods=1).mean():
+    los NaN se ignoran y los extremos usan las ventanas incompletas.
+    Acepta arreglos 1-D o 2-D (se suaviza a lo largo del último eje).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    left, right = window // 2, window - 1 - window // 2
+    pad = [(0, 0)] * (values.ndim - 1) + [(left + 1, right)]
+    sums = np.cumsum(np.pad(np.where(valid, values, 0.0), pad), axis=-1)
+    counts = np.cumsum(np.pad(valid.astype(np.float64), pad), axis=-1)
+    sums = sums[..., window:] - sums[..., :-window]
+    counts = counts[..., window:] - counts[..., :-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def savgol(Y, window=11, order=3, deriv=0):
+    """
+    Savitzky-Golay sobre el último eje de Y. Los NaN se propagan a su vecindad.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    window = min(window, Y.shape[-1] - (1 - Y.shape[-1] % 2))
+    if window <= order:
+        return Y.copy()
+    return signal.savgol_filter(Y, window, order, deriv=deriv, axis=-1, mode='nearest')
+
+
+@lru_cache(maxsize=16)
+def _penalty_bands(m, lam):
+    """
+    λ·DᵀD (D: segunda diferencia) en el formato de bandas superior de
+    solveh_banded: fila 0 segunda superdiagonal, fila 1 primera, fila 2 diagonal.
+    """
+    D = sparse.diags([1.0, -2.0, 1.0], [0, 1, 2], shape=(m - 2, m))
+    DtD = (D.T @ D).todia()
+    ab = np.zeros((3, m))
+    for k in range(3):
+        ab[2 - k, k:] = DtD.diagonal(k)
+    ab *= lam
+    ab.setflags(write=False)
+    return ab
+
+
+def als_baseline(Y, lam=1e5, p=0.01, n_iter=10):
+    """
+    Línea base por mínimos cuadrados asimétricos para cada fila de Y.
+    lam controla la rigidez y p el peso de los puntos por encima de la base.
+    Los NaN tienen peso cero.
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    N, M = Y.shape
+    if M < 3:
+        return Y.copy()
+    penalty = _penalty_bands(M, float(lam))
+    valid = ~np.isnan(Y)
+    y0 = np.where(valid, Y, 0.0)
+    baseline = np.empty_like(Y)
+    ab = penalty.copy()
+    for n in range(N):
+        w = valid[n].astype(np.float64)
+        for _ in range(n_iter):
+            ab[2] = penalty[2] + w
+            z = solveh_banded(ab, w * y0[n], check_finite=False)
+            w_new = np.where(valid[n], np.where(y0[n] > z, p, 1 - p), 0.0)
+            if np.array_equal(w_new, w):
+                break
+            w = w_new
+        baseline[n] = z
+    return baseline
+
+
+def rolling_ball_baseline(Y, radius=50):
+    """
+    Línea base por apertura morfológica con un elemento plano de 2·radio+1 puntos.
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    size = (1, 2 * int(radius) + 1)
+    # Los NaN se rellenan con el máximo para que no arrastren la apertura
+    filled = np.where(np.isnan(Y), np.nanmax(Y, axis=1, keepdims=True), Y)
+    opened = ndimage.grey_opening(filled, size=size, mode='nearest')
+    return ndimage.uniform_filter(opened, size=size, mode='nearest')
+
+
+def baseline(Y, method='als', peaks='up', **kwargs):
+    """
+    Línea base con el método indicado. Con peaks='down' se ajusta sobre -Y.
+    """
+    if method not in BASELINES:
+        raise ValueError(f'method debe ser uno de {BASELINES}, no {method!r}')
+    sign = -1.0 if peaks == 'down' else 1.0
+    func = als_baseline if method == 'als' else rolling_ball_baseline
+    return sign * func(sign * np.atleast_2d(np.asarray(Y, dtype=np.float64)), **kwargs)
+
+
+def smooth(Y, method='moving_average', window=5, **kwargs):
+    if method not in SMOOTHERS:
+        raise ValueError(f'method debe ser uno de {SMOOTHERS}, no {method!r}')
+    if method == 'savgol':
+        return savgol(Y, window, **kwargs)
+    return moving_average(Y, window)
+
+
+@profiling.timed('preprocess')
+def preprocess(Y, baseline_method=None, smooth_method=None, peaks='up', reference=0.0,
+               baseline_kwargs=None, smooth_kwargs=None):
+    """
+    Corrección de línea base seguida de suavizado sobre toda la matriz Y.
+    La línea base se resta y se reemplaza por el nivel reference (p. ej. 100
+    para transmitancia en %).
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    if baseline_method is not None:
+        Y = Y - baseline(Y, baseline_method, peaks, **(baseline_kwargs or {})) + reference
+    if smooth_method is not None:
+        Y = smooth(Y, smooth_method, **(smooth_kwargs or {}))
+    return Y
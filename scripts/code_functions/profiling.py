@@ -0,0 +1,219 @@
+"""
+Instrumentación ligera de las etapas de carga, agregación, ajuste y renderizado.
+
+Se activa con la variable de entorno NGQD_PROFILE=1 (o llamando a enable(),
+p. ej. desde la opción --profile de build_figures.py). Con la instrumentación
+apagada, stage() devuelve un contexto vacío compartido y count() solo evalúa
+una condición, por lo que el costo es prácticamente nulo.
+
+    from code_functions import profiling
+
+    with profiling.stage('fit'):
+        ...
+    profiling.count('cache_hits')
+
+    @profiling.timed('aggregate')
+    def f(...): ...
+
+Con la instrumentación activa se acumulan, por etapa, el número de llamadas y
+los tiempos de reloj y de CPU; los contadores; y la memoria residente pico
+(muestreada al cerrar cada etapa). report() devuelve el resumen, write_report()
+lo guarda en JSON y write_trace() guarda los intervalos en el formato Chrome
+trace (chrome://tracing o https://ui.perfetto.dev). Si se activó con
+NGQD_PROFILE, el proceso principal escribe ambos archivos al terminar, en
+NGQD_PROFILE_OUT (por defecto ngqd_profile.json y ngqd_profile.trace.json).
+"""
+import atexit
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ENV_VAR = 'NGQD_PROFILE'
+OUT_ENV_VAR = 'NGQD_PROFILE_OUT'
+DEFAULT_OUT = 'ngqd_profile.json'
+
+_lock = threading.Lock()
+_state = {'enabled': False}
+_stages = {}
+_counters = {}
+_events = []
+_peak = {'rss_mb': 0.0}
+
+
+def enabled():
+    return _state['enabled']
+
+
+def enable(flag=True):
+    _state['enabled'] = bool(flag)
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _events.clear()
+        _peak['rss_mb'] = 0.0
+
+
+def _rss_mb():
+    if resource is None:
+        return 0.0
+    # ru_maxrss está en KiB en Linux (en bytes en macOS; se acepta la diferencia)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('name', 'wall', 'cpu')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        wall, cpu = end - self.wall, time.thread_time() - self.cpu
+        rss = _rss_mb()
+        with _lock:
+            entry = _stages.setdefault(self.name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += wall
+            entry[2] += cpu
+            _peak['rss_mb'] = max(_peak['rss_mb'], rss)
+            _events.append({'name': self.name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                            'ts': self.wall * 1e6, 'dur': wall * 1e6})
+        return False
+
+
+def stage(name):
+    """
+    Contexto que mide una etapa; vacío si la instrumentación está apagada.
+    """
+    return _Stage(name) if _state['enabled'] else _NULL_STAGE
+
+
+def timed(name=None):
+    """
+    Decorador equivalente a envolver la función en stage(name).
+    """
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return func(*args, **kwargs)
+            with _Stage(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    if _state['enabled']:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def report():
+    """
+    Resumen: etapas (llamadas, segundos de reloj y de CPU), contadores y
+    memoria residente pico en MB.
+    """
+    with _lock:
+        stages = {name: {'calls': c, 'wall_s': w, 'cpu_s': cpu} for name, (c, w, cpu) in _stages.items()}
+        return {'stages': stages, 'counters': dict(_counters), 'peak_rss_mb': max(_peak['rss_mb'], _rss_mb()),
+                'pid': os.getpid()}
+
+
+def export():
+    """
+    Estado completo (resumen y eventos), para enviarlo desde un proceso hijo.
+    """
+    with _lock:
+        events = list(_events)
+    return {'report': report(), 'events': events}
+
+
+def merge(data):
+    """
+    Incorpora el estado exportado por otro proceso.
+    """
+    rep = data['report']
+    with _lock:
+        for name, s in rep['stages'].items():
+            entry = _stages.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += s['calls']
+            entry[1] += s['wall_s']
+            entry[2] += s['cpu_s']
+        for name, n in rep['counters'].items():
+            _counters[name] = _counters.get(name, 0) + n
+        _peak['rss_mb'] = max(_peak['rss_mb'], rep['peak_rss_mb'])
+        _events.extend(data['events'])
+
+
+def write_report(path=DEFAULT_OUT):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report(), f, indent=2, sort_keys=True)
+
+
+def write_trace(path):
+    with _lock:
+        events = list(_events)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def print_report():
+    rep = report()
+    width = max([32] + [len(name) + 2 for name in rep['stages']])
+    print(f"{'etapa':<{width}}{'llamadas':>10}{'reloj s':>10}{'CPU s':>10}")
+    for name, s in sorted(rep['stages'].items(), key=lambda item: -item[1]['wall_s']):
+        print(f"{name:<{width}}{s['calls']:>10}{s['wall_s']:>10.3f}{s['cpu_s']:>10.3f}")
+    for name, n in sorted(rep['counters'].items()):
+        print(f'{name:<{width}}{n:>10}')
+    print(f"memoria residente pico: {rep['peak_rss_mb']:.1f} MB")
+
+
+def write_all(path=None):
+    """
+    Escribe el resumen JSON en path y la traza en <path sin .json>.trace.json.
+    """
+    path = path or os.environ.get(OUT_ENV_VAR) or DEFAULT_OUT
+    write_report(path)
+    write_trace(os.path.splitext(path)[0] + '.trace.json')
+
+
+def _write_at_exit():
+    if _state['enabled'] and multiprocessing.parent_process() is None:
+        write_all()
+
+
+if os.environ.get(ENV_VAR, '') not in ('', '0'):
+    enable()
+    atexit.register(_write_at_exit)
@@ -0,0 +1,130 @@
+"""
+Promedio de réplicas de espectros con reducciones vectorizadas de NumPy.
+
+Sustituye al patrón pd.concat + groupby('Longitud de onda') + rolling de los
+scripts: las réplicas se guardan como una matriz 2-D (réplicas × puntos) sobre
+una rejilla común y las estadísticas se calculan a lo largo del eje 0.
+"""
+import numpy as np
+from code_functions import profiling
+from code_functions.resampling import GridResampler
+
+# Dos rejillas se consideran iguales si ningún punto se desvía más que esta
+# fracción del paso de la rejilla de referencia
+GRID_TOLERANCE = 1e-3
+
+
+def _same_grid(x, x_ref):
+    if x.size != x_ref.size:
+        return False
+    step = np.median(np.abs(np.diff(x_ref))) if x_ref.size > 1 else 1.0
+    return np.max(np.abs(x - x_ref)) <= GRID_TOLERANCE * step
+
+
+def align_to_grid(xy_list, x_ref, resampler=None):
+    """
+    Matriz (n_espectros × n_puntos) de los pares (x, y) sobre la rejilla
+    ascendente x_ref. Los espectros cuya rejilla coincide con x_ref (dentro de
+    GRID_TOLERANCE) se copian tal cual; el resto se remuestrea en bloque con
+    resampler (un GridResampler de x_ref que se reutiliza entre llamadas) o con
+    uno nuevo.
+    """
+    xy_list = list(xy_list)
+    Y = np.empty((len(xy_list), x_ref.size))
+    pending = []
+    for n, (x, y) in enumerate(xy_list):
+        x = np.asarray(x, dtype=np.float64)
+        order = np.argsort(x, kind='stable')
+        if _same_grid(x[order], x_ref):
+            Y[n] = np.asarray(y, dtype=np.float64)[order]
+        else:
+            pending.append(n)
+    if pending:
+        # Todas las réplicas con otra rejilla se remuestrean en bloque
+        resampler = resampler if resampler is not None else GridResampler(x_ref)
+        Y[pending] = resampler.resample_many([xy_list[n] for n in pending])
+    return Y
+
+
+class ReplicateStack:
+    """
+    Réplicas de un mismo espectro sobre una rejilla común.
+
+    x: rejilla (n_puntos,)
+    Y: intensidades (n_réplicas, n_puntos); NaN donde una réplica no cubre la rejilla
+    """
+
+    def __init__(self, x, Y):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+
+    @classmethod
+    @profiling.timed('aggregate')
+    def from_xy(cls, xy_list):
+        """
+        Construye el stack a partir de pares (x, y), como los que devuelve
+        sdl.load_xy_data. La rejilla de referencia es la de la primera réplica
+        (ordenada); las réplicas con una rejilla distinta se interpolan sobre
+        ella en lugar de separarse por diferencias mínimas en x.
+        """
+        xy_list = list(xy_list)
+        if not xy_list:
+            raise ValueError('No hay réplicas para apilar')
+        x_ref = np.asarray(xy_list[0][0], dtype=np.float64)
+        order_ref = np.argsort(x_ref, kind='stable')
+        x_ref = x_ref[order_ref]
+
+        Y = align_to_grid(xy_list, x_ref)
+        return cls(x_ref, Y)
+
+    def __len__(self):
+        return self.Y.shape[0]
+
+    @property
+    def count(self):
+        return np.sum(~np.isnan(self.Y), axis=0)
+
+    @property
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.nansum(self.Y, axis=0) / self.count
+
+    @property
+    def std(self):
+        """
+        Desviación estándar muestral (ddof=1), como pandas; NaN con una sola réplica.
+        """
+        count = self.count
+        residuals = np.where(np.isnan(self.Y), 0.0, self.Y - self.mean)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 1, np.sqrt(np.sum(residuals**2, axis=0) / (count - 1)), np.nan)
+
+    @property
+    def sem(self):
+        # SEM = std / sqrt(n)
+        return self.std / np.sqrt(self.count)
+
+    def smooth(self, window=5, method='moving_average'):
+        """
+        Media suavizada con promedio móvil centrado o con Savitzky-Golay.
+        """
+        # preprocessing carga scipy.signal: solo se importa al suavizar
+        from code_functions.preprocessing import moving_average, savgol
+        if method == 'savgol':
+            return savgol(self.mean, window)
+        return moving_average(self.mean, window)
+
+    def to_dataframe(self, x_name='Longitud de onda', window=5):
+        """
+        Tabla con las mismas columnas que producía el groupby de los scripts:
+        x_name, 'mean', 'std', 'count', 'sem' y 'mean_suavizada'.
+        """
+        import pandas as pd
+        return pd.DataFrame({
+            x_name: self.x,
+            'mean': self.mean,
+            'std': self.std,
+            'count': self.count,
+            'sem': self.sem,
+            'mean_suavizada': self.smooth(window),
+        })
@@ -0,0 +1,126 @@
+"""
+Remuestreo de espectros heterogéneos a una rejilla común.
+
+GridResampler construye la rejilla destino una vez y, para cada rejilla de
+origen distinta, calcula una sola vez la matriz dispersa de interpolación
+lineal (dos pesos por punto destino). Esa matriz queda en caché y se reutiliza
+para todos los archivos con la misma rejilla, de modo que un lote completo se
+remuestrea con un único producto matriz dispersa × matriz densa.
+"""
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from scipy import sparse
+from code_functions import profiling
+
+
+def make_grid(start, stop, step):
+    """
+    Rejilla uniforme ascendente que incluye ambos extremos si caen en el paso.
+    """
+    n = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return start + step * np.arange(n)
+
+
+def common_grid(xs, step=None):
+    """
+    Rejilla uniforme sobre el rango compartido por todas las rejillas xs
+    (intersección), con el paso mediano más grueso si no se indica step.
+    """
+    lo = max(np.min(x) for x in xs)
+    hi = min(np.max(x) for x in xs)
+    if step is None:
+        step = max(np.median(np.abs(np.diff(x))) for x in xs)
+    return make_grid(lo, hi, step)
+
+
+def grid_key(x):
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    return x.size, hashlib.blake2b(x.tobytes(), digest_size=16).digest()
+
+
+def interpolation_matrix(x_src, x_tgt):
+    """
+    Matriz CSR (M_destino × M_origen) de interpolación lineal. Las columnas
+    corresponden al orden original de x_src, que puede ser descendente.
+    Devuelve (matriz, dentro) donde dentro marca los puntos destino cubiertos.
+    """
+    x_src = np.asarray(x_src, dtype=np.float64)
+    x_tgt = np.asarray(x_tgt, dtype=np.float64)
+    order = np.argsort(x_src, kind='stable')
+    xs = x_src[order]
+    inside = (x_tgt >= xs[0]) & (x_tgt <= xs[-1])
+
+    i = np.clip(np.searchsorted(xs, x_tgt, side='right') - 1, 0, max(xs.size - 2, 0))
+    j = np.minimum(i + 1, xs.size - 1)
+    span = xs[j] - xs[i]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(span > 0, (x_tgt - xs[i]) / span, 0.0)
+    w = np.where(inside, w, 0.0)
+
+    rows = np.repeat(np.arange(x_tgt.size), 2)
+    cols = np.column_stack([order[i], order[j]]).ravel()
+    vals = np.column_stack([(1 - w) * inside, w]).ravel()
+    matrix = sparse.csr_matrix((vals, (rows, cols)), shape=(x_tgt.size, x_src.size))
+    return matrix, inside
+
+
+class GridResampler:
+    """
+    target: rejilla destino (M_destino,)
+    fill: valor para los puntos destino fuera del rango de una rejilla de origen
+    max_cache: número de rejillas de origen distintas que se guardan
+    """
+
+    def __init__(self, target, fill=np.nan, max_cache=64):
+        self.target = np.asarray(target, dtype=np.float64)
+        self.fill = fill
+        self.max_cache = max_cache
+        self._cache = OrderedDict()
+
+    def matrix(self, x_src):
+        key = grid_key(x_src)
+        entry = self._cache.get(key)
+        if entry is None:
+            entry = interpolation_matrix(x_src, self.target)
+            self._cache[key] = entry
+            if len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return entry
+
+    def resample(self, x_src, Y):
+        """
+        Remuestrea una matriz Y (N × M_origen) de espectros que comparten x_src.
+        Devuelve (N × M_destino) con el mismo tipo de dato que Y.
+        """
+        Y = np.atleast_2d(np.asarray(Y))
+        if Y.dtype.kind != 'f':
+            Y = Y.astype(np.float64)
+        x_src = np.asarray(x_src, dtype=np.float64)
+        if x_src.size == self.target.size and np.array_equal(x_src, self.target):
+            return Y
+        matrix, inside = self.matrix(x_src)
+        out = np.asarray(Y @ matrix.T.astype(Y.dtype))
+        if not inside.all():
+            out[:, ~inside] = self.fill
+        return out
+
+    @profiling.timed('resample')
+    def resample_many(self, xy_list, dtype=np.float64):
+        """
+        Remuestrea una lista de pares (x, y) con rejillas posiblemente distintas.
+        Los espectros se agrupan por rejilla y cada grupo se resuelve con un
+        solo producto. Devuelve una matriz (N × M_destino) en el orden de entrada.
+        """
+        xy_list = list(xy_list)
+        out = np.empty((len(xy_list), self.target.size), dtype=dtype)
+        groups = {}
+        for n, (x, _) in enumerate(xy_list):
+            groups.setdefault(grid_key(x), []).append(n)
+        for rows in groups.values():
+            x_src = xy_list[rows[0]][0]
+            Y = np.stack([np.asarray(xy_list[n][1], dtype=dtype) for n in rows])
+            out[rows] = self.resample(x_src, Y)
+        return out
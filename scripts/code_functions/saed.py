@@ -0,0 +1,306 @@
+"""
+Análisis en lote de patrones de difracción de electrones de área selecta (SAED).
+
+Sustituye la medición manual de los anillos en ImageJ (Glu_diffraction_patterns.csv)
+por el procesamiento directo de las imágenes:
+
+    find_center        centro del haz por simetría de Friedel: correlación
+                       (FFT) de la imagen con su rotación de 180°
+    radial_profile     perfil integrado azimutalmente con np.bincount sobre
+                       índices de radio precalculados
+    detect_rings       anillos como máximos del perfil sobre una línea base
+                       ALS en escala logarítmica (scipy.signal.find_peaks)
+    match_reflections  asignación de cada espaciado d a la reflexión más
+                       cercana de una tabla (grafito / grafeno por defecto)
+
+La geometría polar (índice de anillo de cada píxel y número de píxeles por
+anillo) depende solo del tamaño de la imagen, del centro, de la calibración
+(nm⁻¹ por píxel) y del ancho de anillo, y se guarda en una caché LRU: las
+imágenes de una misma sesión de TEM la calculan una sola vez.
+
+Convención: g es el radio del anillo en el espacio recíproco (nm⁻¹) y
+d = 1/g, en Å = 10/g.
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+import numpy as np
+from code_functions import profiling
+
+# (d en Å, reflexión). Grafito hexagonal (JCPDS 41-1487); en el grafeno de
+# pocas capas solo aparecen las reflexiones del plano basal {1-100} y {11-20}
+REFLECTIONS_GRAPHITE = [
+    (3.35, 'graphite (002)'),
+    (2.13, 'graphite (100) / graphene {1-100}'),
+    (2.03, 'graphite (101)'),
+    (1.80, 'graphite (102)'),
+    (1.68, 'graphite (004)'),
+    (1.54, 'graphite (103)'),
+    (1.23, 'graphite (110) / graphene {11-20}'),
+    (1.16, 'graphite (112)'),
+    (1.12, 'graphite (006)'),
+    (1.07, 'graphite (200) / graphene {2-200}'),
+]
+
+IMAGE_EXTENSIONS = ('.tif', '.tiff', '.png', '.jpg', '.jpeg', '.bmp', '.npy')
+
+# Redondeo del centro (píxeles) para reutilizar la geometría de la caché
+CENTER_DECIMALS = 1
+
+
+def d_spacing_angstrom(g):
+    """
+    Espaciado d (Å) a partir del radio del anillo en el espacio recíproco (nm⁻¹).
+    """
+    # d (nm) = 1 / g (nm⁻¹); 1 nm = 10 Å
+    return 10 / np.asarray(g, dtype=np.float64)
+
+
+def load_reflection_table(csv_path):
+    """
+    Lee una tabla de reflexiones desde un CSV con columnas d (Å) y label.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return [(float(row['d']), row['label']) for row in csv.DictReader(f)]
+
+
+def load_image(file_path):
+    """
+    Imagen de difracción como arreglo 2-D float64 (las imágenes RGB se pasan
+    a escala de grises). Se lee con Pillow o, para .npy, con NumPy.
+    """
+    if file_path.lower().endswith('.npy'):
+        image = np.load(file_path)
+    else:
+        from PIL import Image
+        with Image.open(file_path) as img:
+            image = np.asarray(img.convert('F') if img.mode not in ('I', 'I;16', 'F') else img)
+    image = np.asarray(image, dtype=np.float64)
+    if image.ndim == 3:
+        image = image[..., :3].mean(axis=2)
+    return image
+
+
+def find_center(image, method='symmetry'):
+    """
+    Centro del patrón (fila, columna) en píxeles, con precisión sub-píxel.
+
+    'symmetry': un patrón de difracción es centrosimétrico, de modo que la
+        correlación de la imagen con su rotación de 180° (la autoconvolución,
+        calculada con FFT) tiene el máximo en 2·centro. Usa log(1 + I) para
+        que los anillos pesen frente al haz directo.
+    'centroid': centroide de los píxeles más intensos (haz directo sin
+        beam stop).
+    """
+    image = np.asarray(image, dtype=np.float64)
+    shape = np.array(image.shape)
+    if method == 'centroid':
+        level = np.percentile(image, 99.9)
+        rows, cols = np.nonzero(image >= level)
+        weights = image[rows, cols]
+        return float(np.average(rows, weights=weights)), float(np.average(cols, weights=weights))
+    if method != 'symmetry':
+        raise ValueError(f"method debe ser 'symmetry' o 'centroid', no {method!r}")
+
+    a = np.log1p(np.clip(image - image.min(), 0, None))
+    a -= a.mean()
+    spectrum = np.fft.rfft2(a)
+    # Si a(x) = a(2c - x), la autoconvolución ifft(F²) tiene su máximo en
+    # 2c (módulo el tamaño de la imagen)
+    conv = np.fft.irfft2(spectrum * spectrum, s=a.shape)
+    peak = np.unravel_index(np.argmax(conv), conv.shape)
+
+    center = []
+    for axis, (p, n) in enumerate(zip(peak, shape)):
+        # Refinamiento parabólico con los vecinos (con periodicidad)
+        idx = [list(peak), list(peak)]
+        idx[0][axis], idx[1][axis] = (p - 1) % n, (p + 1) % n
+        y0, y1, y2 = conv[tuple(idx[0])], conv[peak], conv[tuple(idx[1])]
+        denom = y0 - 2 * y1 + y2
+        delta = 0.5 * (y0 - y2) / denom if denom < 0 else 0.0
+        two_c = p + np.clip(delta, -0.5, 0.5)
+        # 2c y 2c - n dan el mismo máximo; se toma el centro más cercano al de la imagen
+        candidates = np.array([two_c / 2, (two_c + n) / 2])
+        center.append(float(candidates[np.argmin(np.abs(candidates - (n - 1) / 2))]))
+    return tuple(center)
+
+
+@lru_cache(maxsize=32)
+def _polar_geometry(shape, center, pixel_size, bin_width):
+    """
+    Índice de anillo de cada píxel (aplanado), píxeles por anillo y radio g
+    (nm⁻¹) del centro de cada anillo. Los arreglos devueltos son de solo lectura.
+    """
+    rows = np.arange(shape[0]) - center[0]
+    cols = np.arange(shape[1]) - center[1]
+    radius = np.hypot(rows[:, None], cols[None, :]) * pixel_size
+    index = (radius / bin_width).astype(np.intp).ravel()
+    counts = np.bincount(index)
+    g = (np.arange(counts.size) + 0.5) * bin_width
+    for array in (index, counts, g):
+        array.flags.writeable = False
+    return index, counts, g
+
+
+def radial_profile(image, center, pixel_size=1.0, bin_width=None, mask=None):
+    """
+    Intensidad media por anillo.
+
+    center: (fila, columna) en píxeles
+    pixel_size: calibración en nm⁻¹ por píxel (1 para trabajar en píxeles)
+    bin_width: ancho de anillo en nm⁻¹ (por defecto, un píxel)
+    mask: booleano con True en los píxeles válidos (p. ej. fuera del beam stop)
+
+    Devuelve (g, perfil, error estándar de la media de cada anillo); los
+    anillos sin píxeles válidos quedan como NaN.
+    """
+    image = np.asarray(image, dtype=np.float64)
+    bin_width = float(bin_width or pixel_size)
+    center = tuple(round(float(c), CENTER_DECIMALS) for c in center)
+    index, counts, g = _polar_geometry(image.shape, center, float(pixel_size), bin_width)
+    values = image.ravel()
+    if mask is not None:
+        valid = np.asarray(mask, dtype=bool).ravel()
+        index, values = index[valid], values[valid]
+        counts = np.bincount(index, minlength=g.size)
+    sums = np.bincount(index, weights=values, minlength=g.size)
+    squares = np.bincount(index, weights=values * values, minlength=g.size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        profile = np.where(counts > 0, sums / counts, np.nan)
+        variance = np.clip(squares / counts - profile**2, 0, None)
+        sem = np.where(counts > 1, np.sqrt(variance / (counts - 1)), np.nan)
+    return g, profile, sem
+
+
+def detect_rings(g, profile, sem=None, g_min=None, g_max=None, lam=1e4, prominence=0.1, min_snr=5.0,
+                 max_rings=None):
+    """
+    Radios de los anillos a partir del perfil radial.
+
+    El perfil cae varios órdenes de magnitud desde el centro, por lo que los
+    anillos se buscan en log(perfil) menos una línea base ALS (preprocessing).
+    prominence está en unidades de log natural (0.1 ≈ 10 % sobre el fondo).
+    Con el error estándar de cada anillo (sem, de radial_profile) se exige
+    además que la prominencia supere min_snr veces el error de log(perfil),
+    sem/perfil, en el máximo: así el ruido de los anillos externos, con pocas
+    cuentas, no se confunde con reflexiones.
+    g_min descarta el haz directo (por defecto, los primeros 3 % del perfil)
+    y g_max los anillos incompletos de las esquinas.
+
+    Devuelve un diccionario de arreglos: 'g' (refinado con una parábola),
+    'intensity' (perfil en el máximo) y 'prominence', ordenados por g.
+    """
+    from scipy.signal import find_peaks
+    from code_functions.preprocessing import als_baseline
+    g = np.asarray(g, dtype=np.float64)
+    profile = np.asarray(profile, dtype=np.float64)
+    if g_min is None:
+        g_min = g[int(0.03 * g.size)] if g.size else 0.0
+    keep = (g >= g_min) & np.isfinite(profile) & (profile > 0)
+    if g_max is not None:
+        keep &= g <= g_max
+    g, profile = g[keep], profile[keep]
+    empty = {'g': np.empty(0), 'intensity': np.empty(0), 'prominence': np.empty(0)}
+    if g.size < 5:
+        return empty
+
+    log_profile = np.log(profile)
+    residual = log_profile - als_baseline(log_profile, lam=lam, p=0.01)[0]
+    peaks, props = find_peaks(residual, prominence=prominence)
+    if sem is not None:
+        log_error = np.asarray(sem, dtype=np.float64)[keep][peaks] / profile[peaks]
+        significant = ~(props['prominences'] < min_snr * log_error)
+        peaks, props['prominences'] = peaks[significant], props['prominences'][significant]
+    if max_rings is not None and peaks.size > max_rings:
+        strongest = np.argsort(props['prominences'])[::-1][:max_rings]
+        peaks, props['prominences'] = peaks[strongest], props['prominences'][strongest]
+    if peaks.size == 0:
+        return empty
+
+    # Refinamiento parabólico de la posición (sub-anillo)
+    inner = (peaks > 0) & (peaks < g.size - 1)
+    i0, i2 = np.clip(peaks - 1, 0, g.size - 1), np.clip(peaks + 1, 0, g.size - 1)
+    y0, y1, y2 = residual[i0], residual[peaks], residual[i2]
+    denom = y0 - 2 * y1 + y2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = np.where(inner & (denom < 0), 0.5 * (y0 - y2) / denom, 0.0)
+    step = np.where(inner, (g[i2] - g[i0]) / 2, 0.0)
+    g_peak = g[peaks] + np.clip(delta, -0.5, 0.5) * step
+
+    order = np.argsort(g_peak)
+    return {'g': g_peak[order], 'intensity': profile[peaks][order], 'prominence': props['prominences'][order]}
+
+
+def match_reflections(d, reflections=REFLECTIONS_GRAPHITE, tolerance=0.04):
+    """
+    Reflexión más cercana para cada espaciado d (Å), si el error relativo es
+    menor que tolerance. Devuelve (etiquetas, d de referencia, error relativo);
+    los espaciados sin asignar tienen etiqueta '' y NaN.
+    """
+    d = np.atleast_1d(np.asarray(d, dtype=np.float64))
+    d_ref = np.array([r[0] for r in reflections], dtype=np.float64)
+    labels = np.array([r[1] for r in reflections], dtype=object)
+    if d.size == 0 or d_ref.size == 0:
+        return np.array([], dtype=object), np.full(d.shape, np.nan), np.full(d.shape, np.nan)
+    error = (d[:, None] - d_ref[None, :]) / d_ref[None, :]
+    best = np.argmin(np.abs(error), axis=1)
+    best_error = error[np.arange(d.size), best]
+    matched = np.abs(best_error) <= tolerance
+    return (np.where(matched, labels[best], ''), np.where(matched, d_ref[best], np.nan),
+            np.where(matched, best_error, np.nan))
+
+
+@profiling.timed('saed')
+def analyze_image(image, pixel_size, center=None, center_method='symmetry', bin_width=None, mask=None,
+                  reflections=REFLECTIONS_GRAPHITE, tolerance=0.04, **ring_kwargs):
+    """
+    Centro, perfil radial, anillos y su asignación para una imagen (arreglo o
+    ruta de archivo). pixel_size es la calibración en nm⁻¹ por píxel; el
+    resto de los argumentos con nombre se pasan a detect_rings.
+    """
+    path = image if isinstance(image, (str, os.PathLike)) else None
+    if path is not None:
+        image = load_image(path)
+    if center is None:
+        center = find_center(image, center_method)
+    g, profile, sem = radial_profile(image, center, pixel_size, bin_width, mask)
+    # Por defecto solo anillos completos: hasta el borde más cercano al centro
+    inscribed = min(center[0], center[1], image.shape[0] - 1 - center[0], image.shape[1] - 1 - center[1])
+    ring_kwargs.setdefault('g_max', inscribed * pixel_size)
+    rings = detect_rings(g, profile, sem, **ring_kwargs)
+    rings['d'] = d_spacing_angstrom(rings['g'])
+    rings['label'], rings['d_ref'], rings['error'] = match_reflections(rings['d'], reflections, tolerance)
+    return {'path': path, 'center': tuple(center), 'g': g, 'profile': profile, 'rings': rings}
+
+
+def analyze_images(file_paths, pixel_size, workers=None, **kwargs):
+    """
+    analyze_image sobre muchos archivos, en un pool de procesos. La caché de
+    geometría vive en cada proceso, por lo que conviene agrupar las imágenes
+    de un mismo tamaño y calibración en una llamada.
+    """
+    file_paths = list(file_paths)
+    workers = workers or os.cpu_count() or 1
+    func = partial(analyze_image, pixel_size=pixel_size, **kwargs)
+    if workers == 1 or len(file_paths) < 2:
+        return [func(fp) for fp in file_paths]
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, file_paths, chunksize=chunksize))
+
+
+def write_rings_csv(results, out_path):
+    """
+    Una fila por anillo: archivo, centro, g (nm⁻¹), d (Å) y reflexión asignada.
+    """
+    with open(out_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'center_row', 'center_col', 'ring', 'g_nm-1', 'd_A', 'prominence',
+                         'reflection', 'd_ref_A', 'rel_error'])
+        for result in results:
+            rings = result['rings']
+            for n in range(rings['g'].size):
+                writer.writerow([result['path'], f"{result['center'][0]:.2f}", f"{result['center'][1]:.2f}", n,
+                                 f"{rings['g'][n]:.4f}", f"{rings['d'][n]:.4f}", f"{rings['prominence'][n]:.4f}",
+                                 rings['label'][n], f"{rings['d_ref'][n]:.3f}", f"{rings['error'][n]:.4f}"])
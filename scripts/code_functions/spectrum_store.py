@@ -0,0 +1,212 @@
+"""
+Almacén columnar de espectros para un árbol completo de datos_espectros.
+
+Por cada técnica (PL, FT-IR, UV-Vis) se guardan, en store_dir/<técnica>/:
+    grid.npy       eje x común (ascendente)
+    intensity.npy  matriz N×M con un espectro por fila
+    meta.npy       arreglo estructurado con una fila de metadatos por espectro
+
+Los tres archivos son .npy planos, por lo que se abren con mmap y las
+selecciones contiguas se devuelven sin copiar datos.
+"""
+import json
+import math
+import os
+import numpy as np
+import spectrum_data_loader as sdl
+from code_functions.path_metadata import folder_metadata
+from code_functions.preprocessing import preprocess as preprocess_stack
+from code_functions.resampling import GridResampler
+from code_functions.spectrum_types import metadata_array
+
+INDEX_FILE = 'index.json'
+
+# Orientación de los picos y nivel de la línea base corregida por técnica
+# (la transmitancia FT-IR tiene las bandas hacia abajo y la base en 100 %)
+BASELINE_DEFAULTS = {'FT-IR': {'peaks': 'down', 'reference': 100.0}}
+
+
+def scan_tree(root):
+    """
+    Recorre el árbol y devuelve una lista de (ruta_relativa, metadatos) de los
+    archivos de espectros, en orden estable.
+    """
+    entries = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        rel_dir = os.path.relpath(dir_path, root)
+        spectra = [fn for fn in file_names if fn.lower().endswith(sdl.EXTENSIONES)]
+        for file_name, meta in folder_metadata(rel_dir, spectra):
+            entries.append((os.path.normpath(os.path.join(rel_dir, file_name)), meta))
+    return entries
+
+
+def _common_grid(xs):
+    # Se usa la rejilla más frecuente; el resto se interpola sobre ella
+    counts = {}
+    for x in xs:
+        key = (x.size, x[0], x[-1])
+        counts.setdefault(key, [0, x])[0] += 1
+    return max(counts.values(), key=lambda c: c[0])[1] if counts else None
+
+
+def _ingest_technique_chunked(root, entries, out_dir, preprocess, memory_mb):
+    """
+    Como _ingest_technique, sin tener la técnica completa en memoria: una
+    primera pasada por bloques elige la rejilla común y descarta los archivos
+    vacíos, y la segunda remuestrea cada bloque sobre ella y lo escribe en el
+    memmap.
+    """
+    from code_functions.chunked import iter_blocks, iter_spectra
+    paths = [os.path.join(root, rel_path) for rel_path, _ in entries]
+    valid = []
+
+    def grids():
+        for n, x, _ in iter_spectra(paths, memory_mb):
+            if x.size == 0:
+                print(f'Omitiendo archivo sin datos: {entries[n][0]}')
+                continue
+            valid.append(n)
+            yield np.sort(x, kind='stable')
+
+    grid = _common_grid(grids())
+    entries = [entries[n] for n in valid]
+    if not entries:
+        return {'n_spectra': 0, 'n_points': 0}
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, 'grid.npy'), grid)
+    intensity = np.lib.format.open_memmap(os.path.join(out_dir, 'intensity.npy'), mode='w+',
+                                          dtype=np.float64, shape=(len(entries), grid.size))
+    # Una sola clave: todos los bloques comparten la rejilla y su GridResampler
+    for start, _, _, Y in iter_blocks([paths[n] for n in valid], groups=[None] * len(valid), grid=grid,
+                                      memory_mb=memory_mb):
+        if preprocess:
+            Y = preprocess_stack(Y, **preprocess)
+        intensity[start:start + Y.shape[0]] = Y
+    intensity.flush()
+    del intensity
+
+    np.save(os.path.join(out_dir, 'meta.npy'), metadata_array(entries))
+    return {'n_spectra': len(entries), 'n_points': int(grid.size), 'preprocess': preprocess or {}}
+
+
+def _ingest_technique(root, entries, out_dir, preprocess=None, memory_mb=None):
+    if memory_mb is not None:
+        return _ingest_technique_chunked(root, entries, out_dir, preprocess, memory_mb)
+    xs, ys, valid = [], [], []
+    loaded = sdl.load_many([os.path.join(root, rel_path) for rel_path, _ in entries])
+    for (rel_path, m), (x, y) in zip(entries, loaded):
+        if x.size == 0:
+            print(f'Omitiendo archivo sin datos: {rel_path}')
+            continue
+        order = np.argsort(x, kind='stable')
+        xs.append(x[order])
+        ys.append(y[order])
+        valid.append((rel_path, m))
+    entries = valid
+    if not entries:
+        return {'n_spectra': 0, 'n_points': 0}
+
+    grid = _common_grid(xs)
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, 'grid.npy'), grid)
+    intensity = np.lib.format.open_memmap(os.path.join(out_dir, 'intensity.npy'), mode='w+',
+                                          dtype=np.float64, shape=(len(entries), grid.size))
+    # Una matriz de interpolación por rejilla de origen, aplicada a todo su grupo
+    Y = GridResampler(grid).resample_many(zip(xs, ys))
+    if preprocess:
+        Y = preprocess_stack(Y, **preprocess)
+    intensity[:] = Y
+    intensity.flush()
+    del intensity
+
+    np.save(os.path.join(out_dir, 'meta.npy'), metadata_array(entries))
+    return {'n_spectra': len(entries), 'n_points': int(grid.size), 'preprocess': preprocess or {}}
+
+
+def _sort_key(entry):
+    rel_path, m = entry
+    nums = [v if not math.isnan(v) else -1.0 for v in (m['dilution'], m['concentration'], m['ph'], m['lambda_ex'])]
+    return (m['sample'], *nums, m['replicate'], rel_path)
+
+
+def ingest_tree(root, store_dir, preprocess=None, memory_mb=None):
+    """
+    Empaqueta todos los espectros de root en un almacén columnar en store_dir.
+    Las filas se ordenan por muestra y condiciones, de modo que cada serie
+    experimental ocupa un bloque contiguo.
+
+    preprocess: diccionario técnica -> argumentos de preprocessing.preprocess
+    (p. ej. {'FT-IR': {'baseline_method': 'als'}}) para corregir la línea base
+    o suavizar todos los espectros de esa técnica al empaquetarlos.
+    memory_mb: techo de memoria (MB) para empaquetar por bloques (chunked) en
+    lugar de cargar cada técnica completa.
+    """
+    by_technique = {}
+    for rel_path, meta in scan_tree(root):
+        if meta['technique']:
+            by_technique.setdefault(meta['technique'], []).append((rel_path, meta))
+
+    index = {'root': os.path.abspath(root), 'techniques': {}}
+    for technique, entries in by_technique.items():
+        entries.sort(key=_sort_key)
+        out_dir = os.path.join(store_dir, technique)
+        options = (preprocess or {}).get(technique)
+        if options and options.get('baseline_method'):
+            options = {**BASELINE_DEFAULTS.get(technique, {}), **options}
+        index['techniques'][technique] = _ingest_technique(root, entries, out_dir, options, memory_mb)
+        print(f"{technique}: {index['techniques'][technique]['n_spectra']} espectros")
+
+    with open(os.path.join(store_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+class SpectrumStore:
+    """
+    Acceso de solo lectura a un almacén creado con ingest_tree.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, INDEX_FILE), encoding='utf-8') as f:
+            self.index = json.load(f)
+        self._opened = {}
+
+    @property
+    def techniques(self):
+        return list(self.index['techniques'])
+
+    def technique(self, name):
+        """
+        Devuelve (grid, intensity, meta) de una técnica, abiertos con mmap.
+        """
+        if name not in self._opened:
+            folder = os.path.join(self.store_dir, name)
+            self._opened[name] = tuple(
+                np.load(os.path.join(folder, f'{part}.npy'), mmap_mode='r')
+                for part in ('grid', 'intensity', 'meta'))
+        return self._opened[name]
+
+    def select(self, technique, **filters):
+        """
+        Selecciona espectros por metadatos. Cada filtro es un valor exacto o
+        una tupla (mínimo, máximo) inclusiva, p. ej.:
+            store.select('PL', sample='ngqd_ca_curva_in_situ', concentration=(0, 100))
+
+        Devuelve (grid, intensity, meta). Si las filas elegidas son contiguas,
+        intensity es una vista del mmap, sin copia.
+        """
+        grid, intensity, meta = self.technique(technique)
+        mask = np.ones(meta.shape[0], dtype=bool)
+        for field, value in filters.items():
+            column = meta[field]
+            if isinstance(value, tuple):
+                mask &= (column >= value[0]) & (column <= value[1])
+            else:
+                mask &= column == value
+        rows = np.flatnonzero(mask)
+        if rows.size and rows[-1] - rows[0] + 1 == rows.size:
+            rows = slice(rows[0], rows[-1] + 1)
+        return grid, intensity[rows], meta[rows]
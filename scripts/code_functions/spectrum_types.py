@@ -0,0 +1,326 @@
+"""
+Representación compacta de espectros y lotes de espectros con metadatos.
+
+    Spectrum       un espectro: x, y (arreglos) y su fila de metadatos
+    SpectrumBatch  N espectros sobre una rejilla x compartida: matriz Y (N × M)
+                   y un arreglo estructurado de metadatos (N,)
+
+Las intensidades pueden guardarse en float32 (4 bytes por punto) en lugar de
+float64, y el eje x de un lote se guarda una sola vez. Los metadatos usan el
+mismo dtype estructurado que meta.npy de spectrum_store (técnica, muestra,
+ruta de síntesis, concentración, réplica, pH, λex, dilución y ruta del
+archivo), por lo que un lote se construye directamente desde el almacén sin
+copiar la matriz.
+
+    batch = SpectrumBatch.from_files(rutas, root='datos_espectros', dtype=np.float32)
+    batch.select(sample='ngqd_ca_curva_in_situ', concentration=(0, 100)).stack()
+"""
+import math
+import os
+import numpy as np
+import spectrum_data_loader as sdl
+from code_functions.path_metadata import FIELDS, empty_metadata, parse_path_metadata
+from code_functions.replicate_stack import ReplicateStack, align_to_grid
+
+# Nombres de columnas de to_dataframe por técnica, como en los scripts
+COLUMN_NAMES = {
+    'PL': ('Longitud de onda', 'Intensidad'),
+    'UV-Vis': ('Longitud de onda', 'Absorbancia'),
+    'FT-IR': ('Número de onda', 'Transmitancia'),
+}
+DEFAULT_COLUMNS = ('Longitud de onda', 'Intensidad')
+
+
+def meta_dtype(path_len, sample_len):
+    return np.dtype([
+        ('path', f'U{path_len}'), ('technique', 'U8'), ('sample', f'U{sample_len}'),
+        ('route', 'U4'), ('concentration', 'f8'), ('replicate', 'i4'),
+        ('ph', 'f8'), ('lambda_ex', 'f8'), ('dilution', 'f8'),
+    ])
+
+
+def metadata_array(entries):
+    """
+    Arreglo estructurado a partir de una lista de (ruta, metadatos), con los
+    metadatos como los devuelve path_metadata.parse_path_metadata.
+    """
+    entries = list(entries)
+    path_len = max([1] + [len(p) for p, _ in entries])
+    sample_len = max([1] + [len(m['sample']) for _, m in entries])
+    meta = np.zeros(len(entries), dtype=meta_dtype(path_len, sample_len))
+    for n, (path, m) in enumerate(entries):
+        meta[n] = (path, *(m[field] for field in FIELDS))
+    return meta
+
+
+def _column_names(technique, x_name, y_name):
+    default_x, default_y = COLUMN_NAMES.get(technique, DEFAULT_COLUMNS)
+    return x_name or default_x, y_name or default_y
+
+
+def _file_metadata(paths, root):
+    """
+    Metadatos de cada archivo, relativos a root si se indica. Las réplicas y
+    las reglas posicionales solo se conocen recorriendo la carpeta completa
+    (spectrum_store.scan_tree); aquí la réplica es el orden dentro de la lista.
+    """
+    entries, seen = [], {}
+    for path in paths:
+        rel_path = os.path.relpath(path, root) if root else path
+        folder = os.path.dirname(rel_path)
+        replicate = seen.get(folder, 0)
+        seen[folder] = replicate + 1
+        entries.append((os.path.normpath(rel_path), parse_path_metadata(rel_path, replicate=replicate)))
+    return entries
+
+
+class Spectrum:
+    """
+    Un espectro con sus metadatos.
+
+    x, y: arreglos (M,); meta: fila del dtype de meta_dtype
+    """
+    __slots__ = ('x', 'y', 'meta')
+
+    def __init__(self, x, y, meta=None, dtype=np.float64):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=dtype)
+        if meta is None:
+            meta = metadata_array([('', empty_metadata())])[0]
+        self.meta = meta
+
+    @classmethod
+    def from_file(cls, file_path, root=None, dtype=np.float64):
+        """
+        Lee un archivo con sdl.load_xy_data; los metadatos salen de la ruta
+        (relativa a root si se indica, p. ej. root='datos_espectros').
+        """
+        x, y = sdl.load_xy_data(file_path)
+        (rel_path, meta), = _file_metadata([file_path], root)
+        return cls(x, y, metadata_array([(rel_path, meta)])[0], dtype)
+
+    def __len__(self):
+        return self.y.size
+
+    def __getattr__(self, name):
+        # Acceso directo a los campos de metadatos: spectrum.concentration
+        if name in ('path',) + FIELDS:
+            value = self.meta[name]
+            return value.item() if hasattr(value, 'item') else value
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return f'Spectrum({str(self.meta["path"])!r}, {self.y.size} puntos, {self.y.dtype})'
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes + self.meta.nbytes
+
+    def to_dataframe(self, x_name=None, y_name=None):
+        """
+        DataFrame de dos columnas; por defecto con los nombres que usan los
+        scripts para la técnica (COLUMN_NAMES).
+        """
+        import pandas as pd
+        x_name, y_name = _column_names(self.technique, x_name, y_name)
+        return pd.DataFrame({x_name: self.x, y_name: self.y})
+
+
+class SpectrumBatch:
+    """
+    N espectros sobre una rejilla ascendente compartida.
+
+    x: rejilla (M,) en float64
+    Y: intensidades (N, M) en float32 o float64; NaN fuera del rango de cada espectro
+    meta: arreglo estructurado (N,) con el dtype de meta_dtype
+    """
+    __slots__ = ('x', 'Y', 'meta')
+
+    def __init__(self, x, Y, meta=None):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.Y = np.atleast_2d(Y)
+        if meta is None:
+            meta = metadata_array([('', empty_metadata())] * self.Y.shape[0])
+        if meta.shape[0] != self.Y.shape[0]:
+            raise ValueError(f'Hay {self.Y.shape[0]} espectros y {meta.shape[0]} filas de metadatos')
+        self.meta = meta
+
+    @classmethod
+    def from_files(cls, file_paths, root=None, grid=None, dtype=np.float32, workers=None):
+        """
+        Carga los archivos con sdl.load_many y los lleva a grid (por defecto,
+        la rejilla del primer archivo, como ReplicateStack.from_xy).
+        """
+        file_paths = list(file_paths)
+        if not file_paths:
+            raise ValueError('No hay archivos para cargar')
+        loaded = sdl.load_many(file_paths, workers=workers)
+        if grid is None:
+            grid = np.sort(np.asarray(loaded[0][0], dtype=np.float64), kind='stable')
+        Y = align_to_grid(loaded, grid).astype(dtype, copy=False)
+        return cls(grid, Y, metadata_array(_file_metadata(file_paths, root)))
+
+    @classmethod
+    def from_catalog(cls, catalog, grid=None, dtype=np.float32, workers=None, **filters):
+        """
+        Lote con los espectros de un catalog.Catalog que cumplen los filtros,
+        con los metadatos del índice (réplicas y reglas posicionales incluidas)
+        en lugar de volver a interpretar las rutas.
+        """
+        entries = catalog.query(**filters)
+        if not entries:
+            raise ValueError(f'Ningún espectro del catálogo cumple {filters}')
+        file_paths = [os.path.join(catalog.root, *path.split('/')) for path, _ in entries]
+        loaded = sdl.load_many(file_paths, workers=workers)
+        if grid is None:
+            grid = np.sort(np.asarray(loaded[0][0], dtype=np.float64), kind='stable')
+        Y = align_to_grid(loaded, grid).astype(dtype, copy=False)
+        return cls(grid, Y, metadata_array(entries))
+
+    @classmethod
+    def from_spectra(cls, spectra, grid=None, dtype=None):
+        """
+        Lote a partir de objetos Spectrum, llevados a una rejilla común.
+        """
+        spectra = list(spectra)
+        if not spectra:
+            raise ValueError('No hay espectros para apilar')
+        if grid is None:
+            grid = np.sort(spectra[0].x, kind='stable')
+        dtype = dtype or np.result_type(*(s.y.dtype for s in spectra))
+        Y = align_to_grid([(s.x, s.y) for s in spectra], grid).astype(dtype, copy=False)
+        meta = metadata_array((s.path, {f: getattr(s, f) for f in FIELDS}) for s in spectra)
+        return cls(grid, Y, meta)
+
+    @classmethod
+    def from_stack(cls, stack, meta=None, dtype=None):
+        """
+        Lote a partir de un ReplicateStack (sin copia si dtype coincide).
+        """
+        Y = stack.Y if dtype is None else stack.Y.astype(dtype, copy=False)
+        return cls(stack.x, Y, meta)
+
+    @classmethod
+    def from_store(cls, store, technique, **filters):
+        """
+        Lote de un SpectrumStore; con filtros usa store.select. Las selecciones
+        contiguas quedan como vistas del mmap.
+        """
+        if filters:
+            return cls(*store.select(technique, **filters))
+        return cls(*store.technique(technique))
+
+    def __len__(self):
+        return self.Y.shape[0]
+
+    def __getitem__(self, key):
+        """
+        Un entero devuelve un Spectrum (vista de la fila); un slice, una lista
+        de índices o una máscara booleana devuelven otro SpectrumBatch.
+        """
+        if isinstance(key, (int, np.integer)):
+            return Spectrum(self.x, self.Y[key], self.meta[key], dtype=self.Y.dtype)
+        return SpectrumBatch(self.x, self.Y[key], self.meta[key])
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self[n]
+
+    def __repr__(self):
+        return f'SpectrumBatch({len(self)} espectros × {self.x.size} puntos, {self.Y.dtype})'
+
+    @property
+    def dtype(self):
+        return self.Y.dtype
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.Y.nbytes + self.meta.nbytes
+
+    def astype(self, dtype):
+        return SpectrumBatch(self.x, self.Y.astype(dtype, copy=False), self.meta)
+
+    def mask(self, **filters):
+        """
+        Máscara booleana de los filtros de select.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for field, value in filters.items():
+            column = self.meta[field]
+            if isinstance(value, tuple):
+                mask &= (column >= value[0]) & (column <= value[1])
+            else:
+                mask &= column == value
+        return mask
+
+    def select(self, **filters):
+        """
+        Subconjunto por metadatos, con las mismas reglas que SpectrumStore.select:
+        cada filtro es un valor exacto o una tupla (mínimo, máximo) inclusiva.
+        """
+        rows = np.flatnonzero(self.mask(**filters))
+        if rows.size and rows[-1] - rows[0] + 1 == rows.size:
+            rows = slice(rows[0], rows[-1] + 1)
+        return self[rows]
+
+    def groups(self, field):
+        """
+        Genera (valor, SpectrumBatch) para cada valor distinto de field, en
+        orden ascendente (los NaN se omiten).
+        """
+        column = self.meta[field]
+        values = np.unique(column)
+        for value in values:
+            if isinstance(value, float) and math.isnan(value):
+                continue
+            yield value.item() if hasattr(value, 'item') else value, self[column == value]
+
+    def group_index(self, fields):
+        """
+        Índice de grupo de cada espectro según la combinación de valores de
+        fields (los NaN forman su propio valor). Devuelve (códigos (N,),
+        primera fila de cada grupo), con los grupos en orden ascendente.
+        """
+        columns = []
+        for field in fields:
+            column = self.meta[field]
+            if column.dtype.kind == 'f':
+                column = np.where(np.isnan(column), -np.inf, column)
+            columns.append(np.unique(column, return_inverse=True)[1].ravel())
+        _, first, codes = np.unique(np.stack(columns, axis=1), axis=0, return_index=True, return_inverse=True)
+        return codes.ravel(), first
+
+    def stack(self):
+        """
+        ReplicateStack con los espectros del lote (en float64).
+        """
+        return ReplicateStack(self.x, self.Y)
+
+    def to_dataframe(self, x_name=None, y_names=None):
+        """
+        DataFrame ancho: la rejilla y una columna por espectro. y_names es una
+        lista de nombres o el campo de metadatos a usar (por defecto 'path').
+        """
+        import pandas as pd
+        technique = self.meta['technique'][0] if len(self) else ''
+        x_name, _ = _column_names(technique, x_name, None)
+        if y_names is None or isinstance(y_names, str):
+            y_names = [str(v) for v in self.meta[y_names or 'path']]
+        # Los nombres pueden repetirse (p. ej. réplicas de una concentración)
+        frame = pd.DataFrame(np.asarray(self.Y).T, columns=list(y_names))
+        frame.insert(0, x_name, self.x)
+        return frame
+
+    def to_long_dataframe(self, x_name=None, y_name=None, fields=FIELDS):
+        """
+        DataFrame largo (una fila por punto) con las columnas de metadatos
+        indicadas, para seaborn o groupby.
+        """
+        import pandas as pd
+        technique = self.meta['technique'][0] if len(self) else ''
+        x_name, y_name = _column_names(technique, x_name, y_name)
+        N, M = self.Y.shape
+        data = {x_name: np.tile(self.x, N), y_name: np.asarray(self.Y).ravel()}
+        for field in fields:
+            data[field] = np.repeat(self.meta[field], M)
+        return pd.DataFrame(data)
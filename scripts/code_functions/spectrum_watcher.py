@@ -0,0 +1,96 @@
+"""
+Vigilancia de carpetas de exportación del espectrofluorímetro.
+
+SpectrumWatcher recorre periódicamente un árbol de carpetas y entrega cada
+archivo de espectro una sola vez, cuando deja de cambiar: un archivo se
+considera completo cuando su tamaño y fecha de modificación se mantienen
+iguales durante settle_time segundos (evita leer exportaciones a medio
+escribir). Los archivos ya procesados y sin cambios no se vuelven a entregar.
+Un archivo entregado que se borra, o que queda vacío una vez asentado, se
+informa como retirado para que se descuente su contribución.
+"""
+import os
+import time
+import spectrum_data_loader as sdl
+
+
+class SpectrumWatcher:
+    """
+    root: carpeta vigilada (se recorre recursivamente)
+    settle_time: segundos sin cambios antes de considerar un archivo completo
+    """
+
+    def __init__(self, root, settle_time=2.0, extensions=sdl.EXTENSIONES):
+        self.root = root
+        self.settle_time = settle_time
+        self.extensions = extensions
+        # ruta -> (tamaño, mtime_ns, instante en que se vio esa firma por primera vez)
+        self._pending = {}
+        # ruta -> (tamaño, mtime_ns) ya entregados
+        self.processed = {}
+
+    def _scan(self):
+        for dir_path, dir_names, file_names in os.walk(self.root):
+            dir_names.sort()
+            for file_name in file_names:
+                if not file_name.lower().endswith(self.extensions):
+                    continue
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue  # El archivo desapareció entre el listado y el stat
+                yield file_path, (stat.st_size, stat.st_mtime_ns)
+
+    def poll(self, now=None):
+        """
+        Revisa el árbol una vez. Devuelve (nuevos, modificados, retirados):
+        listas ordenadas de archivos completos que no se habían entregado, que
+        cambiaron desde la última entrega, o que se entregaron y luego se
+        borraron o quedaron vacíos.
+        """
+        now = time.monotonic() if now is None else now
+        new_files, modified_files, removed_files = [], [], []
+        seen = set()
+        for file_path, signature in self._scan():
+            seen.add(file_path)
+            delivered = file_path in self.processed
+            if self.processed.get(file_path) == signature or (signature[0] == 0 and not delivered):
+                self._pending.pop(file_path, None)
+                continue
+            pending = self._pending.get(file_path)
+            if pending is None or pending[:2] != signature:
+                self._pending[file_path] = (*signature, now)
+                if self.settle_time > 0:
+                    continue
+                pending = self._pending[file_path]
+            if now - pending[2] >= self.settle_time:
+                del self._pending[file_path]
+                if signature[0] == 0:
+                    # Sobrescrito con un archivo vacío: ya no aporta nada
+                    del self.processed[file_path]
+                    removed_files.append(file_path)
+                    continue
+                (modified_files if delivered else new_files).append(file_path)
+                self.processed[file_path] = signature
+
+        # Olvidar archivos pendientes que se borraron y retirar los ya entregados
+        for file_path in list(self._pending):
+            if file_path not in seen:
+                del self._pending[file_path]
+        for file_path in list(self.processed):
+            if file_path not in seen:
+                del self.processed[file_path]
+                removed_files.append(file_path)
+        return sorted(new_files), sorted(modified_files), sorted(removed_files)
+
+    def run(self, callback, poll_interval=1.0, stop=None):
+        """
+        Bucle de vigilancia: llama callback(nuevos, modificados, retirados) con
+        cada lote no vacío. stop es una función opcional que devuelve True para terminar.
+        """
+        while stop is None or not stop():
+            new_files, modified_files, removed_files = self.poll()
+            if new_files or modified_files or removed_files:
+                callback(new_files, modified_files, removed_files)
+            time.sleep(poll_interval)
@@ -0,0 +1,248 @@
+"""
+Generadores de espectros sintéticos realistas para pruebas de escala.
+
+    pl_spectra     emisión de PL gaussiana apagada según Stern-Volmer,
+                   F = F0 / (1 + K_sv·c), con deriva de posición y ruido
+    ftir_spectra   transmitancia FT-IR (%) con bandas gaussianas de una tabla
+                   de bandas (ir_bands.BANDS_NGQD por defecto)
+    uvvis_spectra  absorbancia UV-Vis con un borde directo de band gap
+                   ((A·hν)² ∝ hν - Eg), cola de Urbach y dispersión
+    kinetic_spectra  serie temporal de emisión que se apaga hacia el
+                   equilibrio con una o dos exponenciales
+    eem_spectra    emisión de PL para varias λex, con el pico desplazado
+                   según la excitación y dispersión Rayleigh y Raman del agua
+    ph_spectra     emisión de PL frente al pH: dos especies (ácida y básica)
+                   en equilibrio de Henderson-Hasselbalch con pKa dado
+    saed_pattern   imagen de difracción con anillos gaussianos en los
+                   espaciados d indicados, haz directo, fondo y ruido de Poisson
+
+Los archivos se escriben con la codificación, el separador, el separador
+decimal y la cabecera que se indiquen, para ejercitar la detección de formato
+de data_txt_pull. write_tree reproduce la estructura de carpetas de
+datos_espectros que esperan los scripts.
+"""
+import os
+import numpy as np
+from code_functions.ir_bands import BANDS_NGQD
+from code_functions.tauc_bandgap import HC_EV_NM
+
+ENCODINGS = ('utf-8', 'utf-8-sig', 'latin-1', 'utf-16')
+SEPARATORS = {'tab': '\t', 'space': ' ', 'semicolon': ';', 'comma': ','}
+
+# Concentraciones de nitrito (µM) de la serie in situ
+CONCENTRATIONS = (0, 10, 20, 50, 100, 200)
+
+
+def pl_spectra(conc, n_points=401, x_range=(300, 700), F0=1500.0, K_sv=0.01, center=450.0, width=40.0,
+               noise=0.01, shift=1.0, rng=None):
+    """
+    Espectros de emisión (N × M) para las concentraciones conc (N,).
+    noise es relativo a F0 y shift la deriva aleatoria del centro (nm).
+    """
+    rng = np.random.default_rng(rng)
+    conc = np.atleast_1d(np.asarray(conc, dtype=np.float64))
+    x = np.linspace(*x_range, n_points)
+    F = F0 / (1 + K_sv * conc)
+    centers = center + shift * rng.standard_normal(conc.size)
+    Y = F[:, None] * np.exp(-0.5 * ((x[None, :] - centers[:, None]) / width)**2)
+    Y += noise * F0 * rng.standard_normal(Y.shape)
+    return x, Y
+
+
+def ftir_spectra(n, n_points=1801, x_range=(4000, 400), bands=BANDS_NGQD, base=90.0, depth=(5, 25), noise=0.2,
+                 rng=None):
+    """
+    Transmitancias (N × M) en % sobre una rejilla descendente en cm⁻¹.
+    Cada banda tiene una profundidad aleatoria en el intervalo depth.
+    """
+    rng = np.random.default_rng(rng)
+    x = np.linspace(*x_range, n_points)
+    centers = np.array([b[0] for b in bands], dtype=np.float64)
+    sigmas = np.array([b[1] for b in bands], dtype=np.float64) / 4
+    depths = rng.uniform(*depth, size=(n, centers.size))
+    profiles = np.exp(-0.5 * ((x[None, :] - centers[:, None]) / sigmas[:, None])**2)
+    T = base - depths @ profiles
+    T += noise * rng.standard_normal(T.shape)
+    return x, np.clip(T, 0, 100)
+
+
+def uvvis_spectra(n, n_points=901, x_range=(200, 1100), Eg=3.2, amplitude=6.0, urbach=0.08, scatter=0.05,
+                  noise=0.005, rng=None):
+    """
+    Absorbancias (N × M) con un borde directo en Eg (eV) que varía ±0.05 eV
+    entre espectros.
+    """
+    rng = np.random.default_rng(rng)
+    wl = np.linspace(*x_range, n_points)
+    E = HC_EV_NM / wl
+    Egs = Eg + 0.05 * rng.uniform(-1, 1, size=(n, 1))
+    edge = amplitude * np.sqrt(np.clip(E[None, :] - Egs, 0, None)) / E[None, :]
+    tail = 0.05 * np.exp(np.clip((E[None, :] - Egs) / urbach, None, 0))
+    A = edge + tail + scatter * (wl[0] / wl[None, :])**4
+    A += noise * rng.standard_normal(A.shape)
+    return wl, A
+
+
+def kinetic_spectra(times, n_points=401, x_range=(300, 700), F0=350.0, F_inf=150.0, k=(0.05,), weights=(1.0,),
+                    center=450.0, width=40.0, noise=0.005, rng=None):
+    """
+    Espectros (T × M) en los tiempos times (s): la amplitud del pico sigue
+    F(t) = F_inf + (F0 - F_inf)·Σ wᵢ·exp(-kᵢ·t), con los pesos normalizados.
+    """
+    rng = np.random.default_rng(rng)
+    times = np.asarray(times, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64) / np.sum(weights)
+    decay = np.exp(-np.outer(times, np.asarray(k, dtype=np.float64))) @ weights
+    x = np.linspace(*x_range, n_points)
+    F = F_inf + (F0 - F_inf) * decay
+    Y = F[:, None] * np.exp(-0.5 * ((x[None, :] - center) / width)**2)
+    Y += noise * F0 * rng.standard_normal(Y.shape)
+    return x, Y
+
+
+def eem_spectra(ex, n_points=401, x_range=(300, 700), F0=350.0, center=450.0, shift_slope=0.3, width=40.0,
+                ex_center=365.0, ex_width=40.0, rayleigh=200.0, raman=20.0, scatter_width=3.0,
+                raman_shift=3400.0, noise=0.005, rng=None):
+    """
+    Espectros de emisión (E × M) para las excitaciones ex (nm). El pico se
+    desplaza shift_slope nm por nm de excitación (desde ex[0]) y su amplitud
+    sigue una banda de excitación gaussiana; se suman las bandas Rayleigh de
+    primer y segundo orden (em = ex, 2·ex) y la Raman del agua.
+    """
+    rng = np.random.default_rng(rng)
+    ex = np.asarray(ex, dtype=np.float64)[:, None]
+    x = np.linspace(*x_range, n_points)
+    amplitude = F0 * np.exp(-0.5 * ((ex - ex_center) / ex_width)**2)
+    peak = center + shift_slope * (ex - ex[0])
+    Y = amplitude * np.exp(-0.5 * ((x[None, :] - peak) / width)**2)
+    raman_em = 1 / (1 / ex - raman_shift * 1e-7)
+    for position, height in ((ex, rayleigh), (2 * ex, rayleigh / 4), (raman_em, raman)):
+        Y += height * np.exp(-0.5 * ((x[None, :] - position) / scatter_width)**2)
+    Y += noise * F0 * rng.standard_normal(Y.shape)
+    return x, Y
+
+
+def ph_spectra(ph, n_points=401, x_range=(300, 700), F_acid=120.0, F_base=350.0, pKa=5.5, hill=1.0,
+               center_acid=460.0, center_base=440.0, width=40.0, noise=0.005, rng=None):
+    """
+    Espectros (N × M) para los pH ph: mezcla de las emisiones de la especie
+    ácida y la básica con la fracción básica 1 / (1 + 10^(hill·(pKa - pH))).
+    """
+    rng = np.random.default_rng(rng)
+    ph = np.asarray(ph, dtype=np.float64)[:, None]
+    x = np.linspace(*x_range, n_points)
+    basic = 1 / (1 + 10.0**(hill * (pKa - ph)))
+    Y = ((1 - basic) * F_acid * np.exp(-0.5 * ((x[None, :] - center_acid) / width)**2)
+         + basic * F_base * np.exp(-0.5 * ((x[None, :] - center_base) / width)**2))
+    Y += noise * F_base * rng.standard_normal(Y.shape)
+    return x, Y
+
+
+def saed_pattern(shape=(1024, 1024), center=None, pixel_size=0.02, d_spacings=(2.13, 1.23), ring_width=0.04,
+                 ring_intensity=(40.0, 20.0), beam=5000.0, background=200.0, rng=None):
+    """
+    Imagen SAED (filas × columnas) con un anillo por espaciado d (Å).
+    pixel_size es la calibración en nm⁻¹ por píxel y ring_width el ancho
+    (desviación, nm⁻¹) de cada anillo. El fondo decae como 1/(1 + g²).
+    """
+    rng = np.random.default_rng(rng)
+    if center is None:
+        center = ((shape[0] - 1) / 2 + rng.uniform(-20, 20), (shape[1] - 1) / 2 + rng.uniform(-20, 20))
+    rows = np.arange(shape[0]) - center[0]
+    cols = np.arange(shape[1]) - center[1]
+    g = np.hypot(rows[:, None], cols[None, :]) * pixel_size
+    image = background / (1 + g**2) + beam * np.exp(-0.5 * (g / (3 * pixel_size))**2)
+    for d, amplitude in zip(d_spacings, np.resize(ring_intensity, len(d_spacings))):
+        image += amplitude * np.exp(-0.5 * ((g - 10 / d) / ring_width)**2)
+    return rng.poisson(image).astype(np.float64), center
+
+
+def format_spectrum(x, y, sep='\t', decimal='.', header=None, precision=4):
+    """
+    Texto de un espectro de dos columnas con las líneas de cabecera indicadas.
+    """
+    if sep == ',' and decimal == ',':
+        raise ValueError('El separador de columnas y el decimal no pueden ser ambos ","')
+    body = np.char.add(np.char.add(np.char.mod(f'%.{precision}f', x), sep), np.char.mod(f'%.{precision}f', y))
+    if decimal == ',':
+        body = np.char.replace(body, '.', ',')
+    lines = list(header or []) + body.tolist()
+    return '\n'.join(lines) + '\n'
+
+
+def write_spectrum(path, x, y, encoding='utf-8', sep='\t', decimal='.', header=None):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        f.write(format_spectrum(x, y, sep, decimal, header))
+
+
+def write_tree(root, replicates=3, concentrations=CONCENTRATIONS, n_points=401, encoding='utf-8', sep='\t',
+               decimal='.', seed=0):
+    """
+    Escribe en root/datos_espectros un conjunto completo con las carpetas que
+    usan los scripts (curvas de calibración, pH, λex, diluciones, tiempo,
+    FT-IR con precursores y UV-Vis) y pequeñas imágenes de relleno para los
+    insertos. Devuelve la lista de archivos de espectros escritos.
+    """
+    import matplotlib.pyplot as plt
+    rng = np.random.default_rng(seed)
+    base = os.path.join(root, 'datos_espectros')
+    PL, FTIR, UVVIS = (os.path.join(base, t) for t in ('PL', 'FT-IR', 'UV-Vis'))
+    options = {'encoding': encoding, 'sep': sep, 'decimal': decimal}
+    written = []
+
+    def write(path, x, y, **kwargs):
+        write_spectrum(path, x, y, **{**options, **kwargs})
+        written.append(path)
+
+    # Serie in situ: una carpeta por concentración con réplicas
+    for c in concentrations:
+        x, Y = pl_spectra(np.full(replicates, c), n_points, rng=rng)
+        for r, y in enumerate(Y):
+            write(os.path.join(PL, 'ngqd_ca_curva_in_situ', 'ensayo1a16', f'{c}uM', f'rep{r}.txt'), x, y)
+    # Perkin-Elmer: un archivo por concentración
+    x, Y = pl_spectra(concentrations, n_points, F0=90.0, rng=rng)
+    for c, y in zip(concentrations, Y):
+        write(os.path.join(PL, 'ngqd_ca_curva_PerkinElmer', f'{c}uM.txt'), x, y)
+    # Comparación de rutas de síntesis
+    for sample, center in (('ngqd_ca', 450), ('ngqd_bc', 470), ('ngqd_glu', 430)):
+        x, Y = pl_spectra(np.zeros(replicates), n_points, F0=1.0, center=center, rng=rng)
+        for r, y in enumerate(Y):
+            write(os.path.join(PL, sample, f'r{r}.txt'), x, y)
+    # pH: un archivo por condición, en orden
+    x, Y = ph_spectra([2, 3, 4, 6, 7, 8, 10], n_points, rng=rng)
+    for k, y in enumerate(Y):
+        write(os.path.join(PL, 'ngqd_ca_pH_soln1a4', f'ph{k}.txt'), x, y)
+    # Longitud de onda de excitación: un archivo por λex, anotada en la cabecera
+    lambda_ex = (350, 365, 380, 395, 410, 425)
+    x, Y = eem_spectra(lambda_ex, n_points, rng=rng)
+    for k, (ex, y) in enumerate(zip(lambda_ex, Y)):
+        write(os.path.join(PL, 'ngqd_ca_lamda_ex', f'ex{k}.txt'), x, y, header=[f'Excitation: {ex} nm'])
+    # Tiempo de interacción: lecturas cada 30 s (0-120 s)
+    x, Y = kinetic_spectra(np.arange(0, 121, 30), n_points, rng=rng)
+    for k, y in enumerate(Y):
+        write(os.path.join(PL, 'ngqd_ca_tiempo_interaccion', f't{k}.txt'), x, y)
+    # Diluciones
+    for folder, factor in (('conc', 1.0), ('1 a 1', 0.5), ('1 a 2', 0.33), ('1 a 4', 0.2)):
+        x, Y = pl_spectra(np.zeros(replicates), n_points, F0=1000.0 * factor, rng=rng)
+        for r, y in enumerate(Y):
+            write(os.path.join(PL, 'ngqd_ca_dilutions', folder, f'r{r}.txt'), x, y)
+
+    # FT-IR: N-GQDs corregidos y precursores en CSV con cabecera
+    for name in ('N-GQD_CA_BLC', 'N-GQD_BC_BLC', 'N-GQD_Glu_BLC', 'N-GQD_CA_pH3_BLC', 'N-GQD_CA_NO2_BLC'):
+        x, T = ftir_spectra(1, rng=rng)
+        write(os.path.join(FTIR, f'{name}.txt'), x, T[0])
+    for name in ('Citric_Acid', 'EDA', 'Black_Carbon', 'D_glucosa', 'Hexadecilamina'):
+        x, T = ftir_spectra(1, n_points=900, base=80.0, rng=rng)
+        write(os.path.join(FTIR, f'{name}.csv'), x, T[0], encoding='utf-8', sep=',', decimal='.',
+              header=['cm-1,T'])
+
+    # UV-Vis con la cabecera de dos líneas del espectrofotómetro
+    wl, A = uvvis_spectra(1, rng=rng)
+    write(os.path.join(UVVIS, 'ngqd_ca_uvvis.txt'), wl, A[0], header=['"N-GQD_CA"', '"Wavelength nm."\t"Abs."'])
+
+    # Imágenes de relleno para los insertos de las figuras
+    image = rng.random((8, 8, 3))
+    for name in ('pl_photo_1a16essay.jpg', 'PL_interaccionNO_cuali.jpg', 'pl_ngqd_viales.png', 'pl_ngqd_cuveta.png'):
+        plt.imsave(os.path.join(PL, name), image)
+    return written
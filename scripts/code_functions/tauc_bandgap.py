@@ -0,0 +1,179 @@
+"""
+Cálculo de band gap por el método de Tauc para lotes de espectros UV-Vis.
+
+Para cada espectro y cada exponente n (2: transición directa permitida,
+1/2: indirecta) se construye (A·hν)^n y se buscan automáticamente todas las
+ventanas contiguas candidatas del borde de absorción. Los ajustes lineales de
+todas las ventanas se obtienen de sumas acumuladas (Σx, Σy, Σx², Σxy, Σy²),
+por lo que cada ventana cuesta O(1) y cada ancho de ventana O(N) por espectro.
+Solo cuentan los puntos del borde de absorción: por debajo del primer máximo
+de absorbancia que lo cierra y sin saturar (el hombro y la subida saturada del
+UV lejano no son el borde). En cada ancho se elige, entre las ventanas con
+pendiente positiva y R² ≥ r2_min, la de mayor pendiente × R²; entre anchos, la
+más ancha de esas; si ninguna supera r2_min, la de mayor R². Una ventana
+cuyo Eg extrapolado cae fuera del rango ajustado (antes del primer punto del
+borde o después del final de la ventana) se descarta; si no queda ninguna, Eg
+es NaN.
+Eg = -b/m se reporta con su incertidumbre propagada desde la covarianza del
+ajuste.
+"""
+import numpy as np
+from code_functions import profiling
+from code_functions.linear_fit import line_from_moments
+
+HC_EV_NM = 1240.0
+
+DIRECT, INDIRECT = 2.0, 0.5
+
+
+def tauc_y(wavelength_nm, A, n=(DIRECT, INDIRECT)):
+    """
+    Energía (eV) y (A·hν)^n para cada n en una sola operación.
+
+    wavelength_nm: (M,), A: (N, M). Devuelve energy (M,) ascendente y
+    Y de forma (len(n), N, M).
+    """
+    wavelength_nm = np.asarray(wavelength_nm, dtype=np.float64)
+    A = np.atleast_2d(np.asarray(A, dtype=np.float64))
+    energy = HC_EV_NM / wavelength_nm
+    order = np.argsort(energy)
+    energy, A = energy[order], A[:, order]
+    n = np.atleast_1d(np.asarray(n, dtype=np.float64))
+    # A negativa (ruido en la línea base) se recorta a 0 antes del exponente
+    Y = (np.clip(A, 0, None) * energy)[None, :, :] ** n[:, None, None]
+    return energy, Y
+
+
+def _cumulative_sums(x, Y):
+    """
+    Sumas acumuladas (con un 0 inicial) de x, x², y, xy e y² sobre el último eje.
+    Se calculan una sola vez y sirven para cualquier ancho de ventana.
+    """
+    def csum(v):
+        c = np.cumsum(v, axis=-1)
+        return np.concatenate([np.zeros(c.shape[:-1] + (1,)), c], axis=-1)
+    return csum(x), csum(x * x), csum(Y), csum(x * Y), csum(Y * Y)
+
+
+def _window_fits(sums, width):
+    """
+    Ajustes lineales de todas las ventanas [i, i+width) a partir de las sumas
+    acumuladas (linear_fit.line_from_moments). Devuelve su diccionario con
+    forma (..., M - width + 1).
+    """
+    sx, sxx, sy, sxy, syy = (c[..., width:] - c[..., :-width] for c in sums)
+    return line_from_moments(width, sx / width, sy / width, sxx - sx * sx / width, sxy - sx * sy / width,
+                             syy - sy * sy / width)
+
+
+def _edge_mask(A, saturation, drop):
+    """
+    Puntos del borde de absorción de cada espectro (A: N × M, energía
+    ascendente): por debajo del primer máximo de absorbancia (el punto donde
+    A, ya por encima de una fracción apreciable del máximo, cae más de drop
+    respecto de su máximo acumulado) y sin saturar (A < saturation).
+    """
+    A = np.nan_to_num(np.clip(A, 0, None))
+    M = A.shape[-1]
+    saturated = A >= saturation
+    A_ok = np.where(saturated, 0.0, A)
+    running = np.maximum.accumulate(A_ok, axis=-1)
+    # Solo cuenta como caída tras superar el 20 % del máximo no saturado
+    level = 0.2 * A_ok.max(axis=-1, keepdims=True)
+    falling = (A_ok < (1 - drop) * running) & (running >= level) & ~saturated
+    first = np.where(falling.any(axis=-1), np.argmax(falling, axis=-1), M)
+    k = np.arange(M)
+    peak = np.argmax(np.where(k < first[:, None], A_ok, -np.inf), axis=-1)
+    return (k <= peak[:, None]) & ~saturated
+
+
+@profiling.timed('tauc')
+def band_gaps(wavelength_nm, A, n=(DIRECT, INDIRECT), widths=None, energy_range=None, min_signal=0.05,
+              r2_min=0.99, saturation=2.5, drop=0.1):
+    """
+    Band gap automático para un lote de espectros.
+
+    wavelength_nm: (M,) rejilla común; A: (N, M) absorbancias
+    n: exponentes de Tauc a evaluar
+    widths: anchos de ventana (en puntos) a explorar; por defecto ~24 anchos
+        en progresión geométrica entre 5 y M/4
+    energy_range: (mínimo, máximo) en eV donde puede estar la ventana
+    min_signal: fracción del máximo de (A·hν)^n en el borde que debe superar
+        la ventana (descarta la cola plana por debajo del borde)
+    r2_min: R² a partir del cual una ventana se considera lineal
+    saturation: absorbancia a partir de la cual un punto se considera saturado
+    drop: caída relativa de A que marca el máximo que cierra el borde
+
+    Devuelve un diccionario de arreglos de forma (len(n), N): 'Eg', 'Eg_std',
+    'r2', 'slope', 'intercept', 'e_start', 'e_end', y 'n'.
+    """
+    energy, Y = tauc_y(wavelength_nm, A, n)
+    M = energy.size
+    if widths is None:
+        widths = np.unique(np.geomspace(5, max(6, M // 4), 24).astype(int))
+
+    A = np.atleast_2d(np.asarray(A, dtype=np.float64))[:, np.argsort(HC_EV_NM / np.asarray(wavelength_nm))]
+    valid = _edge_mask(A, saturation, drop)
+    if energy_range is not None:
+        valid &= (energy >= energy_range[0]) & (energy <= energy_range[1])
+    valid_sums = np.concatenate([np.zeros(valid.shape[:-1] + (1,)), np.cumsum(valid, axis=-1)], axis=-1)
+    with np.errstate(invalid='ignore'):
+        y_max = np.nanmax(np.where(valid, Y, np.nan), axis=-1, keepdims=True)
+    # Energía del primer punto del borde: Eg no puede extrapolarse por debajo
+    e_low = np.where(valid.any(axis=-1), energy[np.argmax(valid, axis=-1)], np.inf)[:, None]
+    sums = _cumulative_sums(energy, Y)
+
+    shape = Y.shape[:2]
+    best = {key: np.full(shape, np.nan) for key in ('r2', 'slope', 'intercept', 'Eg', 'Eg_std', 'e_start', 'e_end')}
+    best_r2 = np.full(shape, -np.inf)
+    qualified = np.zeros(shape, dtype=bool)
+    for width in sorted(widths):
+        if width < 3 or width > M:
+            continue
+        fit = _window_fits(sums, width)
+        slope, r2 = fit['slope'], fit['r2']
+        starts = np.arange(M - width + 1)
+
+        # Solo ventanas enteras dentro del borde, con pendiente positiva y por encima de la cola
+        inside = (valid_sums[:, width:] - valid_sums[:, :-width]) == width
+        y_start = Y[..., :M - width + 1]
+        # Eg de cada ventana dentro del rango ajustado: entre el inicio del borde y el final de la ventana
+        with np.errstate(invalid='ignore', divide='ignore'):
+            Eg_w = -fit['intercept'] / slope
+        in_range = (Eg_w >= e_low) & (Eg_w <= energy[starts + width - 1])
+        ok = inside & (slope > 0) & (y_start >= min_signal * y_max) & np.isfinite(r2) & in_range
+        # En cada ancho, entre las ventanas lineales gana la más empinada
+        # (pendiente × R²: la tangente al borde y no a la cola ni al hombro);
+        # si no hay ninguna lineal, la de mayor R²
+        linear = ok & (r2 >= r2_min)
+        score = np.where(linear, slope * r2, np.where(ok, r2, -np.inf))
+        any_linear = linear.any(axis=-1)
+        idx = np.argmax(np.where(any_linear[..., None] & ~linear, -np.inf, score), axis=-1)
+        pick = lambda v: np.take_along_axis(np.broadcast_to(v, slope.shape), idx[..., None], -1)[..., 0]
+        r2_w = pick(np.where(ok, r2, -np.inf))
+        # Entre anchos, una ventana lineal más ancha reemplaza a la anterior
+        # (promedia el ruido que infla la pendiente de las angostas); mientras
+        # no haya ninguna lineal, se conserva la de mayor R²
+        better = any_linear | (~qualified & (r2_w > best_r2))
+        qualified |= any_linear
+        if not better.any():
+            continue
+
+        m, b = pick(slope), pick(fit['intercept'])
+        var_m, var_b, cov_mb = pick(fit['var_slope']), pick(fit['var_intercept']), pick(fit['cov'])
+        # Propagación de la covarianza de (m, b) a Eg = -b/m
+        with np.errstate(invalid='ignore', divide='ignore'):
+            Eg = -b / m
+        var_Eg = (var_b + Eg**2 * var_m + 2 * Eg * cov_mb) / m**2
+
+        best_r2 = np.where(better, r2_w, best_r2)
+        best['r2'] = np.where(better, r2_w, best['r2'])
+        best['slope'] = np.where(better, m, best['slope'])
+        best['intercept'] = np.where(better, b, best['intercept'])
+        best['Eg'] = np.where(better, Eg, best['Eg'])
+        best['Eg_std'] = np.where(better, np.sqrt(np.maximum(var_Eg, 0.0)), best['Eg_std'])
+        best['e_start'] = np.where(better, energy[starts[idx]], best['e_start'])
+        best['e_end'] = np.where(better, energy[starts[idx] + width - 1], best['e_end'])
+
+    best['n'] = np.atleast_1d(np.asarray(n, dtype=np.float64))
+    return best
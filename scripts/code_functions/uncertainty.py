@@ -0,0 +1,190 @@
+"""
+Intervalos de confianza por bootstrap y Monte-Carlo para LOD, K_sv y band gap.
+
+Las réplicas se remuestrean (bootstrap) o se perturban (Monte-Carlo) para B
+remuestreos a la vez: los datos simulados forman un arreglo con un eje de
+remuestreo al frente y todas las rectas se ajustan con mínimos cuadrados en
+forma cerrada sobre ese eje (batched_linear_fit), sin un bucle de Python
+alrededor de linregress o np.polyfit. Con muchos remuestreos el trabajo se
+reparte en bloques entre procesos, cada uno con su propio generador derivado
+de SeedSequence.spawn, de modo que el resultado es reproducible con la semilla.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from code_functions import profiling
+from code_functions.linear_fit import batched_linear_fit
+
+METHODS = ('bootstrap', 'montecarlo')
+
+# A partir de este número de remuestreos se usa un pool de procesos
+PARALLEL_THRESHOLD = 20000
+CHUNK_SIZE = 5000
+# Valores simulados (remuestreos × niveles × réplicas) por bloque en calibration_uncertainty
+REPLICATE_BLOCK = 2**20
+
+
+def summarize(samples, level=0.95):
+    """
+    Media, desviación e intervalo percentil de una muestra de remuestreos.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    samples = samples[np.isfinite(samples)]
+    if samples.size == 0:
+        return {'mean': np.nan, 'std': np.nan, 'ci_low': np.nan, 'ci_high': np.nan, 'n': 0}
+    tail = (1 - level) / 2 * 100
+    low, high = np.percentile(samples, [tail, 100 - tail])
+    return {'mean': float(samples.mean()), 'std': float(samples.std(ddof=1)) if samples.size > 1 else np.nan,
+            'ci_low': float(low), 'ci_high': float(high), 'n': int(samples.size)}
+
+
+def _pad_levels(conc, F):
+    """
+    Agrupa los valores por concentración en una matriz (niveles × réplicas)
+    rellena con NaN.
+    """
+    conc = np.asarray(conc, dtype=np.float64)
+    F = np.asarray(F, dtype=np.float64)
+    levels, inverse = np.unique(conc, return_inverse=True)
+    counts = np.bincount(inverse)
+    slot = np.zeros_like(inverse)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    slot[order] = np.arange(inverse.size) - np.repeat(starts, counts)
+    table = np.full((levels.size, counts.max()), np.nan)
+    table[inverse, slot] = F
+    return levels, table, counts
+
+
+def _replicate_moments(table, counts, method, rng, size):
+    """
+    Media y desviación poblacional (size × niveles) de las réplicas simuladas
+    por bootstrap dentro de cada nivel o por Monte-Carlo con la media y
+    desviación de cada nivel. Las réplicas se simulan en bloques de su eje, con
+    a lo sumo REPLICATE_BLOCK valores a la vez, de modo que la memoria no crece
+    con el número de réplicas.
+    """
+    if method not in METHODS:
+        raise ValueError(f'method debe ser uno de {METHODS}, no {method!r}')
+    L, R = table.shape
+    valid = ~np.isnan(table)
+    # Las sumas se acumulan respecto de la media de cada nivel (sin cancelación)
+    center = np.nanmean(table, axis=1)[:, None]
+    spread = np.nanstd(table, axis=1)[:, None]
+    block = max(1, min(R, REPLICATE_BLOCK // max(size * L, 1)))
+    total = np.zeros((size, L))
+    total_sq = np.zeros((size, L))
+    for start in range(0, R, block):
+        width = min(block, R - start)
+        if method == 'bootstrap':
+            idx = np.floor(rng.random((size, L, width)) * counts[:, None]).astype(int)
+            sample = table[np.arange(L)[:, None], idx]
+        else:
+            sample = center + spread * rng.standard_normal((size, L, width))
+        d = np.where(valid[:, start:start + width], sample - center, 0.0)
+        total += d.sum(axis=-1)
+        total_sq += (d * d).sum(axis=-1)
+    shift = total / counts
+    mean = center[:, 0] + shift
+    std = np.sqrt(np.maximum(total_sq / counts - shift**2, 0.0))
+    return mean, std
+
+
+def _calibration_chunk(levels, table, counts, method, linear_range, seed, size):
+    rng = np.random.default_rng(seed)
+    F_means, F_stds = _replicate_moments(table, counts, method, rng, size)
+    # Desviación poblacional del blanco, como np.std en calibration_curves_insitu.py
+    sigma_blank = F_stds[:, 0]
+    mask = (levels >= linear_range[0]) & (levels <= linear_range[1])
+    x = levels[mask]
+    slope, intercept, r2 = batched_linear_fit(x, F_means[:, mask])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sv = F_means[:, :1] / F_means[:, mask]
+        lod = 3 * sigma_blank / np.abs(slope)
+    K_sv, intercept_sv, r2_sv = batched_linear_fit(x, sv)
+    return {'slope': slope, 'intercept': intercept, 'r2': r2, 'lod': lod,
+            'K_sv': K_sv, 'intercept_sv': intercept_sv, 'r2_sv': r2_sv}
+
+
+def _tauc_chunk(energy, Y_replicates, sigma, method, window, seed, size):
+    rng = np.random.default_rng(seed)
+    R = Y_replicates.shape[0]
+    if method == 'bootstrap':
+        idx = rng.integers(0, R, size=(size, R))
+        sample = Y_replicates[idx].mean(axis=1)
+    elif method == 'montecarlo':
+        sample = Y_replicates.mean(axis=0) + sigma * rng.standard_normal((size, energy.size))
+    else:
+        raise ValueError(f'method debe ser uno de {METHODS}, no {method!r}')
+    inside = (energy >= window[0]) & (energy <= window[1])
+    slope, intercept, r2 = batched_linear_fit(energy[inside], sample[:, inside])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {'Eg': -intercept / slope, 'slope': slope, 'intercept': intercept, 'r2': r2}
+
+
+def run_resamples(chunk_func, n_resamples, seed=None, workers=None):
+    """
+    Ejecuta chunk_func(seed, size) en bloques de CHUNK_SIZE remuestreos, en un
+    pool de procesos si n_resamples >= PARALLEL_THRESHOLD, y concatena los
+    resultados. Cada bloque recibe una semilla hija independiente.
+    """
+    sizes = [CHUNK_SIZE] * (n_resamples // CHUNK_SIZE)
+    if n_resamples % CHUNK_SIZE:
+        sizes.append(n_resamples % CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = workers or int(os.environ.get('NGQD_WORKERS', 0)) or os.cpu_count() or 1
+    if n_resamples < PARALLEL_THRESHOLD or workers == 1:
+        parts = [chunk_func(s, n) for s, n in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(chunk_func, seeds, sizes))
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+@profiling.timed('uncertainty')
+def calibration_uncertainty(conc, F, n_resamples=2000, method='bootstrap', linear_range=(0, 100),
+                            level=0.95, seed=None, workers=None):
+    """
+    Intervalos de confianza de la calibración a partir de un valor de la
+    característica (p. ej. intensidad máxima) por réplica.
+
+    conc, F: arreglos con una entrada por espectro
+    Devuelve {'samples': {...}, 'summary': {...}} con pendiente, intercepto,
+    r², LOD, K_sv, intercepto y r² de Stern-Volmer.
+    """
+    levels, table, counts = _pad_levels(conc, F)
+    chunk = partial(_calibration_chunk, levels, table, counts, method, tuple(linear_range))
+    samples = run_resamples(chunk, n_resamples, seed, workers)
+    return {'samples': samples, 'summary': {k: summarize(v, level) for k, v in samples.items()}}
+
+
+@profiling.timed('uncertainty')
+def bandgap_uncertainty(wavelength_nm, A, window=None, n=2.0, n_resamples=2000, method=None,
+                        noise=None, level=0.95, seed=None, workers=None, **band_gap_kwargs):
+    """
+    Intervalo de confianza del band gap de Tauc.
+
+    A: (R, M) réplicas de absorbancia sobre la misma rejilla. Con varias
+    réplicas se usa bootstrap por defecto; con una sola, Monte-Carlo con ruido
+    gaussiano de desviación noise sobre (A·hν)^n (por defecto estimada de las
+    diferencias entre puntos vecinos).
+    window: (e_min, e_max) en eV de la recta de Tauc; si no se indica se toma
+    la ventana que elige tauc_bandgap.band_gaps para la media de las réplicas.
+    """
+    from code_functions.tauc_bandgap import band_gaps, tauc_y
+    A = np.atleast_2d(np.asarray(A, dtype=np.float64))
+    if window is None:
+        fit = band_gaps(wavelength_nm, A.mean(axis=0), n=(n,), **band_gap_kwargs)
+        window = (fit['e_start'][0, 0], fit['e_end'][0, 0])
+    if method is None:
+        method = 'bootstrap' if A.shape[0] > 1 else 'montecarlo'
+
+    energy, Y = tauc_y(wavelength_nm, A, (n,))
+    Y = Y[0]
+    if noise is None:
+        noise = np.std(np.diff(Y, axis=-1)) / np.sqrt(2)
+    chunk = partial(_tauc_chunk, energy, Y, noise, method, tuple(window))
+    samples = run_resamples(chunk, n_resamples, seed, workers)
+    return {'window': tuple(window), 'samples': samples,
+            'summary': {k: summarize(v, level) for k, v in samples.items()}}
@@ -0,0 +1,41 @@
+"""
+Empaqueta un árbol de espectros (por defecto datos_espectros) en un almacén
+columnar con mmap. Uso:
+
+    python scripts/ingest_spectra.py datos_espectros --out datos_espectros_store
+    python scripts/ingest_spectra.py --baseline FT-IR=als --smooth PL=savgol
+"""
+import argparse
+import os
+from code_functions.preprocessing import BASELINES, SMOOTHERS
+from code_functions.spectrum_store import ingest_tree
+
+
+def parse_options(values, key, choices):
+    """
+    Convierte ['FT-IR=als', ...] en {'FT-IR': {key: 'als'}}.
+    """
+    options = {}
+    for value in values:
+        technique, _, method = value.partition('=')
+        if method not in choices:
+            raise SystemExit(f'Método no válido en {value!r}; opciones: {choices}')
+        options.setdefault(technique, {})[key] = method
+    return options
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crea el almacén columnar de espectros.')
+    parser.add_argument('root', nargs='?', default='datos_espectros', help='Carpeta raíz de los datos')
+    parser.add_argument('--out', default=os.path.join('datos_espectros_store'), help='Carpeta de salida')
+    parser.add_argument('--baseline', action='append', default=[], metavar='TÉCNICA=MÉTODO',
+                        help=f'Corrección de línea base al empaquetar ({", ".join(BASELINES)})')
+    parser.add_argument('--smooth', action='append', default=[], metavar='TÉCNICA=MÉTODO',
+                        help=f'Suavizado al empaquetar ({", ".join(SMOOTHERS)})')
+    parser.add_argument('--memory-mb', type=float, default=None,
+                        help='Empaquetar por bloques con este techo de memoria (MB)')
+    args = parser.parse_args()
+
+    preprocess = parse_options(args.baseline, 'baseline_method', BASELINES)
+    for technique, options in parse_options(args.smooth, 'smooth_method', SMOOTHERS).items():
+        preprocess.setdefault(technique, {}).update(options)
+    ingest_tree(args.root, args.out, preprocess, memory_mb=args.memory_mb)
@@ -1,12 +1,11 @@
 import spectrum_data_loader as sdl
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import numpy as np # Necesitamos numpy para el error estándar
-import matplotlib.image as mpimg
+from code_functions.ir_bands import BANDS_NGQD
+from code_functions.replicate_stack import ReplicateStack
 
 def plot_ir(axs):
+    import matplotlib.patches as mpatches
+    import pandas as pd
     folder = os.path.join('datos_espectros', 'FT-IR')
     file_name_list = ['N-GQD_CA_BLC.txt', 'N-GQD_BC_BLC.txt', 'N-GQD_Glu_BLC.txt']
     names = ['N-GQD (CA)', 'N-GQD (BC)', 'N-GQD (Glu)']
@@ -14,19 +13,13 @@ def plot_ir(axs):
     colors = ['green', 'brown', 'gray', 'yellow']
     n=0
 
-    # Definiciones de regiones para los rectángulos (centro, ancho)
-    regiones = {
-        'gris': [(2900, 100), (750, 100)],
-        'amarillo': [(1650, 100), (1350, 100)],
-        'naranja': [(1510, 100), (1090, 100), (900, 90)],
-        'azul': [(1010, 50)]
-    }
-
-    colores_regiones = {
-        'gris': 'gray',
-        'amarillo': 'yellow',
-        'naranja': 'orange',
-        'azul': 'blue'
+    # Color y rótulo (texto, y relativo al borde, extremo del eje, tamaño) de
+    # cada grupo de ir_bands.BANDS_NGQD
+    estilos_regiones = {
+        'Alkanes/aromatics': ('gray', 'Alkanes/\naromatics', -23, 'top', 10),
+        '-NH': ('yellow', '-NH', -20, 'top', 11),
+        'CONH2': ('orange', r'CON$\text{H}_{2}$', 20, 'bottom', 7),
+        '-COH': ('blue', '-COH', -12, 'top', 11),
     }
 
     for file_name in file_name_list:
@@ -57,80 +50,29 @@ def plot_ir(axs):
         # Añadir rectángulos de color
         alpha = 0.3  # Transparencia
         
-        # Gris (Alcanos/aromáticos)
-        for centro, ancho in regiones['gris']:
-            x = centro - ancho/2
+        for centro, ancho, grupo in BANDS_NGQD:
+            color, texto, dy, borde, fontsize = estilos_regiones[grupo]
             rect = mpatches.Rectangle(
-                (x, y0), 
+                (centro - ancho/2, y0), 
                 ancho, 
                 height, 
-                facecolor=colores_regiones['gris'], 
+                facecolor=color, 
                 alpha=alpha,
                 zorder=1
             )
             axs[n].add_patch(rect)
-            # Etiqueta solo para las regiones grises
             axs[n].text(
-                centro, y1-23, 'Alkanes/\naromatics',
-                ha='center', va='bottom', fontsize=10, color='red'
+                centro, (y1 if borde == 'top' else y0) + dy, texto,
+                ha='center', va='bottom', fontsize=fontsize, color='red'
             )
-        
-        # Amarillo
-        for centro, ancho in regiones['amarillo']:
-            x = centro - ancho/2
-            rect = mpatches.Rectangle(
-                (x, y0), 
-                ancho, 
-                height, 
-                facecolor=colores_regiones['amarillo'], 
-                alpha=alpha,
-                zorder=1
-            )
-            axs[n].add_patch(rect)
-            axs[n].text(
-                centro, y1-20, '-NH',
-                ha='center', va='bottom', fontsize=11, color='red'
-            )
-        
-        # Naranja
-        for centro, ancho in regiones['naranja']:
-            x = centro - ancho/2
-            rect = mpatches.Rectangle(
-                (x, y0), 
-                ancho, 
-                height, 
-                facecolor=colores_regiones['naranja'], 
-                alpha=alpha,
-                zorder=1
-            )
-            axs[n].add_patch(rect)
-            axs[n].text(
-                centro, y0+20, r'CON$\text{H}_{2}$',
-                ha='center', va='bottom', fontsize=7, color='red'
-            )
-        
-        # Azul
-        for centro, ancho in regiones['azul']:
-            x = centro - ancho/2
-            rect = mpatches.Rectangle(
-                (x, y0), 
-                ancho, 
-                height, 
-                facecolor=colores_regiones['azul'], 
-                alpha=alpha,
-                zorder=1
-            )
-            axs[n].add_patch(rect)
-            axs[n].text(
-                centro, y1-12, '-COH',
-                ha='center', va='bottom', fontsize=11, color='red'
-            )
-            axs[n].text(0.02, 0.85, 'b)', transform=axs[n].transAxes,
-            fontsize=18, fontweight='bold', va='top', ha='left') if n==0 else None
+        axs[n].text(0.02, 0.85, 'b)', transform=axs[n].transAxes,
+        fontsize=18, fontweight='bold', va='top', ha='left') if n==0 else None
 
         n += 1
 
 def pl_plot(ax, fig):
+    import matplotlib.image as mpimg
+    import matplotlib.pyplot as plt
     home = os.path.join('datos_espectros', 'PL')
     img_viales = mpimg.imread(os.path.join(home, 'pl_ngqd_viales.png'))
     img_cuveta = mpimg.imread(os.path.join(home, 'pl_ngqd_cuveta.png'))
@@ -145,43 +87,21 @@ def pl_plot(ax, fig):
 
     plot_dic = {}
 
-    for ngqd_name, ngqd_folder in folders_dic.items():
-        folder_path = os.path.join(home, ngqd_folder)
-        # Asegúrate de que la carpeta exista antes de intentar listar archivos
-        if not os.path.isdir(folder_path):
-            print(f"Advertencia: La carpeta no existe - {folder_path}")
-            continue
-        
-        files_list = os.listdir(folder_path)
-        dfs_list = []
+    # Lectura paralela de las réplicas de todas las carpetas (las que no existen se omiten)
+    folder_paths = [os.path.join(home, ngqd_folder) for ngqd_folder in folders_dic.values()]
+    spectra_tree = sdl.load_folders(folder_paths)
 
-        for file_ngqd in files_list:
-            file_path = os.path.join(folder_path, file_ngqd)
-            longitud_onda, intensidad = sdl.load_xy_data(file_path)
-            
-            data_dic = {
-                'Longitud de onda': longitud_onda,
-                'Intensidad': intensidad
-            }
-            df = pd.DataFrame(data_dic)
-            dfs_list.append(df)
+    for ngqd_name, folder_path in zip(folders_dic, folder_paths):
+        if folder_path not in spectra_tree:
+            continue
         
-        if not dfs_list:
+        if not spectra_tree[folder_path]:
             print(f"Advertencia: No se encontraron datos para {ngqd_name}")
             continue
 
-        df_contact = pd.concat(dfs_list)
-        
-        # Agrupar por longitud de onda para calcular promedio Y desviación estándar
-        grouped = df_contact.groupby('Longitud de onda')['Intensidad']
-        df_proc = grouped.agg(['mean', 'std', 'count']).reset_index()
-        
-        # Calcular el error estándar de la media (SEM)
-        # SEM = std / sqrt(n)
-        df_proc['sem'] = df_proc['std'] / np.sqrt(df_proc['count'])
-        
-        # Aplicar el promedio móvil sobre la media y rellenar los NaN iniciales
-        df_proc['mean_suavizada'] = df_proc['mean'].rolling(window=5, center=True, min_periods=1).mean()
+        # Promedio de réplicas sobre una rejilla común: media, desviación estándar,
+        # conteo, error estándar de la media (SEM = std / sqrt(n)) y promedio móvil
+        df_proc = ReplicateStack.from_xy(spectra_tree[folder_path].values()).to_dataframe()
 
         # Diccionario con datos procesados por tipo de N-GQD
         plot_dic[ngqd_name] = df_proc
@@ -241,7 +161,10 @@ def pl_plot(ax, fig):
     ax_inset2.imshow(img_viales)
     ax_inset2.axis('off')
 
-if __name__ == '__main__':
+OUTPUT_PATH = os.path.join('..', 'nitrite_sensor_acsomega_article', 'Figures', 'ir_pl_comparison_ngqds.png')
+
+def make_figure():
+    import matplotlib.pyplot as plt
     fig = plt.figure(layout='constrained', figsize=(15,7))
     subfigs = fig.subfigures(1,2)
 
@@ -250,7 +173,10 @@ if __name__ == '__main__':
 
     ax_right = subfigs[1].subplots(3,1, sharex=True)
     plot_ir(ax_right)
+    return fig
 
-    output_path = os.path.join('..', 'nitrite_sensor_acsomega_article', 'Figures', 'ir_pl_comparison_ngqds.png')
-    plt.savefig(output_path, dpi=300)
-    plt.show()
\ No newline at end of file
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+    fig = make_figure()
+    plt.savefig(OUTPUT_PATH, dpi=300)
+    plt.show()
@@ -0,0 +1,364 @@
+"""
+Interfaz de línea de comandos sin GUI para los análisis numéricos y el
+renderizado de figuras. Uso:
+
+    python scripts/ngqd_cli.py calibrate datos_espectros/PL/ngqd_ca_curva_in_situ/ensayo1a16 --ci 2000
+    python scripts/ngqd_cli.py calibrate datos_espectros/PL/ngqd_ca_curva_in_situ/ensayo1a16 --catalog datos_espectros
+    python scripts/ngqd_cli.py bandgap datos_espectros/UV-Vis/ngqd_ca_uvvis.txt --energy-range 2.6 3.6
+    python scripts/ngqd_cli.py saed ../Datos/TEM_analysis/SAED/Glu_diffraction_patterns.csv
+    python scripts/ngqd_cli.py saed imagenes_saed/*.tif --pixel-size 0.02 --out anillos.csv
+    python scripts/ngqd_cli.py eem datos_espectros/PL/ngqd_ca_lamda_ex --fill interp --out eem.npz
+    python scripts/ngqd_cli.py ph datos_espectros/PL/ngqd_ca_pH_soln1a4 --bin-width 10
+    python scripts/ngqd_cli.py ph --store datos_espectros_store --window 395 650 --out pka.csv
+    python scripts/ngqd_cli.py kinetics datos_espectros/PL/ngqd_ca_tiempo_interaccion --model auto
+    python scripts/ngqd_cli.py ir-bands datos_espectros/FT-IR/N-GQD_CA_BLC.txt --table nitrite
+    python scripts/ngqd_cli.py catalog datos_espectros --technique PL --route CA --sample ngqd_ca_curva_in_situ --concentration - 100
+    python scripts/ngqd_cli.py ingest datos_espectros --out datos_espectros_store --memory-mb 512
+    python scripts/ngqd_cli.py render uv_vis_tauc_plot --force
+
+Cada subcomando importa sus módulos al ejecutarse, de modo que los caminos
+numéricos (calibrate, bandgap, saed, eem, ph, kinetics, ir-bands, catalog, ingest)
+no cargan matplotlib ni pandas y el arranque se limita a argparse y NumPy. Solo render carga
+matplotlib (con el backend Agg) en los procesos que dibujan las figuras.
+"""
+import argparse
+import os
+import sys
+
+
+def calibrate_command(args):
+    from code_functions.calibration_model import CalibrationModel, load_calibration_tree
+    window = tuple(args.window)
+    if args.catalog:
+        from code_functions.catalog import Catalog
+        with Catalog.open(args.catalog) as catalog:
+            conc, F = load_calibration_tree(args.root, window=window, feature=args.feature, catalog=catalog,
+                                            memory_mb=args.memory_mb)
+    else:
+        conc, F = load_calibration_tree(args.root, window=window, feature=args.feature, memory_mb=args.memory_mb)
+    if conc.size == 0:
+        print(f'No se encontraron carpetas de concentración en {args.root}')
+        return 1
+    model = CalibrationModel.fit(conc, F, kind=args.kind, window=window, feature=args.feature,
+                                 linear_range=(0, args.linear_max))
+    print(f'Modelo {model.kind}: m = {model.slope:.5f}, b = {model.intercept:.5f}, '
+          f'R² = {model.r2:.4f}, LOD = {model.lod:.2f} µM ({conc.size} espectros)')
+    if args.ci:
+        from code_functions.uncertainty import calibration_uncertainty
+        summary = calibration_uncertainty(conc, F, args.ci, linear_range=(0, args.linear_max),
+                                          seed=args.seed)['summary']
+        for key in ('lod', 'K_sv'):
+            s = summary[key]
+            print(f"{key}: {s['mean']:.4f} (IC 95 %: {s['ci_low']:.4f}–{s['ci_high']:.4f})")
+    if args.out:
+        model.save(args.out)
+        print(f'-> {args.out}')
+    return 0
+
+
+def bandgap_command(args):
+    import spectrum_data_loader as sdl
+    from code_functions.replicate_stack import ReplicateStack
+    from code_functions.tauc_bandgap import band_gaps
+    stack = ReplicateStack.from_xy(sdl.load_many(args.files))
+    energy_range = tuple(args.energy_range) if args.energy_range else None
+    fit = band_gaps(stack.x, stack.Y, n=tuple(args.n), energy_range=energy_range)
+    print('archivo\tn\tEg_eV\tEg_std_eV\tr2\te_inicio\te_fin')
+    for k, n in enumerate(fit['n']):
+        for i, file_path in enumerate(args.files):
+            print(f"{file_path}\t{n:g}\t{fit['Eg'][k, i]:.4f}\t{fit['Eg_std'][k, i]:.4f}\t{fit['r2'][k, i]:.4f}\t"
+                  f"{fit['e_start'][k, i]:.3f}\t{fit['e_end'][k, i]:.3f}")
+    return 0
+
+
+def saed_command(args):
+    from code_functions import saed
+    tables = [f for f in args.files if f.lower().endswith('.csv')]
+    images = [f for f in args.files if f.lower().endswith(saed.IMAGE_EXTENSIONS)]
+    reflections = saed.load_reflection_table(args.reflections) if args.reflections else saed.REFLECTIONS_GRAPHITE
+    if tables:
+        from saed_analysis import d_spacings
+        print('archivo\tanillo\td_A\treflexión')
+        for file_path in tables:
+            d = d_spacings(file_path, args.column)
+            labels, _, _ = saed.match_reflections(d, reflections, args.tolerance)
+            for n, (d_n, label) in enumerate(zip(d, labels)):
+                print(f'{file_path}\t{n}\t{d_n:.4f}\t{label}')
+    if images:
+        if args.pixel_size is None:
+            print('Las imágenes necesitan la calibración --pixel-size (nm⁻¹ por píxel)')
+            return 1
+        results = saed.analyze_images(images, args.pixel_size, workers=args.workers, reflections=reflections,
+                                      tolerance=args.tolerance)
+        print('archivo\tcentro\tanillo\td_A\treflexión')
+        for result in results:
+            rings = result['rings']
+            for n in range(rings['g'].size):
+                print(f"{result['path']}\t{result['center'][0]:.1f},{result['center'][1]:.1f}\t{n}\t"
+                      f"{rings['d'][n]:.4f}\t{rings['label'][n]}")
+        if args.out:
+            saed.write_rings_csv(results, args.out)
+            print(f'-> {args.out}')
+    return 0
+
+
+def ir_bands_command(args):
+    from code_functions import ir_bands
+    if args.bands_csv:
+        bands = ir_bands.load_band_table(args.bands_csv)
+    else:
+        bands = ir_bands.BANDS_NITRITE if args.table == 'nitrite' else ir_bands.BANDS_NGQD
+    metrics = ir_bands.band_metrics_files(args.files, bands)
+    print('archivo\tbanda\tárea\tT_min\tposición_cm-1')
+    for i, file_path in enumerate(args.files):
+        for b, label in enumerate(metrics['labels']):
+            print(f"{file_path}\t{label}\t{metrics['area'][i, b]:.4f}\t{metrics['min_T'][i, b]:.2f}\t"
+                  f"{metrics['position'][i, b]:.1f}")
+    return 0
+
+
+def eem_command(args):
+    from code_functions import eem
+    eems = [eem.load_excitation_series(folder, workers=args.workers) for folder in args.folders]
+    ex, em, X = eem.stack_eems(eems)
+    mask = eem.scatter_mask(ex, em, width=args.width, raman=not args.no_raman)
+    X = eem.remove_scatter(em, X, mask, fill=args.fill)
+    dependence = eem.peak_dependence(ex, em, X, window=tuple(args.window))
+    print('carpeta\tλex_nm\tposición_nm\taltura\tFWHM_nm')
+    for s, folder in enumerate(args.folders):
+        for e, ex_e in enumerate(ex):
+            print(f"{folder}\t{ex_e:g}\t{dependence['position'][s, e]:.1f}\t{dependence['height'][s, e]:.2f}\t"
+                  f"{dependence['fwhm'][s, e]:.1f}")
+    for s, folder in enumerate(args.folders):
+        print(f"{folder}: desplazamiento {dependence['shift_slope'][s]:.3f} nm/nm "
+              f"(R² = {dependence['shift_r2'][s]:.3f}, rango {dependence['shift_range'][s]:.1f} nm)")
+    if args.rank:
+        factorize = eem.parafac if args.method == 'parafac' else eem.nmf
+        result = factorize(X, args.rank)
+        print(f"{args.method}: {args.rank} componentes, varianza explicada {result['explained']:.4f} "
+              f"({result['n_iter']} iteraciones)")
+        for s, folder in enumerate(args.folders):
+            print(f"{folder}\t" + '\t'.join(f'{v:.4g}' for v in result['scores'][s]))
+    if args.out:
+        eem.save_eems(args.out, ex, em, X, [eem.folder_entry(folder) for folder in args.folders])
+        print(f'-> {args.out}')
+    return 0
+
+
+def ph_command(args):
+    import csv
+    from code_functions import ph_response
+    windows = [tuple(args.window)] if args.window else None
+    bin_width = None if windows else args.bin_width
+    if args.store:
+        from code_functions.spectrum_store import SpectrumStore
+        from code_functions.spectrum_types import SpectrumBatch
+        batch = SpectrumBatch.from_store(SpectrumStore(args.store), 'PL')
+        sweep = ph_response.campaign_sweep(batch, windows=windows, bin_width=bin_width, feature=args.feature,
+                                           hill=args.hill)
+        names = [f"{m['sample']}|{m['route']}|{m['dilution']:g}|{m['concentration']:g}|{m['lambda_ex']:g}"
+                 for m in sweep['meta']]
+        centers, fit = sweep['centers'], sweep['fit']
+    else:
+        levels, centers, R, fit = ph_response.ph_response(args.folder, windows=windows, bin_width=bin_width,
+                                                          feature=args.feature, hill=args.hill)
+        print(f"Niveles de pH: {', '.join(f'{v:g}' for v in levels)}")
+        names = [args.folder]
+        fit = {key: values[None] for key, values in fit.items()}
+
+    header = ['campaña', 'centro_nm', 'pKa', 'pKa_std', 'n', 'F_acid', 'F_base', 'pH_bajo', 'pH_alto', 'R2']
+    rows = []
+    for g, name in enumerate(names):
+        for w, center in enumerate(centers):
+            rows.append([name, f'{center:g}'] + [f'{fit[key][g, w]:.4g}' for key in
+                        ('pKa', 'pKa_std', 'n', 'F_acid', 'F_base', 'ph_low', 'ph_high', 'r2')])
+    print('\t'.join(header))
+    for row in rows:
+        print('\t'.join(row))
+    if args.out:
+        with open(args.out, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f'-> {args.out}')
+    return 0
+
+
+def kinetics_command(args):
+    from code_functions.kinetics import series_kinetics
+    windows = [tuple(w) for w in args.window] if args.window else [(395.0, 650.0)]
+    centers, t, F, fit = series_kinetics(args.folder, windows=windows, bin_width=args.bin_width,
+                                         feature=args.feature, model=args.model, fraction=args.fraction)
+    labels = ([f'{c:g}' for c in centers] if args.bin_width else
+              [f'{window[0]:g}-{window[1]:g}' for window in windows])
+    print(f"Tiempos (s): {', '.join(f'{v:g}' for v in t)}")
+    print(f"{'centro_nm' if args.bin_width else 'ventana'}\tmodelo\tk_1/s\tk_std\tk2_1/s\tF0\tF_inf\t"
+          'apagamiento\tt_eq_s\tlectura_s\tR2')
+    for w, label in enumerate(labels):
+        print(f"{label}\t{fit['model'][w]}\t{fit['k'][w]:.4g}\t{fit['k_std'][w]:.2g}\t"
+              f"{fit['k2'][w]:.4g}\t{fit['F0'][w]:.2f}\t{fit['F_inf'][w]:.2f}\t{fit['quenching'][w]:.3f}\t"
+              f"{fit['t_eq'][w]:.1f}\t{fit['read_time'][w]:g}\t{fit['r2'][w]:.4f}")
+    return 0
+
+
+def _range(values):
+    # '-' deja abierto el extremo: --concentration - 100 equivale a ≤ 100
+    return tuple(None if v == '-' else float(v) for v in values)
+
+
+def catalog_command(args):
+    from code_functions.catalog import Catalog
+    with Catalog.open(args.root, db_path=args.db, scan=False) as catalog:
+        counts = catalog.scan()
+        filters = {field: getattr(args, field) for field in ('technique', 'sample', 'route', 'path')
+                   if getattr(args, field) is not None}
+        for field in ('concentration', 'ph', 'lambda_ex', 'dilution'):
+            value = getattr(args, field)
+            if value is not None:
+                filters[field] = _range(value) if len(value) == 2 else float(value[0])
+        if args.rescan:
+            print(', '.join(f'{n} {key}' for key, n in counts.items()))
+        if args.count:
+            for values, n in catalog.count(**filters):
+                print('\t'.join(str(v) for v in values) + f'\t{n}')
+            return 0
+        print('ruta\ttécnica\tmuestra\truta_síntesis\tconc_uM\tpH\tλex_nm\tdilución\tréplica')
+        for path, m in catalog.query(**filters):
+            print(f"{path}\t{m['technique']}\t{m['sample']}\t{m['route']}\t{m['concentration']:g}\t{m['ph']:g}\t"
+                  f"{m['lambda_ex']:g}\t{m['dilution']:g}\t{m['replicate']}")
+    return 0
+
+
+def ingest_command(args):
+    from ingest_spectra import parse_options
+    from code_functions.preprocessing import BASELINES, SMOOTHERS
+    from code_functions.spectrum_store import ingest_tree
+    preprocess = parse_options(args.baseline, 'baseline_method', BASELINES)
+    for technique, options in parse_options(args.smooth, 'smooth_method', SMOOTHERS).items():
+        preprocess.setdefault(technique, {}).update(options)
+    ingest_tree(args.root, args.out, preprocess, memory_mb=args.memory_mb)
+    return 0
+
+
+def render_command(args):
+    import build_figures
+    if args.list:
+        for name, target in build_figures.FIGURES.items():
+            print(f"{name}: {target['module']} ({', '.join(target['panels'])})")
+        return 0
+    failed = build_figures.build(args.names, force=args.force, jobs=args.jobs)
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Análisis de espectros de N-GQDs sin interfaz gráfica.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('calibrate', help='Ajusta la curva de calibración de una serie')
+    p.add_argument('root', help='Carpeta con una subcarpeta por concentración (p. ej. 10uM)')
+    p.add_argument('--kind', choices=['stern_volmer', 'linear'], default='stern_volmer')
+    p.add_argument('--feature', choices=['max', 'integral'], default='max')
+    p.add_argument('--window', type=float, nargs=2, default=[395, 650])
+    p.add_argument('--linear-max', type=float, default=100)
+    p.add_argument('--memory-mb', type=float, default=None,
+                   help='Leer los espectros por bloques con este techo de memoria (MB)')
+    p.add_argument('--catalog', default=None, metavar='RAÍZ',
+                   help='Tomar las concentraciones del catálogo de esta raíz de datos (p. ej. datos_espectros)')
+    p.add_argument('--ci', type=int, default=0, metavar='N', help='Remuestreos bootstrap para los IC de LOD y K_sv')
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--out', default=None, help='Guardar el modelo en JSON')
+    p.set_defaults(func=calibrate_command)
+
+    p = subparsers.add_parser('bandgap', help='Band gap de Tauc de espectros UV-Vis')
+    p.add_argument('files', nargs='+')
+    p.add_argument('--n', type=float, nargs='+', default=[2.0], help='Exponentes de Tauc (2 directo, 0.5 indirecto)')
+    p.add_argument('--energy-range', type=float, nargs=2, default=None, metavar=('E_MIN', 'E_MAX'))
+    p.set_defaults(func=bandgap_command)
+
+    p = subparsers.add_parser('saed', help='Anillos SAED: imágenes de difracción o tablas de ImageJ')
+    p.add_argument('files', nargs='*', default=[os.path.join('..', 'Datos', 'TEM_analysis', 'SAED',
+                                                             'Glu_diffraction_patterns.csv')],
+                   help='Imágenes (.tif, .png, .npy, ...) o CSV de ImageJ con el diámetro de los anillos')
+    p.add_argument('--pixel-size', type=float, default=None, help='Calibración de las imágenes en nm⁻¹ por píxel')
+    p.add_argument('--column', default='Major', help='Columna del CSV con el diámetro del anillo (nm⁻¹)')
+    p.add_argument('--reflections', default=None, help='Tabla de reflexiones propia (CSV con d, label)')
+    p.add_argument('--tolerance', type=float, default=0.04, help='Error relativo máximo para asignar una reflexión')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--out', default=None, help='CSV con los anillos de las imágenes')
+    p.set_defaults(func=saed_command)
+
+    p = subparsers.add_parser('ir-bands', help='Áreas y posiciones de bandas FT-IR')
+    p.add_argument('files', nargs='+')
+    p.add_argument('--table', choices=['ngqd', 'nitrite'], default='ngqd')
+    p.add_argument('--bands-csv', default=None, help='Tabla de bandas propia (center, width, label)')
+    p.set_defaults(func=ir_bands_command)
+
+    p = subparsers.add_parser('eem', help='Matriz de excitación-emisión de series con varias λex')
+    p.add_argument('folders', nargs='*', default=[os.path.join('datos_espectros', 'PL', 'ngqd_ca_lamda_ex')],
+                   help='Carpetas con un espectro por λex (una EEM por carpeta)')
+    p.add_argument('--window', type=float, nargs=2, default=[395, 650])
+    p.add_argument('--width', type=float, default=12.0, help='Semiancho (nm) de las bandas de dispersión')
+    p.add_argument('--no-raman', action='store_true', help='No enmascarar la dispersión Raman del agua')
+    p.add_argument('--fill', choices=['nan', 'zero', 'interp'], default='interp')
+    p.add_argument('--rank', type=int, default=0, help='Componentes de la factorización (0: no factorizar)')
+    p.add_argument('--method', choices=['parafac', 'nmf'], default='parafac')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--out', default=None, help='Guardar las EEM (npz comprimido)')
+    p.set_defaults(func=eem_command)
+
+    p = subparsers.add_parser('ph', help='Respuesta frente al pH y pKa por banda de longitud de onda')
+    p.add_argument('folder', nargs='?', default=os.path.join('datos_espectros', 'PL', 'ngqd_ca_pH_soln1a4'))
+    p.add_argument('--store', default=None, help='Almacén de espectros: ajusta todas las campañas de pH')
+    p.add_argument('--window', type=float, nargs=2, default=None, help='Ventana única en lugar de bandas')
+    p.add_argument('--bin-width', type=float, default=10.0, help='Ancho (nm) de las bandas de longitud de onda')
+    p.add_argument('--feature', choices=['max', 'height', 'area'], default='max')
+    p.add_argument('--hill', action='store_true', help='Ajustar también la pendiente n de la sigmoide')
+    p.add_argument('--out', default=None, help='CSV con los ajustes')
+    p.set_defaults(func=ph_command)
+
+    p = subparsers.add_parser('kinetics', help='Cinética de apagamiento de una serie temporal de PL')
+    p.add_argument('folder', nargs='?', default=os.path.join('datos_espectros', 'PL', 'ngqd_ca_tiempo_interaccion'))
+    p.add_argument('--window', type=float, nargs=2, action='append', default=None, metavar=('MIN', 'MAX'),
+                   help='Ventana espectral; se puede repetir (por defecto 395-650)')
+    p.add_argument('--bin-width', type=float, default=None,
+                   help='Trazas por bandas de este ancho (nm) en lugar de ventanas')
+    p.add_argument('--feature', choices=['max', 'height', 'area'], default='max')
+    p.add_argument('--model', choices=['mono', 'bi', 'auto'], default='mono')
+    p.add_argument('--fraction', type=float, default=0.05, help='Cambio pendiente que define el equilibrio')
+    p.set_defaults(func=kinetics_command)
+
+    p = subparsers.add_parser('catalog', help='Índice de los espectros y consultas por condiciones')
+    p.add_argument('root', nargs='?', default='datos_espectros')
+    p.add_argument('--db', default=None, help='Archivo SQLite (por defecto, <root>/.catalog.sqlite)')
+    p.add_argument('--technique', default=None)
+    p.add_argument('--sample', default=None, help="Muestra; admite comodines ('ngqd_ca*')")
+    p.add_argument('--route', choices=['CA', 'BC', 'Glu'], default=None)
+    p.add_argument('--path', default=None, help="Patrón de ruta relativa ('PL/ngqd_ca_dilutions/*')")
+    for field, unit in (('concentration', 'µM; '), ('ph', ''), ('lambda_ex', 'nm; '), ('dilution', 'N de 1 a N; ')):
+        p.add_argument(f"--{field.replace('_', '-')}", dest=field, nargs='+', default=None, metavar='VALOR',
+                       help=f'Valor exacto o mínimo y máximo ({unit}"-" deja el extremo abierto)')
+    p.add_argument('--count', action='store_true', help='Solo el número de espectros por técnica y muestra')
+    p.add_argument('--rescan', action='store_true', help='Mostrar el resumen del reescaneo incremental')
+    p.set_defaults(func=catalog_command)
+
+    p = subparsers.add_parser('ingest', help='Crea el almacén columnar de espectros')
+    p.add_argument('root', nargs='?', default='datos_espectros')
+    p.add_argument('--out', default='datos_espectros_store')
+    p.add_argument('--baseline', action='append', default=[], metavar='TÉCNICA=MÉTODO')
+    p.add_argument('--smooth', action='append', default=[], metavar='TÉCNICA=MÉTODO')
+    p.add_argument('--memory-mb', type=float, default=None,
+                   help='Empaquetar por bloques con este techo de memoria (MB)')
+    p.set_defaults(func=ingest_command)
+
+    p = subparsers.add_parser('render', help='Genera las figuras (backend Agg)')
+    p.add_argument('names', nargs='*', help='Figuras a generar (por defecto, todas)')
+    p.add_argument('--force', action='store_true')
+    p.add_argument('--jobs', type=int, default=None)
+    p.add_argument('--list', action='store_true')
+    p.set_defaults(func=render_command)
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
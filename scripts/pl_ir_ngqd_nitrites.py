@@ -1,35 +1,19 @@
 import spectrum_data_loader as sdl
 import os
-import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
-import matplotlib.image as mpimg
-import matplotlib.patches as mpatches
+from code_functions.ir_bands import BANDS_NITRITE
+from code_functions.kinetics import load_time_series
 
 def plot_pl_time(ax):
+    import matplotlib.image as mpimg
+    import matplotlib.pyplot as plt
     folder = os.path.join('datos_espectros', 'PL', 'ngqd_ca_tiempo_interaccion')
-    files_list = os.listdir(folder)
     img_path = os.path.join('datos_espectros', 'PL', "PL_interaccionNO_cuali.jpg")
     img_interractionNO = mpimg.imread(img_path)
 
-    time_read_labels = [f'{str(n)} s' for n in np.arange(0, 121, 30)]
-    n=0
-
-    for file_name in files_list:
-        file_path = os.path.join(folder, file_name)
-
-        longitud_onda, intensidad = sdl.load_xy_data(file_path)
-
-        data_dic = {
-            'Longitud de onda': longitud_onda,
-            'Intensidad': intensidad
-        }
-
-        df = pd.DataFrame(data_dic)
-
-        ax.plot(df['Longitud de onda'], df['Intensidad'], label=time_read_labels[n])
-        
-        n+=1
+    # Espectros ordenados por tiempo de lectura (path_metadata.POSITIONAL_RULES: 0-120 s cada 30 s)
+    times, longitud_onda, intensidades = load_time_series(folder)
+    for t, intensidad in zip(times, intensidades):
+        ax.plot(longitud_onda, intensidad, label=f'{t:g} s')
 
     # --- GRAFICO DE LINEAS ---
     ax.set_xlabel('Wavelength (nm)', fontsize=13)
@@ -50,6 +34,8 @@ def plot_pl_time(ax):
     ax_inset.axis('off')
 
 def plot_ir_nitrites (axs):
+    import matplotlib.patches as mpatches
+    import pandas as pd
     home = os.path.join('datos_espectros', 'FT-IR')
     files = ['N-GQD_CA_BLC.txt', 'N-GQD_CA_pH3_BLC.txt', 'N-GQD_CA_NO2_BLC.txt']
     names = ['N-GQDs (CA)', 'N-GQDs (CA), pH 3', r'N-GQDs (CA) + $\text{NO}_{2}^{-}$']
@@ -57,11 +43,11 @@ def plot_ir_nitrites (axs):
     colors = ['green', 'brown', 'blue']
     n=0
 
-    # regiones de rectángulos, valor: tupla (centro, ancho)
-    regiones = {
-        'yellow': (1600, 200), # imina y amina II
-        'brown': (1300, 250), # aminas aromáticas
-        'purple': (1040, 250) # aminas alifáticas
+    # color de cada región de ir_bands.BANDS_NITRITE
+    colores_regiones = {
+        'Imine / amine II': 'yellow',
+        'Aromatic amines': 'brown',
+        'Aliphatic amines': 'purple'
     }
 
     for file in files:
@@ -91,32 +77,38 @@ def plot_ir_nitrites (axs):
         height = y1 - y0  # Altura max de cada fig de espectro
         alpha = 0.3  # alfa para los rectángulos
 
-        for color, region in regiones.items():
-            centro, ancho = region[0], region[1]
+        for centro, ancho, grupo in BANDS_NITRITE:
             x = centro - ancho/2
 
             rect = mpatches.Rectangle(
                 (x, y0),
                 ancho,
                 height,
-                facecolor=color,
+                facecolor=colores_regiones[grupo],
                 alpha=alpha,
                 zorder=1
             )
             axs[n].add_patch(rect)
         n+=1
 
-# ------------- MAIN configuration -------------
-fig = plt.figure(layout='constrained', figsize=(15,6))
-subfigs = fig.subfigures(1,2)
+OUTPUT_PATH = os.path.join('..', 'nitrite_sensor_acsomega_article', 'Figures', 'plTime_irNitrites_spectra.png')
+
+def make_figure():
+    import matplotlib.pyplot as plt
+    fig = plt.figure(layout='constrained', figsize=(15,6))
+    subfigs = fig.subfigures(1,2)
 
-ax_left = subfigs[0].subplots(1,1)
-plot_pl_time(ax_left)
+    ax_left = subfigs[0].subplots(1,1)
+    plot_pl_time(ax_left)
 
-ax_right = subfigs[1].subplots(3,1, sharex=True)
-plot_ir_nitrites(ax_right)
+    ax_right = subfigs[1].subplots(3,1, sharex=True)
+    plot_ir_nitrites(ax_right)
+    return fig
 
-output_path = os.path.join('..', 'nitrite_sensor_acsomega_article', 'Figures', 'plTime_irNitrites_spectra.png')
-plt.savefig(output_path, dpi=300)
+# ------------- MAIN configuration -------------
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+    fig = make_figure()
+    plt.savefig(OUTPUT_PATH, dpi=300)
 
-plt.show()
\ No newline at end of file
+    plt.show()
@@ -1,37 +1,31 @@
 import os
-import matplotlib.pyplot as plt
-import pandas as pd
-import matplotlib.image as mpimg
-import matplotlib.colors as mcolors
-import matplotlib.cm as cm
 import spectrum_data_loader as sdl
+from code_functions.replicate_stack import ReplicateStack
+from code_functions.eem import load_excitation_series
+from code_functions import ph_response
+from code_functions.peak_features import WINDOW_PH
 
 # --- FUNCIÓN 1: GRÁFICO DE EFECTO DE LAMBDA DE EXCITACIÓN ---
 def plot_lambda_ex(ax):
     """
     Genera el gráfico de espectros de PL variando la longitud de onda de excitación.
     """
+    import matplotlib.colors as mcolors
+    import matplotlib.pyplot as plt
     folder = os.path.join('datos_espectros', 'PL', 'ngqd_ca_lamda_ex')
     if not os.path.isdir(folder):
         ax.text(0.5, 0.5, f"Error: La carpeta no existe\n{folder}", ha='center', va='center')
         return
 
-    files_list = sorted(os.listdir(folder))
-    lambda_ex_list = [350, 365, 380, 395, 410, 425]
-    
+    # λex de cada espectro a partir de sus metadatos (nombre, cabecera o regla de la carpeta)
+    lambda_ex, longitud_onda, intensidades = load_excitation_series(folder)
+
     # Configuración del degradado de color
-    norm = mcolors.Normalize(vmin=min(lambda_ex_list), vmax=max(lambda_ex_list))
-    cmap = cm.get_cmap('plasma')
-
-    for n, file_name in enumerate(files_list):
-        if n < len(lambda_ex_list): # Asegurarse de no exceder la lista de lambdas
-            file_path = os.path.join(folder, file_name)
-            longitud_onda, intensidad = sdl.load_xy_data(file_path)
-            
-            color_ex = cmap(norm(lambda_ex_list[n]))
-            ax.plot(longitud_onda, intensidad, 
-                    label=f"{lambda_ex_list[n]} nm", 
-                    color=color_ex)
+    norm = mcolors.Normalize(vmin=lambda_ex.min(), vmax=lambda_ex.max())
+    cmap = plt.get_cmap('plasma')
+
+    for ex, intensidad in zip(lambda_ex, intensidades):
+        ax.plot(longitud_onda, intensidad, label=f"{ex:g} nm", color=cmap(norm(ex)))
 
     # Estilo y etiquetas
     ax.set_xlabel('Wavelength (nm)')
@@ -48,6 +42,7 @@ def plot_dilutions(ax):
     """
     Genera el gráfico de espectros de PL para diferentes diluciones de la muestra.
     """
+    import matplotlib.image as mpimg
     home = os.path.join('datos_espectros', 'PL', 'ngqd_ca_dilutions')
     if not os.path.isdir(home):
         ax.text(0.5, 0.5, f"Error: La carpeta no existe\n{home}", ha='center', va='center')
@@ -62,18 +57,15 @@ def plot_dilutions(ax):
     }
     plot_dic = {}
 
-    for concentration_number, data_folder_name in folders_data_dic.items():
-        folder_path = os.path.join(home, data_folder_name)
-        if not os.path.isdir(folder_path): continue
+    folder_paths = [os.path.join(home, fn) for fn in folders_data_dic.values()]
+    spectra_tree = sdl.load_folders([fp for fp in folder_paths if os.path.isdir(fp)])
+
+    for concentration_number, folder_path in zip(folders_data_dic, folder_paths):
+        if folder_path not in spectra_tree: continue
         
-        dfs_list = [pd.DataFrame(zip(*sdl.load_xy_data(os.path.join(folder_path, fn))), columns=['Longitud de onda', 'Intensidad']) for fn in os.listdir(folder_path)]
-        if not dfs_list: continue
+        if not spectra_tree[folder_path]: continue
 
-        df_concat = pd.concat(dfs_list)
-        grouped = df_concat.groupby('Longitud de onda')['Intensidad']
-        df_proc = grouped.agg(['mean', 'std', 'count']).reset_index()
-        df_proc['mean_suavizada'] = df_proc['mean'].rolling(window=5, center=True, min_periods=1).mean()
-        plot_dic[concentration_number] = df_proc
+        plot_dic[concentration_number] = ReplicateStack.from_xy(spectra_tree[folder_path].values()).to_dataframe()
 
     colors_list = ['blue', 'orange', 'green', 'red', 'purple', 'brown']
     for n, (conc_number, plot_data) in enumerate(plot_dic.items()):
@@ -100,38 +92,44 @@ def plot_dilutions(ax):
         ax_inset.axis('off')
 
 # --- FUNCIÓN 3: GRÁFICOS DE EFECTO DEL PH ---
-def plot_ph_effects(ax_line, ax_bar):
+PH_FOLDER = os.path.join('datos_espectros', 'PL', 'ngqd_ca_pH_soln1a4')
+
+def load_ph_series(folder=PH_FOLDER):
+    """
+    Espectros de la serie de pH y su intensidad máxima de emisión, sin
+    matplotlib. El pH de cada archivo sale de sus metadatos (nombre, cabecera
+    o regla de la carpeta). Devuelve (pH_nums, espectros, {pH: intensidad
+    máxima}), con las réplicas de un mismo pH promediadas en el diccionario.
+    """
+    pH_nums, longitud_onda, intensidades = ph_response.load_ph_series(folder)
+    spectra = [(longitud_onda, intensidad) for intensidad in intensidades]
+
+    # Intensidad máxima de emisión de todos los espectros a la vez
+    levels, _, max_int_em, _ = ph_response.response_matrix(pH_nums, longitud_onda, intensidades,
+                                                           windows=[WINDOW_PH], feature='max')
+    return pH_nums.tolist(), spectra, dict(zip(levels.tolist(), max_int_em[:, 0]))
+
+def plot_ph_effects(ax_line, ax_bar, folder=PH_FOLDER):
     """
     Genera el gráfico de espectros de PL y el de barras de intensidad máxima
     variando el pH de la solución.
     """
-    folder = os.path.join('datos_espectros', 'PL', 'ngqd_ca_pH_soln1a4')
+    import matplotlib.colors as mcolors
+    import matplotlib.pyplot as plt
     if not os.path.isdir(folder):
         ax_line.text(0.5, 0.5, f"Error: La carpeta no existe\n{folder}", ha='center', va='center')
         ax_bar.text(0.5, 0.5, "", ha='center', va='center')
         return
 
-    files_list = sorted(os.listdir(folder))
-    pH_nums = [2, 3, 4, 6, 7, 8, 10]
-    max_int_em_dic = {}
-
+    pH_nums, spectra, max_int_em_dic = load_ph_series(folder)
     # Configuración del degradado de color
     norm = mcolors.Normalize(vmin=min(pH_nums), vmax=max(pH_nums))
-    cmap = cm.get_cmap('coolwarm_r')
+    cmap = plt.get_cmap('coolwarm_r')
 
     # --- Gráfico de líneas (ax_line) ---
-    for n, file_name in enumerate(files_list):
-        if n < len(pH_nums):
-            file_path = os.path.join(folder, file_name)
-            longitud_onda, intensidad = sdl.load_xy_data(file_path)
-            df = pd.DataFrame({'Longitud de onda': longitud_onda, 'Intensidad': intensidad})
-            
-            current_ph = pH_nums[n]
-            color_ph = cmap(norm(current_ph))
-            ax_line.plot(df['Longitud de onda'], df['Intensidad'], label=f"pH {current_ph}", color=color_ph)
-            
-            df_filtered_em = df[(df['Longitud de onda'] >= 380) & (df['Longitud de onda'] <= 700)]
-            max_int_em_dic[current_ph] = df_filtered_em['Intensidad'].max()
+    for current_ph, (longitud_onda, intensidad) in zip(pH_nums, spectra):
+        color_ph = cmap(norm(current_ph))
+        ax_line.plot(longitud_onda, intensidad, label=f"pH {current_ph:g}", color=color_ph)
 
     ax_line.set_xlabel('Wavelength (nm)')
     ax_line.set_ylabel('Intensity (a.u.)')
@@ -144,9 +142,9 @@ def plot_ph_effects(ax_line, ax_bar):
 
     # --- Gráfico de barras (ax_bar) ---
     sorted_items = sorted(max_int_em_dic.items())
-    labels = [str(item[0]) for item in sorted_items]
+    labels = [f'{item[0]:g}' for item in sorted_items]
     max_int_em_values = [item[1] for item in sorted_items]
-    bar_colors = [cmap(norm(float(ph))) for ph in labels]
+    bar_colors = [cmap(norm(item[0])) for item in sorted_items]
 
     ax_bar.bar(labels, max_int_em_values, color=bar_colors, edgecolor='black')
     ax_bar.set_xlabel('pH')
@@ -155,8 +153,10 @@ def plot_ph_effects(ax_line, ax_bar):
             fontsize=15, fontweight='bold', va='top', ha='left')
 
 
-# --- EJECUCIÓN PRINCIPAL ---
-if __name__ == '__main__':
+OUTPUT_PATH = os.path.join('..', 'nitrite_sensor_acsomega_article', 'Figures', 'pl_ngqd_ca_effects_combined.png')
+
+def make_figure():
+    import matplotlib.pyplot as plt
     # Cargamos lienzo principal con una cuadrícula de 2x2
     fig, axs = plt.subplots(2, 2, figsize=(15, 10))
 
@@ -165,11 +165,15 @@ if __name__ == '__main__':
     plot_dilutions(axs[0, 1])
     plot_ph_effects(axs[1, 0], axs[1, 1])
 
-    # Ajustar el layout para evitar solapamientos y guardar la figura
-    plt.tight_layout(rect=[0, 0, 1, 0.96])
+    # Ajustar el layout para evitar solapamientos
+    fig.tight_layout(rect=[0, 0, 1, 0.96])
+    return fig
 
-    output_path = os.path.join('..', 'nitrite_sensor_acsomega_article', 'Figures', 'pl_ngqd_ca_effects_combined.png')
-    plt.savefig(output_path, dpi=300)
+# --- EJECUCIÓN PRINCIPAL ---
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+    fig = make_figure()
+    fig.savefig(OUTPUT_PATH, dpi=300)
 
     # Mostrar el gráfico
-    plt.show()
\ No newline at end of file
+    plt.show()
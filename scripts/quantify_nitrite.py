@@ -0,0 +1,71 @@
+"""
+Cuantificación de nitrito en lote a partir de una calibración guardada.
+
+    # Ajustar y guardar el modelo a partir de la serie in situ
+    python scripts/quantify_nitrite.py fit datos_espectros/PL/ngqd_ca_curva_in_situ/ensayo1a16 --out calibracion.json
+
+    # Estimar la concentración de todos los espectros de una campaña
+    python scripts/quantify_nitrite.py predict calibracion.json campaña/ --out resultados.csv
+"""
+import argparse
+import os
+import numpy as np
+import spectrum_data_loader as sdl
+from code_functions.calibration_model import CalibrationModel, load_calibration_tree
+from code_functions.replicate_stack import ReplicateStack
+
+
+def fit_command(args):
+    conc, F = load_calibration_tree(args.root, window=tuple(args.window), feature=args.feature)
+    model = CalibrationModel.fit(conc, F, kind=args.kind, window=tuple(args.window), feature=args.feature,
+                                 linear_range=(0, args.linear_max))
+    model.save(args.out)
+    print(f'Modelo {model.kind}: m = {model.slope:.5f}, b = {model.intercept:.5f}, '
+          f'R² = {model.r2:.4f}, LOD = {model.lod:.2f} µM -> {args.out}')
+
+
+def predict_command(args):
+    model = CalibrationModel.load(args.model)
+    tree = sdl.load_folder_tree(args.root)
+    names, xy_list = [], []
+    for folder, spectra in tree.items():
+        for file_name, xy in spectra.items():
+            names.append(os.path.normpath(os.path.join(folder, file_name)))
+            xy_list.append(xy)
+    if not xy_list:
+        print(f'No se encontraron espectros en {args.root}')
+        return
+
+    # Todos los espectros sobre una misma rejilla (se interpolan si difieren)
+    stack = ReplicateStack.from_xy(xy_list)
+    conc, conc_std = model.predict(stack.x, stack.Y)
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        f.write('file,concentration_uM,std_uM\n')
+        for name, c, s in zip(names, conc, conc_std):
+            f.write(f'"{name}",{c:.4f},{s:.4f}\n')
+    print(f'{len(names)} espectros cuantificados -> {args.out} '
+          f'(media {np.nanmean(conc):.2f} µM)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calibración y cuantificación de nitrito.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fit_parser = subparsers.add_parser('fit', help='Ajusta el modelo con una serie de calibración')
+    fit_parser.add_argument('root', help='Carpeta con una subcarpeta por concentración (p. ej. 10uM)')
+    fit_parser.add_argument('--out', default='calibration_model.json')
+    fit_parser.add_argument('--kind', choices=['stern_volmer', 'linear'], default='stern_volmer')
+    fit_parser.add_argument('--feature', choices=['max', 'integral'], default='max')
+    fit_parser.add_argument('--window', type=float, nargs=2, default=[395, 650])
+    fit_parser.add_argument('--linear-max', type=float, default=100)
+    fit_parser.set_defaults(func=fit_command)
+
+    predict_parser = subparsers.add_parser('predict', help='Estima la concentración de espectros desconocidos')
+    predict_parser.add_argument('model', help='Archivo JSON del modelo')
+    predict_parser.add_argument('root', help='Carpeta con los espectros a cuantificar')
+    predict_parser.add_argument('--out', default='nitrite_predictions.csv')
+    predict_parser.set_defaults(func=predict_command)
+
+    args = parser.parse_args()
+    args.func(args)
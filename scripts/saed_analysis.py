@@ -1,24 +1,35 @@
+import csv
 import os
-import pandas as pd
+import sys
+from code_functions.saed import d_spacing_angstrom, match_reflections
 
 folder_path = os.path.join('..', 'Datos', 'TEM_analysis', 'SAED')
-file_path = os.path.join(folder_path, 'Glu_diffraction_patterns.csv')
+FILE_PATH = os.path.join(folder_path, 'Glu_diffraction_patterns.csv')
 
-df = pd.read_csv(file_path)
 
-# 'Major' contiene el diámetro del anillo de difracción en el espacio recíproco (unidades: nm⁻¹)
-reciprocal_diameter = df['Major'] 
+def load_ring_diameters(file_path=FILE_PATH, column='Major'):
+    """
+    Diámetros de los anillos de difracción (nm⁻¹) de la tabla de ImageJ.
+    Solo usa el módulo csv, sin pandas.
+    """
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        return [float(row[column]) for row in csv.DictReader(f) if row.get(column, '').strip()]
 
-# Se calcula el radio en el espacio recíproco (g = 1/d)
-# g (nm⁻¹) = diametro_reciproco / 2
-reciprocal_spacing = reciprocal_diameter / 2
 
-# Se calcula el espaciado d en nanómetros
-# d (nm) = 1 / g (nm⁻¹)
-d_spacing_nm = 1 / reciprocal_spacing
+def d_spacings(file_path=FILE_PATH, column='Major'):
+    """
+    Espaciados d (Å) de los anillos medidos a mano. Las imágenes completas se
+    procesan con code_functions.saed.analyze_images.
+    """
+    # 'Major' contiene el diámetro del anillo de difracción en el espacio recíproco (unidades: nm⁻¹)
+    # El radio es g = diámetro / 2 (nm⁻¹) y d = 1/g
+    return d_spacing_angstrom([diameter / 2 for diameter in load_ring_diameters(file_path, column)])
 
-# Se convierte el espaciado d de nanómetros (nm) a Angstroms (Å)
-d_spacing_A = d_spacing_nm * 10
 
-print("Los espaciados d calculados en Angstroms (Å) son:")
-print(d_spacing_A)
\ No newline at end of file
+if __name__ == '__main__':
+    file_path = sys.argv[1] if len(sys.argv) > 1 else FILE_PATH
+    d_spacing_A = d_spacings(file_path)
+    labels, _, errors = match_reflections(d_spacing_A)
+    print("Los espaciados d calculados en Angstroms (Å) son:")
+    for n, (d, label, error) in enumerate(zip(d_spacing_A, labels, errors)):
+        print(f'{n}\t{d:.4f}\t{label}' + (f' ({error:+.1%})' if label else ''))
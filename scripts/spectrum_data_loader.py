@@ -0,0 +1,213 @@
+"""
+Cargador de espectros usado por todos los scripts (import spectrum_data_loader as sdl).
+
+La primera lectura de cada archivo .txt/.csv se guarda en una caché binaria
+indexada por la ruta del archivo. Cada entrada guarda una marca y la versión
+del formato (CACHE_VERSION), el tamaño, la fecha de modificación y el hash del
+contenido del archivo original, seguidos de los arreglos x e y en float64, de
+modo que en las siguientes ejecuciones se omite por completo el parseo del
+texto mientras el archivo no cambie. Una entrada con otra marca o versión se
+trata como un fallo y se reescribe.
+"""
+import hashlib
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from code_functions import profiling
+from code_functions.data_txt_pull import data_parse_bytes
+
+EXTENSIONES = ('.txt', '.csv')
+
+# Cabecera de cada entrada: marca, versión del formato, tamaño, mtime (ns),
+# hash del contenido, nº de puntos
+CACHE_HEADER = struct.Struct('<4sIqq16sq')
+CACHE_MAGIC = b'SDLC'
+# Se incrementa cuando cambia el parser o el formato de la entrada: las
+# entradas de otra versión cuentan como fallos y se reescriben
+CACHE_VERSION = 2
+
+# Carpeta de la caché; se puede cambiar con la variable de entorno SDL_CACHE_DIR
+CACHE_DIR = os.environ.get(
+    'SDL_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.spectrum_cache'))
+# SDL_NO_CACHE=1 desactiva la caché (útil para depurar el parser)
+USE_CACHE = os.environ.get('SDL_NO_CACHE', '') in ('', '0')
+
+
+def _cache_path(file_path):
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, key + '.bin')
+
+
+def _content_hash(raw):
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def _read_cache(cache_file, stat, file_path):
+    """
+    Devuelve (x, y) desde la caché si la entrada sigue siendo válida, o None.
+    """
+    try:
+        with open(cache_file, 'rb') as f:
+            entry = bytearray(f.read())
+        magic, version, size, mtime_ns, content_hash, n = CACHE_HEADER.unpack_from(entry)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or size != stat.st_size:
+            return None
+        xy = np.frombuffer(entry, dtype='<f8', count=2 * n, offset=CACHE_HEADER.size)
+    except (OSError, struct.error, ValueError):
+        return None
+
+    if mtime_ns != stat.st_mtime_ns:
+        # El archivo se tocó; solo es válido si el contenido no cambió
+        with open(file_path, 'rb') as f:
+            if _content_hash(f.read()) != content_hash:
+                return None
+        _write_cache(cache_file, stat, content_hash, xy[:n], xy[n:])
+    return xy[:n], xy[n:]
+
+
+def _write_cache(cache_file, stat, content_hash, x, y):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Escritura atómica: archivo temporal y luego reemplazo
+    tmp_file = f'{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, stat.st_size, stat.st_mtime_ns, content_hash, x.size))
+        f.write(np.asarray(x, dtype='<f8').tobytes())
+        f.write(np.asarray(y, dtype='<f8').tobytes())
+    os.replace(tmp_file, cache_file)
+
+
+@profiling.timed('load')
+def load_xy_data(file_path, use_cache=None):
+    """
+    Lee un espectro de dos columnas y devuelve (x, y) como arreglos float64.
+
+    Si use_cache es None se usa la configuración global (USE_CACHE).
+    """
+    if use_cache is None:
+        use_cache = USE_CACHE
+    if not use_cache:
+        with open(file_path, 'rb') as f:
+            return data_parse_bytes(f.read())
+
+    stat = os.stat(file_path)
+    cache_file = _cache_path(file_path)
+    if os.path.exists(cache_file):
+        cached = _read_cache(cache_file, stat, file_path)
+        if cached is not None:
+            profiling.count('cache_hits')
+            return cached
+    profiling.count('cache_misses')
+
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    x, y = data_parse_bytes(raw)
+    if x.size:
+        try:
+            _write_cache(cache_file, stat, _content_hash(raw), x, y)
+        except OSError as e:
+            print(f'Advertencia: no se pudo escribir la caché de {file_path}: {e}')
+    return x, y
+
+
+def clear_cache():
+    """
+    Elimina todas las entradas de la caché de espectros.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.bin'):
+            os.remove(os.path.join(CACHE_DIR, name))
+
+
+# --- CARGA EN PARALELO ---
+def list_spectra(folder):
+    """
+    Archivos de espectros de una carpeta, en orden alfabético.
+    """
+    return sorted(fn for fn in os.listdir(folder)
+                  if fn.lower().endswith(EXTENSIONES) and os.path.isfile(os.path.join(folder, fn)))
+
+
+def _load_chunk(file_paths, profile):
+    """
+    Carga un bloque de archivos en un proceso del pool. Devuelve la lista de
+    (x, y) y el perfil del bloque (profiling.export) o None.
+    """
+    # El proceso puede heredar (fork) o reutilizar el perfil: cada bloque empieza vacío
+    profiling.enable(profile)
+    profiling.reset()
+    spectra = [load_xy_data(fp) for fp in file_paths]
+    return spectra, profiling.export() if profile else None
+
+
+@profiling.timed('load_many')
+def load_many(file_paths, workers=None, executor='thread'):
+    """
+    Carga una lista de archivos repartiendo el trabajo en un pool de hilos
+    ('thread') o de procesos ('process'). Devuelve la lista de (x, y) en el
+    mismo orden que file_paths.
+
+    Con executor='process' el script que llama debe proteger su código con
+    if __name__ == '__main__' (necesario en Windows). Los archivos se reparten
+    en bloques y, si el perfilado está activo, el perfil de cada bloque se
+    incorpora al del proceso principal.
+    """
+    file_paths = list(file_paths)
+    workers = workers or int(os.environ.get('SDL_WORKERS', 0)) or os.cpu_count() or 1
+    if workers == 1 or len(file_paths) < 2:
+        return [load_xy_data(fp) for fp in file_paths]
+
+    if executor == 'process':
+        chunksize = max(1, len(file_paths) // (workers * 4))
+        chunks = [file_paths[i:i + chunksize] for i in range(0, len(file_paths), chunksize)]
+        profile = profiling.enabled()
+        spectra = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk_spectra, chunk_profile in pool.map(_load_chunk, chunks, [profile] * len(chunks)):
+                if chunk_profile is not None:
+                    profiling.merge(chunk_profile)
+                spectra.extend(chunk_spectra)
+        return spectra
+    if executor != 'thread':
+        raise ValueError(f"executor debe ser 'thread' o 'process', no {executor!r}")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(load_xy_data, file_paths))
+
+
+def load_folders(folder_paths, workers=None, executor='thread'):
+    """
+    Carga todas las réplicas de varias carpetas en una sola pasada paralela.
+    Devuelve {carpeta: {nombre_archivo: (x, y)}} respetando el orden de
+    folder_paths y el orden alfabético de los archivos. Las carpetas que no
+    existen se omiten con una advertencia.
+    """
+    jobs = []
+    for folder in folder_paths:
+        if not os.path.isdir(folder):
+            print(f"Advertencia: La carpeta no existe - {folder}")
+            continue
+        jobs.extend((folder, fn) for fn in list_spectra(folder))
+
+    results = load_many([os.path.join(folder, fn) for folder, fn in jobs], workers, executor)
+    tree = {folder: {} for folder in folder_paths if os.path.isdir(folder)}
+    for (folder, file_name), xy in zip(jobs, results):
+        tree[folder][file_name] = xy
+    return tree
+
+
+def load_folder_tree(root, workers=None, executor='thread'):
+    """
+    Igual que load_folders, pero sobre cada subcarpeta de root que contenga
+    espectros. Las claves son las rutas relativas a root, ordenadas.
+    """
+    folders = []
+    for dir_path, dir_names, _ in os.walk(root):
+        dir_names.sort()
+        if list_spectra(dir_path):
+            folders.append(dir_path)
+    tree = load_folders(folders, workers, executor)
+    return {os.path.relpath(folder, root): spectra for folder, spectra in tree.items()}
@@ -0,0 +1,139 @@
+"""
+Servicio de ingesta continua para la calibración in situ.
+
+Vigila la carpeta de exportación del equipo, lee cada espectro nuevo una sola
+vez (a través de la caché de spectrum_data_loader) y actualiza solo lo que
+depende de él: máximo de emisión, estadísticas de réplicas de su carpeta y
+la calibración incremental (F0/F, K_sv, R², LOD). Las réplicas de cada
+carpeta se reducen a acumuladores de Welford/Chan (chunked.RunningStats) sobre
+la rejilla de su primer espectro; no se guardan los espectros. Un archivo
+borrado o sobrescrito con un contenido vacío descuenta su contribución. Uso:
+
+    python scripts/watch_spectra.py datos_espectros/PL/ngqd_ca_curva_in_situ --status calibracion.json
+"""
+import argparse
+import json
+import math
+import os
+import numpy as np
+import spectrum_data_loader as sdl
+from code_functions.chunked import RunningStats
+from code_functions.incremental_calibration import IncrementalCalibration
+from code_functions.path_metadata import parse_path_metadata
+from code_functions.replicate_stack import align_to_grid
+from code_functions.resampling import GridResampler
+from code_functions.spectrum_watcher import SpectrumWatcher
+
+
+class InsituService:
+    def __init__(self, root, window=(395, 650), linear_max=100, status_path=None):
+        self.root = root
+        self.status_path = status_path
+        self.calibration = IncrementalCalibration(window=window, linear_max=linear_max)
+        # carpeta -> (RunningStats, GridResampler de su rejilla, archivos agregados)
+        self.replicate_stats = {}
+        # ruta -> (concentración, máximo de emisión) ya agregado a la calibración
+        self.peaks = {}
+
+    def _add_replicate(self, folder, file_name, x, y):
+        if folder not in self.replicate_stats:
+            grid = np.sort(np.asarray(x, dtype=np.float64), kind='stable')
+            self.replicate_stats[folder] = (RunningStats(grid), GridResampler(grid), set())
+        stats, resampler, files = self.replicate_stats[folder]
+        stats.update(align_to_grid([(x, y)], stats.x, resampler))
+        files.add(file_name)
+
+    def _rebuild_folder(self, folder):
+        """
+        Un acumulador no puede retirar un espectro sobrescrito o borrado: se
+        vuelve a armar con los archivos de la carpeta (leídos de la caché de sdl).
+        """
+        files = sorted(self.replicate_stats.pop(folder)[2])
+        for file_name, (x, y) in zip(files, sdl.load_many([os.path.join(folder, fn) for fn in files])):
+            if x.size:
+                self._add_replicate(folder, file_name, x, y)
+
+    def _forget(self, file_path):
+        """
+        Retira la contribución de un archivo borrado o vacío. Devuelve su
+        carpeta si hay que volver a armar sus réplicas, o None.
+        """
+        if file_path in self.peaks:
+            self.calibration.remove_value(*self.peaks.pop(file_path))
+        folder, file_name = os.path.split(file_path)
+        entry = self.replicate_stats.get(folder)
+        if entry is None or file_name not in entry[2]:
+            return None
+        entry[2].discard(file_name)
+        return folder
+
+    def process(self, new_files, modified_files, removed_files=()):
+        file_paths = new_files + modified_files
+        stale = {self._forget(file_path) for file_path in removed_files}
+        for file_path, (x, y) in zip(file_paths, sdl.load_many(file_paths)):
+            if x.size == 0:
+                stale.add(self._forget(file_path))
+                continue
+            folder, file_name = os.path.split(file_path)
+            entry = self.replicate_stats.get(folder)
+            if entry is not None and file_name in entry[2]:
+                stale.add(folder)
+            else:
+                self._add_replicate(folder, file_name, x, y)
+
+            if file_path in self.peaks:
+                # Archivo sobrescrito: se reemplaza su contribución anterior
+                self.calibration.remove_value(*self.peaks.pop(file_path))
+            conc = parse_path_metadata(os.path.relpath(file_path, self.root))['concentration']
+            if math.isnan(conc):
+                continue
+            peak = self.calibration.peak_intensity(x, y)
+            self.calibration.add_value(conc, peak)
+            self.peaks[file_path] = (conc, peak)
+
+        stale.discard(None)
+        for folder in stale:
+            self._rebuild_folder(folder)
+
+        results = self.calibration.results()
+        print(f"{len(new_files)} nuevos, {len(modified_files)} modificados, {len(removed_files)} retirados | "
+              f"K_sv = {results.get('K_sv', math.nan):.4f} L/µmol, "
+              f"R² = {results.get('r2_sv', math.nan):.4f}, LOD = {results.get('lod', math.nan):.2f} µM")
+        if self.status_path:
+            self.write_status(results)
+
+    def write_status(self, results):
+        # JSON estricto: los valores indefinidos (NaN) se escriben como null
+        status = {
+            'calibration': {key: None if isinstance(value, float) and math.isnan(value) else value
+                            for key, value in results.items()},
+            'folders': {
+                os.path.relpath(folder, self.root): {'n_replicates': len(files)}
+                for folder, (_, _, files) in sorted(self.replicate_stats.items())
+            },
+        }
+        tmp_path = self.status_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, indent=2, allow_nan=False)
+        os.replace(tmp_path, self.status_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Procesa los espectros nuevos a medida que se exportan.')
+    parser.add_argument('root', nargs='?', default=os.path.join('datos_espectros', 'PL', 'ngqd_ca_curva_in_situ'))
+    parser.add_argument('--settle', type=float, default=2.0, help='Segundos sin cambios antes de leer un archivo')
+    parser.add_argument('--interval', type=float, default=1.0, help='Segundos entre revisiones')
+    parser.add_argument('--status', default=None, help='Archivo JSON con el estado de la calibración')
+    parser.add_argument('--once', action='store_true', help='Procesar lo existente y terminar')
+    args = parser.parse_args()
+
+    service = InsituService(args.root, status_path=args.status)
+    if args.once:
+        watcher = SpectrumWatcher(args.root, settle_time=0)
+        service.process(*watcher.poll())
+    else:
+        watcher = SpectrumWatcher(args.root, settle_time=args.settle)
+        try:
+            watcher.run(service.process, poll_interval=args.interval)
+        except KeyboardInterrupt:
+            pass